@@ -9,6 +9,8 @@ from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 
 from app.core.config import get_settings
+from app.core.db import metadata
+from app.rates import archive  # noqa: F401 - registers the rate_archive table
 
 config = context.config
 settings = get_settings()
@@ -17,7 +19,7 @@ config.set_main_option("sqlalchemy.url", settings.database_url)
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
-TARGET_METADATA = None
+TARGET_METADATA = metadata
 
 
 def run_migrations_offline() -> None:
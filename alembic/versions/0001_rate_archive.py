@@ -0,0 +1,56 @@
+"""rate archive partitioned by day
+
+Revision ID: 0001_rate_archive
+Revises:
+Create Date: 2026-10-16 12:00:00
+
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0001_rate_archive"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "rate_archive",
+        sa.Column("source", sa.String(length=16), nullable=False),
+        sa.Column("method", sa.String(length=16), nullable=False),
+        sa.Column("mode", sa.String(length=16), nullable=False),
+        sa.Column("geo", sa.String(length=16), nullable=False),
+        sa.Column("depth", sa.SmallInteger(), server_default="0", nullable=False),
+        sa.Column("value", sa.Numeric(precision=20, scale=6), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("valid_until", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("extras", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        postgresql_partition_by="RANGE (updated_at)",
+    )
+    # Created on the parent, so every partition gets its own copy
+    op.create_index("ix_rate_archive_source_updated_at", "rate_archive", ["source", "updated_at"])
+    # The worker keeps partitions ahead from here on; start with a few days
+    # Partitions are UTC days whatever the server's or the session's time zone
+    today = datetime.now(timezone.utc).date()
+    for offset in range(-1, 3):
+        day = today + timedelta(days=offset)
+        lower = f"{day.isoformat()} 00:00:00+00"
+        upper = f"{(day + timedelta(days=1)).isoformat()} 00:00:00+00"
+        op.execute(
+            f"CREATE TABLE IF NOT EXISTS rate_archive_p{day:%Y%m%d} PARTITION OF rate_archive "
+            f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+        )
+
+
+def downgrade() -> None:
+    # Dropping the parent drops every partition with it
+    op.drop_index("ix_rate_archive_source_updated_at", table_name="rate_archive")
+    op.drop_table("rate_archive")
@@ -1,11 +1,14 @@
 ﻿from __future__ import annotations
 
+import html
+
 from aiogram import Router
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.types import Message
 
 from app.admin.filters import RoleFilter
-from app.utils.telegram import answer_with_preview
+from app.core.metrics import metrics
+from app.utils.telegram import answer_with_preview, split_lines
 
 router = Router(name="admin")
 router.message.filter(RoleFilter({"admin", "moderator"}))
@@ -14,3 +17,30 @@ router.message.filter(RoleFilter({"admin", "moderator"}))
 @router.message(Command("admin"))
 async def admin_help(message: Message) -> None:
     await answer_with_preview(message, "Админ-команды будут добавлены позднее.")
+
+
+# Labelled metrics add up to thousands of lines; a flood of messages helps nobody
+METRICS_MAX_MESSAGES = 3
+
+
+@router.message(Command("metrics"))
+async def admin_metrics(message: Message, command: CommandObject) -> None:
+    """/metrics [префикс] — счетчики и gauge, например /metrics sender."""
+    prefix = (command.args or "").strip()
+    snapshot = metrics.snapshot()
+    lines = [
+        html.escape(f"{name}: {value:g}")
+        for section in ("counters", "gauges")
+        for name, value in snapshot[section].items()
+        if name.startswith(prefix)
+    ]
+    if not lines:
+        await message.answer("Метрик пока нет.")
+        return
+    chunks = split_lines(lines)
+    for chunk in chunks[:METRICS_MAX_MESSAGES]:
+        await message.answer(chunk)
+    if len(chunks) > METRICS_MAX_MESSAGES:
+        await message.answer(
+            f"Показаны не все метрики ({len(lines)}). Уточните префикс: /metrics http"
+        )
@@ -15,6 +15,14 @@ class CacheTtlConfig(BaseModel):
     grinex: int = 30
 
 
+class StaleGraceConfig(BaseModel):
+    """How long past its TTL a cached rate may still be served while it is refreshed."""
+
+    bybit: int = 30
+    rapira: int = 60
+    grinex: int = 60
+
+
 class FeatureFlags(BaseModel):
     enable_geo: bool = True
     enable_inline: bool = True
@@ -35,9 +43,29 @@ class Settings(BaseSettings):
     pred_bot_token: Optional[SecretStr] = Field(default=None, alias="PRED_BOT_TOKEN")
     database_url: Optional[str] = Field(default=None, alias="DATABASE_URL")
     redis_url: Optional[str] = Field(default=None, alias="REDIS_URL")
+    # Public HTTPS base URL; when set the bots take updates over a webhook instead of polling
+    webhook_base_url: Optional[str] = Field(None, alias="WEBHOOK_BASE_URL")
+    # Checked on every webhook request; derived from the bot token when unset
+    webhook_secret: Optional[SecretStr] = Field(default=None, alias="WEBHOOK_SECRET")
+    webhook_host: Optional[str] = Field("0.0.0.0", alias="WEBHOOK_HOST")
+    webhook_port: Optional[int] = Field(8080, alias="WEBHOOK_PORT")
+    webhook_dedup_ttl_sec: Optional[int] = Field(3600, alias="WEBHOOK_DEDUP_TTL_SEC")
+    webhook_max_connections: Optional[int] = Field(40, alias="WEBHOOK_MAX_CONNECTIONS")
     bybit_endpoint: Optional[str] = Field("", alias="BYBIT_ENDPOINT")
     rapira_endpoint: Optional[str] = Field("", alias="RAPIRA_ENDPOINT")
     grinex_endpoint: Optional[str] = Field("", alias="GRINEX_ENDPOINT")
+    bybit_ws_endpoint: Optional[str] = Field(None, alias="BYBIT_WS_ENDPOINT")
+    bybit_ws_symbol: Optional[str] = Field("USDTRUB", alias="BYBIT_WS_SYMBOL")
+    bybit_p2p_endpoint: Optional[str] = Field(
+        "https://api2.bybit.com/fiat/otc/item/online", alias="BYBIT_P2P_ENDPOINT"
+    )
+    bybit_p2p_payments: Optional[str] = Field("", alias="BYBIT_P2P_PAYMENTS")
+    bybit_p2p_amount: Optional[float] = Field(None, alias="BYBIT_P2P_AMOUNT")
+    bybit_p2p_page_size: Optional[int] = Field(20, alias="BYBIT_P2P_PAGE_SIZE")
+    bybit_p2p_max_pages: Optional[int] = Field(5, alias="BYBIT_P2P_MAX_PAGES")
+    bybit_p2p_concurrency: Optional[int] = Field(4, alias="BYBIT_P2P_CONCURRENCY")
+    bybit_p2p_percentile: Optional[float] = Field(10.0, alias="BYBIT_P2P_PERCENTILE")
+    bybit_p2p_cache_sec: Optional[int] = Field(30, alias="BYBIT_P2P_CACHE_SEC")
     usdtusd_source: Optional[str] = Field(None, alias="USDTUSD_SOURCE")
     usdrub_source: Optional[str] = Field(None, alias="USDRUB_SOURCE")
 
@@ -49,12 +77,54 @@ class Settings(BaseSettings):
 
     geo_k_rio: Optional[float] = Field(0.0, alias="GEO_K_RIO")
     geo_k_berlin: Optional[float] = Field(0.0, alias="GEO_K_BERLIN")
+    # {"rio": 0.012, "berlin": -0.004}: rate = base * (1 + k); overrides GEO_K_*
+    geo_coefficients: Optional[Dict[str, float]] = Field(
+        default_factory=dict, alias="GEO_COEFFICIENTS"
+    )
 
-    cache_ttl_per_source: Optional[CacheTtlConfig] = Field(default_factory=CacheTtlConfig, alias="CACHE_TTL_SEC_PER_SOURCE")
+    cache_ttl_per_source: CacheTtlConfig = Field(
+        default_factory=CacheTtlConfig, alias="CACHE_TTL_SEC_PER_SOURCE"
+    )
+    stale_grace_per_source: StaleGraceConfig = Field(
+        default_factory=StaleGraceConfig, alias="STALE_GRACE_SEC_PER_SOURCE"
+    )
+    rates_serve_stale: Optional[bool] = Field(True, alias="RATES_SERVE_STALE")
+    orderbook_tick_sec: Optional[float] = Field(1.0, alias="ORDERBOOK_TICK_SEC")
+    fx_cache_ttl_sec: Optional[int] = Field(60, alias="FX_CACHE_TTL_SEC")
+    fx_hedge_delay_ms: Optional[int] = Field(300, alias="FX_HEDGE_DELAY_MS")
+    bybit_leg_deadline_ms: Optional[int] = Field(2500, alias="BYBIT_LEG_DEADLINE_MS")
+    bybit_leg_max_age_sec: Optional[int] = Field(300, alias="BYBIT_LEG_MAX_AGE_SEC")
+    http_rates_max_connections: Optional[int] = Field(40, alias="HTTP_RATES_MAX_CONNECTIONS")
+    http_aml_max_connections: Optional[int] = Field(10, alias="HTTP_AML_MAX_CONNECTIONS")
+    http_per_host_limit: Optional[int] = Field(8, alias="HTTP_PER_HOST_LIMIT")
+    http_keepalive_expiry_sec: Optional[int] = Field(30, alias="HTTP_KEEPALIVE_EXPIRY_SEC")
+    http2_enabled: Optional[bool] = Field(True, alias="HTTP2_ENABLED")
     rate_warn_age_sec: Optional[int] = Field(30, alias="RATE_WARN_AGE_SEC")
     circuit_breaker_open_sec: Optional[int] = Field(60, alias="CIRCUIT_BREAKER_OPEN_SEC")
-
-    feature_flags: Optional[FeatureFlags] = Field(default_factory=FeatureFlags, alias="FEATURE_FLAGS")
+    circuit_breaker_failures: Optional[int] = Field(5, alias="CIRCUIT_BREAKER_FAILURES")
+    circuit_breaker_window_sec: Optional[int] = Field(30, alias="CIRCUIT_BREAKER_WINDOW_SEC")
+    circuit_breaker_probe_ms: Optional[int] = Field(5000, alias="CIRCUIT_BREAKER_PROBE_MS")
+    rate_lease_ms: Optional[int] = Field(15000, alias="RATE_LEASE_MS")
+    rates_l1_max_entries: Optional[int] = Field(1024, alias="RATES_L1_MAX_ENTRIES")
+    archive_enabled: Optional[bool] = Field(True, alias="ARCHIVE_ENABLED")
+    archive_retention_days: Optional[int] = Field(180, alias="ARCHIVE_RETENTION_DAYS")
+    archive_batch_size: Optional[int] = Field(500, alias="ARCHIVE_BATCH_SIZE")
+    archive_flush_sec: Optional[float] = Field(5.0, alias="ARCHIVE_FLUSH_SEC")
+    history_max_points: Optional[int] = Field(20000, alias="HISTORY_MAX_POINTS")
+    rendered_views_ttl_sec: Optional[int] = Field(30, alias="RENDERED_VIEWS_TTL_SEC")
+    refresh_lead_ratio: Optional[float] = Field(0.2, alias="REFRESH_LEAD_RATIO")
+    refresh_jitter_ratio: Optional[float] = Field(0.1, alias="REFRESH_JITTER_RATIO")
+    refresh_max_per_tick: Optional[int] = Field(20, alias="REFRESH_MAX_PER_TICK")
+    demand_half_life_sec: Optional[int] = Field(300, alias="DEMAND_HALF_LIFE_SEC")
+    demand_cold_score: Optional[float] = Field(1.0, alias="DEMAND_COLD_SCORE")
+    inline_cache_time_sec: Optional[int] = Field(10, alias="INLINE_CACHE_TIME_SEC")
+    alerts_max_per_chat: Optional[int] = Field(20, alias="ALERTS_MAX_PER_CHAT")
+    sender_global_rate: Optional[float] = Field(30.0, alias="SENDER_GLOBAL_RATE")
+    sender_private_interval_sec: Optional[float] = Field(1.0, alias="SENDER_PRIVATE_INTERVAL_SEC")
+    sender_group_per_minute: Optional[float] = Field(20.0, alias="SENDER_GROUP_PER_MINUTE")
+    sender_max_attempts: Optional[int] = Field(5, alias="SENDER_MAX_ATTEMPTS")
+
+    feature_flags: FeatureFlags = Field(default_factory=FeatureFlags, alias="FEATURE_FLAGS")
 
     silent_hours: Optional[str] = Field(None, alias="SILENT_HOURS")
     pred_max_per_day: Optional[int] = Field(3, alias="PRED_MAX_PER_DAY")
@@ -93,6 +163,19 @@ class Settings(BaseSettings):
             raise ValueError("Unsupported feature_flags type")
         return FeatureFlags(**data)
 
+    @field_validator("geo_coefficients", mode="before")
+    @classmethod
+    def _parse_geo_coefficients(cls, value: Any) -> Dict[str, float]:
+        if value is None or value == "":
+            return {}
+        if isinstance(value, str):
+            data: Dict[str, Any] = json.loads(value)
+        elif isinstance(value, dict):
+            data = value
+        else:
+            raise ValueError("Unsupported geo coefficients type")
+        return {str(name).lower(): float(k) for name, k in data.items()}
+
     @field_validator("cache_ttl_per_source", mode="before")
     @classmethod
     def _parse_cache_ttl(cls, value: Any) -> CacheTtlConfig:
@@ -106,6 +189,19 @@ class Settings(BaseSettings):
             raise ValueError("Unsupported cache ttl type")
         return CacheTtlConfig(**data)
 
+    @field_validator("stale_grace_per_source", mode="before")
+    @classmethod
+    def _parse_stale_grace(cls, value: Any) -> StaleGraceConfig:
+        if isinstance(value, StaleGraceConfig) or value is None:
+            return value or StaleGraceConfig()
+        if isinstance(value, str):
+            data: Dict[str, Any] = json.loads(value)
+        elif isinstance(value, dict):
+            data = value
+        else:
+            raise ValueError("Unsupported stale grace type")
+        return StaleGraceConfig(**data)
+
     @field_validator("service_chat_id", mode="before")
     @classmethod
     def _parse_service_chat_id(cls, value: Any) -> Optional[int]:
@@ -133,6 +229,9 @@ class Settings(BaseSettings):
         "privacy_contact_enc_keyref",
         "silent_hours",
         "getblock_base_url",
+        "bybit_ws_endpoint",
+        "webhook_base_url",
+        "webhook_secret",
         mode="before",
     )
     @classmethod
@@ -151,4 +250,5 @@ class Settings(BaseSettings):
 
 @lru_cache
 def get_settings() -> Settings:
-    return Settings()
\ No newline at end of file
+    # Every field has a default; mypy cannot see pydantic-settings' aliases
+    return Settings()  # type: ignore[call-arg]
\ No newline at end of file
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict
+
+import httpx
+
+from app.core.config import Settings
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+
+log = get_logger(__name__)
+
+RATES_POOL = "rates"
+AML_POOL = "aml"
+DEFAULT_POOL = "default"
+
+try:  # HTTP/2 needs the optional ``h2`` package (httpx[http2])
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:  # pragma: no cover - depends on the environment
+    HTTP2_AVAILABLE = False
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    max_connections: int = 20
+    max_keepalive: int = 10
+    keepalive_expiry: float = 30.0
+    per_host: int = 8
+    timeout: float = 10.0
+    connect_timeout: float = 5.0
+    http2: bool = True
+
+
+def pool_configs(settings: Settings) -> Dict[str, PoolConfig]:
+    """Rates and AML traffic get separate pools so slow AML polling never starves rate fetches."""
+    keepalive = float(settings.http_keepalive_expiry_sec or 30)
+    per_host = int(settings.http_per_host_limit or 8)
+    http2 = bool(settings.http2_enabled)
+    rates = int(settings.http_rates_max_connections or 40)
+    aml = int(settings.http_aml_max_connections or 10)
+    return {
+        RATES_POOL: PoolConfig(rates, rates // 2, keepalive, per_host, http2=http2),
+        AML_POOL: PoolConfig(aml, aml, keepalive, min(per_host, aml), http2=http2),
+        DEFAULT_POOL: PoolConfig(10, 5, keepalive, per_host, http2=http2),
+    }
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that gives the per-host slot back once it is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]) -> None:
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class MeteredTransport(httpx.AsyncBaseTransport):
+    """``AsyncHTTPTransport`` with a per-host concurrency cap and pool metrics.
+
+    Reports, labelled by pool and host:
+
+    * ``http.queue_sec`` — time spent waiting for the per-host slot and for a
+      pooled connection before the request is sent;
+    * ``http.connection.new`` / ``http.connection.reused`` — whether the
+      request opened a connection or rode on a kept-alive one;
+    * ``http.pool.in_flight`` / ``http.pool.connections`` /
+      ``http.pool.idle`` gauges (per pool).
+    """
+
+    def __init__(self, name: str, config: PoolConfig) -> None:
+        self.name = name
+        self.config = config
+        self._transport = httpx.AsyncHTTPTransport(
+            http2=config.http2 and HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=config.max_connections,
+                max_keepalive_connections=config.max_keepalive,
+                keepalive_expiry=config.keepalive_expiry,
+            ),
+        )
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight = 0
+
+    def _slot(self, host: str) -> asyncio.Semaphore:
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = self._hosts[host] = asyncio.Semaphore(self.config.per_host)
+        return semaphore
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        semaphore = self._slot(host)
+        queued_at = time.perf_counter()
+        await semaphore.acquire()
+        self._in_flight += 1
+        self._report_pool()
+
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if released:
+                return
+            released = True
+            semaphore.release()
+            self._in_flight -= 1
+            self._report_pool()
+
+        state: Dict[str, Any] = {"new": False, "sent": False}
+        upstream_trace = request.extensions.get("trace")
+
+        async def trace(event: str, info: Dict[str, Any]) -> None:
+            if event.startswith("connection.connect_tcp.started"):
+                state["new"] = True
+            elif event.endswith("send_request_headers.started") and not state["sent"]:
+                state["sent"] = True
+                queued = time.perf_counter() - queued_at
+                metrics.observe("http.queue_sec", queued, pool=self.name, host=host)
+            if upstream_trace is not None:
+                await upstream_trace(event, info)
+
+        request.extensions["trace"] = trace
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        event_name = "http.connection.new" if state["new"] else "http.connection.reused"
+        metrics.inc(event_name, pool=self.name, host=host)
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, release),  # type: ignore[arg-type]
+            extensions=response.extensions,
+        )
+
+    def _report_pool(self) -> None:
+        metrics.set_gauge("http.pool.in_flight", self._in_flight, pool=self.name)
+        pool = getattr(self._transport, "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is None:
+            return
+        metrics.set_gauge("http.pool.connections", len(connections), pool=self.name)
+        idle = sum(1 for conn in connections if conn.is_idle())
+        metrics.set_gauge("http.pool.idle", idle, pool=self.name)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def create_http_client(name: str, config: PoolConfig) -> httpx.AsyncClient:
+    timeout = httpx.Timeout(config.timeout, connect=config.connect_timeout)
+    return httpx.AsyncClient(timeout=timeout, transport=MeteredTransport(name, config))
+
+
+class HttpClients:
+    """The process's HTTP clients, one pool per kind of traffic."""
+
+    def __init__(self, settings: Settings) -> None:
+        if settings.http2_enabled and not HTTP2_AVAILABLE:
+            log.info("HTTP/2 requested but h2 is not installed; using HTTP/1.1")
+        self._configs = pool_configs(settings)
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def get(self, name: str = DEFAULT_POOL) -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None:
+            client = self._clients[name] = create_http_client(name, self._configs[name])
+        return client
+
+    @property
+    def rates(self) -> httpx.AsyncClient:
+        return self.get(RATES_POOL)
+
+    @property
+    def aml(self) -> httpx.AsyncClient:
+        return self.get(AML_POOL)
+
+    async def aclose(self) -> None:
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.aclose()
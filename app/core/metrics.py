@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Any, Dict, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+MetricKey = Tuple[str, LabelKey]
+
+
+def _metric_key(name: str, labels: Dict[str, Any]) -> MetricKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _metric_name(key: MetricKey) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    rendered = ",".join(f"{k}={v}" for k, v in labels)
+    return f"{name}{{{rendered}}}"
+
+
+class MetricsRegistry:
+    """In-process counters, gauges and summaries.
+
+    The registry is intentionally tiny: values are kept per process and exposed
+    through ``snapshot()`` (logged by the worker, shown by the admin command).
+    """
+
+    def __init__(self) -> None:
+        self._counters: Dict[MetricKey, float] = defaultdict(float)
+        self._gauges: Dict[MetricKey, float] = {}
+        self._summaries: Dict[MetricKey, Dict[str, float]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        self._counters[_metric_key(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        self._gauges[_metric_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = _metric_key(name, labels)
+        summary = self._summaries.get(key)
+        if summary is None:
+            self._summaries[key] = {"count": 1, "sum": value, "max": value}
+            return
+        summary["count"] += 1
+        summary["sum"] += value
+        summary["max"] = max(summary["max"], value)
+
+    def counter(self, name: str, **labels: Any) -> float:
+        return self._counters.get(_metric_key(name, labels), 0)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            "counters": {_metric_name(k): v for k, v in sorted(self._counters.items())},
+            "gauges": {_metric_name(k): v for k, v in sorted(self._gauges.items())},
+            "summaries": {_metric_name(k): dict(v) for k, v in sorted(self._summaries.items())},
+        }
+
+    def reset(self) -> None:
+        self._counters.clear()
+        self._gauges.clear()
+        self._summaries.clear()
+
+
+metrics = MetricsRegistry()
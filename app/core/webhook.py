@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import time
+from typing import Set
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+from pydantic import ValidationError
+from redis.asyncio import Redis
+
+from app.core.config import Settings
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+
+log = get_logger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+UPDATE_SEEN_PREFIX = "tg:update:"
+
+
+class WebhookHandler:
+    """Accepts Telegram updates over HTTP for one bot.
+
+    Requests without the expected secret token are refused. Every update id
+    is claimed with ``SET NX`` first, so a retry Telegram sends after a slow
+    or lost response — possibly to another replica — is acknowledged without
+    being handled twice. Updates are processed in the background and the
+    request is answered right away, so Telegram never waits on a handler.
+    """
+
+    def __init__(
+        self,
+        dp: Dispatcher,
+        bot: Bot,
+        redis: Redis[bytes],
+        name: str,
+        secret: str,
+        dedup_ttl: int = 3600,
+    ) -> None:
+        if not secret:
+            raise ValueError("A webhook needs a secret token")
+        self.dp = dp
+        self.bot = bot
+        self.redis = redis
+        self.name = name
+        self.secret = secret
+        self.dedup_ttl = dedup_ttl
+        self._tasks: Set[asyncio.Task[None]] = set()
+
+    def _authorized(self, request: web.Request) -> bool:
+        return hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret)
+
+    async def _first_delivery(self, update_id: int) -> bool:
+        key = f"{UPDATE_SEEN_PREFIX}{self.name}:{update_id}"
+        try:
+            return bool(await self.redis.set(key, 1, nx=True, ex=self.dedup_ttl))
+        except Exception as exc:  # noqa: BLE001 - better a rare duplicate than a lost update
+            log.warning("Update dedup unavailable", bot=self.name, error=str(exc))
+            return True
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self._authorized(request):
+            metrics.inc("webhook.rejected", bot=self.name)
+            return web.Response(status=401)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except (ValueError, ValidationError):
+            metrics.inc("webhook.malformed", bot=self.name)
+            return web.Response(status=400)
+        if not await self._first_delivery(update.update_id):
+            metrics.inc("webhook.duplicates", bot=self.name)
+            return web.Response()
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._finished)
+        metrics.set_gauge("webhook.in_flight", len(self._tasks), bot=self.name)
+        return web.Response()
+
+    def _finished(self, task: asyncio.Task[None]) -> None:
+        self._tasks.discard(task)
+        metrics.set_gauge("webhook.in_flight", len(self._tasks), bot=self.name)
+
+    async def _process(self, update: Update) -> None:
+        started = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception as exc:  # noqa: BLE001 - already acknowledged, nothing to return it to
+            metrics.inc("webhook.failed", bot=self.name)
+            log.warning(
+                "Update handling failed", bot=self.name, update_id=update.update_id, error=str(exc)
+            )
+        finally:
+            metrics.inc("webhook.updates", bot=self.name)
+            metrics.observe("webhook.handle_sec", time.perf_counter() - started, bot=self.name)
+
+    async def drain(self, timeout: float = 10.0) -> None:
+        """Let updates already acknowledged finish before shutting down."""
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+
+async def _health(_: web.Request) -> web.Response:
+    return web.Response(text="ok")
+
+
+def webhook_path(name: str) -> str:
+    return f"/webhook/{name}"
+
+
+def webhook_secret(settings: Settings, bot: Bot, name: str) -> str:
+    """``WEBHOOK_SECRET``, or one derived from the bot token when it is unset.
+
+    Derived rather than random so every replica registers and checks the
+    same token; it stays as secret as the bot token itself.
+    """
+    if settings.webhook_secret and settings.webhook_secret.get_secret_value():
+        return settings.webhook_secret.get_secret_value()
+    return hmac.new(bot.token.encode(), f"webhook:{name}".encode(), hashlib.sha256).hexdigest()
+
+
+def create_webhook_app(handler: WebhookHandler) -> web.Application:
+    app = web.Application()
+    app.router.add_post(webhook_path(handler.name), handler.handle)
+    app.router.add_get("/healthz", _health)
+    return app
+
+
+async def run_webhook(
+    dp: Dispatcher, bot: Bot, redis: Redis[bytes], settings: Settings, name: str
+) -> None:
+    """Serve ``name``'s updates over a webhook until cancelled.
+
+    Every replica registers the same URL, so they can all sit behind one
+    load balancer.
+    """
+    secret = webhook_secret(settings, bot, name)
+    dedup_ttl = int(settings.webhook_dedup_ttl_sec or 3600)
+    handler = WebhookHandler(dp, bot, redis, name, secret, dedup_ttl=dedup_ttl)
+    runner = web.AppRunner(create_webhook_app(handler))
+    await runner.setup()
+    host, port = settings.webhook_host or "0.0.0.0", int(settings.webhook_port or 8080)
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    url = f"{(settings.webhook_base_url or '').rstrip('/')}{webhook_path(name)}"
+    workflow_data = {"dispatcher": dp, "bot": bot, **dp.workflow_data}
+    await dp.emit_startup(**workflow_data)
+    try:
+        await bot.set_webhook(
+            url,
+            secret_token=secret,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=int(settings.webhook_max_connections or 40),
+        )
+        log.info("Webhook serving", bot=name, url=url)
+        await asyncio.Event().wait()
+    finally:
+        await runner.shutdown()
+        await handler.drain()
+        await runner.cleanup()
+        await dp.emit_shutdown(**workflow_data)
+
+
+async def run_bot(
+    dp: Dispatcher, bot: Bot, redis: Redis[bytes], settings: Settings, name: str
+) -> None:
+    """Webhook mode when ``WEBHOOK_BASE_URL`` is set, long polling otherwise."""
+    if settings.webhook_base_url:
+        await run_webhook(dp, bot, redis, settings, name)
+        return
+    # getUpdates is refused while a webhook is registered
+    await bot.delete_webhook(drop_pending_updates=False)
+    await dp.start_polling(bot)
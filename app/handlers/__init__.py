@@ -2,7 +2,7 @@
 
 from aiogram import Dispatcher
 
-from app.handlers import aml, help, leads, menu, rates, start
+from app.handlers import alerts, aml, help, inline, leads, menu, rates, start
 from app.handlers import fallback
 from app.admin import commands as admin_commands
 
@@ -13,9 +13,15 @@ def register_handlers(dp: Dispatcher) -> None:
         help.router,
         menu.router,
         rates.router,
+        alerts.router,
         aml.router,
         leads.router,
         admin_commands.router,
+    ]
+    settings = dp.get("settings")
+    if settings is not None and settings.feature_flags.enable_inline:
+        routers.append(inline.router)
+    routers += [
         # Fallback must be last
         fallback.router,
     ]
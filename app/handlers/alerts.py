@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Optional
+
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+
+from app.core.config import Settings
+from app.rates.dashboard import card_query
+from app.rates.history import series_name
+from app.rates.models import RateSource
+from app.rates.service import RateService
+from app.services.alerts.service import (
+    KIND_ABOVE,
+    KIND_BELOW,
+    KIND_MOVE,
+    AlertLimitError,
+    AlertService,
+    to_micros,
+)
+from app.utils.formatting import format_alert, format_alerts
+from app.utils.telegram import answer_with_preview
+from app.utils.texts import get_text
+
+router = Router(name="alerts")
+
+ALLOWED_SOURCES = {item.value for item in RateSource}
+_OPERATORS = {
+    ">": KIND_ABOVE,
+    "above": KIND_ABOVE,
+    "выше": KIND_ABOVE,
+    "<": KIND_BELOW,
+    "below": KIND_BELOW,
+    "ниже": KIND_BELOW,
+}
+_ALERT_ARGS = re.compile(
+    r"^(?:(?P<source>[a-z]+)\s+)?(?P<op>>|<|above|below|выше|ниже)?\s*(?P<number>\d+(?:[.,]\d+)?)\s*(?P<percent>%)?$"
+)
+
+
+def _parse_number(value: str) -> Optional[Decimal]:
+    try:
+        number = Decimal(value.replace(",", "."))
+    except InvalidOperation:
+        return None
+    return number if number > 0 else None
+
+
+@router.message(Command("alert"))
+async def cmd_alert(
+    message: Message,
+    command: CommandObject,
+    alert_service: AlertService,
+    rate_service: RateService,
+    settings: Settings,
+) -> None:
+    """/alert [источник] >|< цена или /alert [источник] 2% — уведомить о курсе."""
+    match = _ALERT_ARGS.match((command.args or "").strip().lower())
+    number = _parse_number(match.group("number")) if match else None
+    source_value = (match.group("source") if match else None) or settings.default_source
+    if match is None or number is None or source_value not in ALLOWED_SOURCES:
+        await answer_with_preview(message, get_text("alerts.usage"))
+        return
+    is_move = bool(match.group("percent"))
+    if not is_move and not match.group("op"):
+        await answer_with_preview(message, get_text("alerts.usage"))
+        return
+
+    source = RateSource(source_value)
+    # Alerts watch the base card rate: it is what the worker keeps refreshing
+    query = rate_service.geo.base(card_query(settings, source))
+    series = series_name(rate_service.cache_key(query))
+    current = (await rate_service.get_rate(query)).value
+
+    upper: Optional[int]
+    lower: Optional[int]
+    if is_move:
+        if number >= 100:
+            await answer_with_preview(message, get_text("alerts.usage"))
+            return
+        share = number / 100
+        kind = KIND_MOVE
+        upper, lower = to_micros(current * (1 + share)), to_micros(current * (1 - share))
+    else:
+        kind = _OPERATORS[match.group("op")]
+        if (kind == KIND_ABOVE and number <= current) or (kind == KIND_BELOW and number >= current):
+            text = get_text("alerts.already").format(value=f"{current:.2f}")
+            await answer_with_preview(message, text)
+            return
+        upper = to_micros(number) if kind == KIND_ABOVE else None
+        lower = to_micros(number) if kind == KIND_BELOW else None
+
+    try:
+        alert = await alert_service.create(
+            chat_id=message.chat.id,
+            source=source.value,
+            series=series,
+            kind=kind,
+            upper=upper,
+            lower=lower,
+            reference=to_micros(current) if is_move else None,
+            percent=str(number) if is_move else None,
+        )
+    except AlertLimitError:
+        text = get_text("alerts.limit").format(limit=alert_service.max_per_chat)
+        await answer_with_preview(message, text)
+        return
+    await answer_with_preview(message, get_text("alerts.created").format(alert=format_alert(alert)))
+
+
+@router.message(Command("alerts"))
+async def cmd_alerts(message: Message, alert_service: AlertService) -> None:
+    alerts = await alert_service.list(message.chat.id)
+    await answer_with_preview(message, format_alerts(alerts))
+
+
+@router.message(Command("unalert"))
+async def cmd_unalert(
+    message: Message, command: CommandObject, alert_service: AlertService
+) -> None:
+    arg = (command.args or "").strip().lstrip("#")
+    if not arg.isdigit() or not await alert_service.remove(message.chat.id, int(arg)):
+        await answer_with_preview(message, get_text("alerts.not_found"))
+        return
+    await answer_with_preview(message, get_text("alerts.removed").format(id=arg))
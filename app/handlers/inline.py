@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from aiogram import Router
+from aiogram.types import (
+    InlineQuery,
+    InlineQueryResultArticle,
+    InlineQueryResultsButton,
+    InputTextMessageContent,
+)
+from redis.asyncio import Redis
+
+from app.core.config import Settings
+from app.core.metrics import metrics
+from app.rates.dashboard import DASHBOARD_VIEW, MOSCA_VIEW, card_view, load_views
+from app.rates.models import RateSource
+
+if TYPE_CHECKING:
+    from aiogram.types import InlineQueryResultUnion
+
+router = Router(name="inline")
+
+# Published views offered inline, in display order, with their titles and search words
+INLINE_VIEWS: Tuple[Tuple[str, str, Tuple[str, ...]], ...] = (
+    (DASHBOARD_VIEW, "Все курсы USDT/RUB", ("usdt", "rub", "все", "курс", "dashboard")),
+    (card_view(RateSource.BYBIT), "Bybit", ("bybit", "байбит")),
+    (card_view(RateSource.RAPIRA), "Rapira", ("rapira", "рапира")),
+    (card_view(RateSource.GRINEX), "Grinex", ("grinex", "гринекс")),
+    (MOSCA_VIEW, "Mosca", ("mosca", "моска")),
+)
+_VIEW_NAMES = [name for name, _, _ in INLINE_VIEWS]
+# Words that match every view rather than narrowing the list
+_GENERIC = {"usdt", "rub", "курс", "курсы", "rate", "rates"}
+
+# Bursts of inline queries share one read of the published views
+_LOAD_INTERVAL = 1.0
+
+
+def _description(text: str, limit: int = 100) -> str:
+    lines = [line.strip() for line in text.splitlines()[1:] if line.strip()]
+    summary = " · ".join(lines)
+    return summary if len(summary) <= limit else summary[: limit - 1] + "…"
+
+
+class InlineAnswers:
+    """Inline results built from the views the worker publishes.
+
+    Articles are rebuilt only when a view's version changes, not per query,
+    and the views are read from Redis at most once per ``_LOAD_INTERVAL``;
+    nothing on this path fetches rates.
+    """
+
+    def __init__(self) -> None:
+        self._versions: Tuple[Tuple[str, int], ...] = ()
+        self._articles: Dict[str, InlineQueryResultArticle] = {}
+        self._loaded_at = 0.0
+
+    async def articles(self, redis: Redis[bytes]) -> Dict[str, InlineQueryResultArticle]:
+        now = time.monotonic()
+        if now - self._loaded_at < _LOAD_INTERVAL:
+            return self._articles
+        self._loaded_at = now
+        views = await load_views(redis, _VIEW_NAMES)
+        versions = tuple((name, view.version) for name, view in views.items())
+        if versions == self._versions:
+            return self._articles
+        metrics.inc("inline.rendered")
+        self._articles = {
+            name: InlineQueryResultArticle(
+                id=f"{name}:{views[name].version}",
+                title=title,
+                description=_description(views[name].text),
+                input_message_content=InputTextMessageContent(message_text=views[name].text),
+            )
+            for name, title, _ in INLINE_VIEWS
+            if name in views
+        }
+        self._versions = versions
+        return self._articles
+
+    @staticmethod
+    def select(
+        articles: Dict[str, InlineQueryResultArticle], query: str
+    ) -> List[InlineQueryResultUnion]:
+        words = [word for word in query.lower().split() if word not in _GENERIC]
+        if not words:
+            return list(articles.values())
+        return [
+            articles[name]
+            for name, _, keywords in INLINE_VIEWS
+            if name in articles
+            and any(keyword.startswith(word) for word in words for keyword in keywords)
+        ]
+
+
+_answers = InlineAnswers()
+
+
+@router.inline_query()
+async def inline_rates(inline_query: InlineQuery, redis: Redis[bytes], settings: Settings) -> None:
+    articles = await _answers.articles(redis)
+    results = InlineAnswers.select(articles, inline_query.query)
+    metrics.inc("inline.queries")
+    button: Optional[InlineQueryResultsButton] = None
+    cache_time = int(settings.inline_cache_time_sec or 10)
+    if not articles:
+        # Nothing published (worker down): point to the bot instead, and do not cache that
+        button = InlineQueryResultsButton(text="Открыть курсы в боте", start_parameter="rates")
+        cache_time = 0
+    await inline_query.answer(results, cache_time=cache_time, is_personal=False, button=button)
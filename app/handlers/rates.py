@@ -1,5 +1,6 @@
 ﻿from __future__ import annotations
 
+import time
 from typing import Iterable, List
 
 from aiogram import Router
@@ -10,15 +11,26 @@ from aiogram.types import CallbackQuery, Message
 from app.core.config import Settings
 from app.keyboards.common import nav_row
 from app.keyboards.rates import build_rate_actions, build_sources_menu
+from app.rates.dashboard import (
+    DASHBOARD_VIEW,
+    MOSCA_VIEW,
+    card_query,
+    card_view,
+    fetch_mosca_pair,
+    get_view,
+    render_views,
+)
+from app.rates.history import RESOLUTION_LABELS, series_name
 from app.rates.models import BybitMode, GeoOption, RateMethod, RateQuery, RateSource
-from app.rates.providers.bybit import BybitProvider
 from app.rates.service import RateService
-from app.utils.formatting import BidAsk, format_all_rates, format_mosca_pair, format_rate
+from app.utils.formatting import format_history, format_mosca_pair, format_rate
 from app.utils.telegram import answer_with_preview, edit_text_or_caption
 from app.utils.texts import get_text
 
 router = Router(name="rates")
 
+HISTORY_CANDLES = 12
+
 ALLOWED_SOURCES = {item.value for item in RateSource}
 ALLOWED_METHODS = {item.value for item in RateMethod}
 ALLOWED_GEO = {item.value for item in GeoOption}
@@ -97,83 +109,68 @@ async def cmd_best(message: Message, rate_service: RateService, settings: Settin
     await answer_with_preview(message, text)
 
 
+@router.message(Command("history"))
+async def cmd_history(message: Message, rate_service: RateService, settings: Settings) -> None:
+    """/history [источник] [1m|5m|1h] — последние свечи курса."""
+    source = RateSource(settings.default_source)
+    label = "5m"
+    for arg in (message.text or "").split()[1:]:
+        lower = arg.lower()
+        if lower in ALLOWED_SOURCES:
+            source = RateSource(lower)
+        elif lower in RESOLUTION_LABELS:
+            label = lower
+        else:
+            await answer_with_preview(message, get_text("rates.errors.invalid"))
+            return
+    resolution = RESOLUTION_LABELS[label]
+    series = series_name(rate_service.cache_key(card_query(settings, source)))
+    now = time.time()
+    start = now - resolution * HISTORY_CANDLES
+    candles = await rate_service.history.candles(series, resolution, start, now)
+    await answer_with_preview(message, format_history(source, label, candles))
+
+
+async def _render_dashboard(
+    rate_service: RateService, settings: Settings, force: bool = False
+) -> str:
+    views = await render_views(rate_service, settings, force=force, cards=False)
+    return views[DASHBOARD_VIEW]
+
+
 async def _render_all_rates(
     rate_service: RateService,
     settings: Settings,
     force: bool = False,
 ) -> str:
     """Получает и форматирует все курсы вместе."""
-    grinex_rate = None
-    rapira_rate = None
-    mosca_pair: BidAsk | None = None
-    bybit_mid = None
-    bybit_p2p: BidAsk | None = None
+    if force:
+        return await _render_dashboard(rate_service, settings, force=True)
+    # Обычно дашборд уже отрисован воркером — достаточно одного GET
+    view = await get_view(
+        rate_service.redis, DASHBOARD_VIEW, lambda: _render_dashboard(rate_service, settings)
+    )
+    if view is None:
+        # get_view only yields None when the renderer does, which ours never does
+        return await _render_dashboard(rate_service, settings)
+    return view.text
 
-    # Получаем курсы Grinex
-    try:
-        grinex_query = RateQuery(
-            source=RateSource.GRINEX,
-            method=RateMethod.MID,
-            geo=GeoOption(settings.default_geo),
-            mode=BybitMode.ORDERBOOK,
-        )
-        grinex_payload = await rate_service.get_rate(grinex_query, force=force)
-        ttl = _ttl_for_source(settings, RateSource.GRINEX)
-        grinex_rate = RateService.mark_stale(grinex_payload, ttl=ttl, warn_age=settings.rate_warn_age_sec)
-    except Exception:
-        pass
-    
-    # Получаем курсы Rapira
-    try:
-        rapira_query = RateQuery(
-            source=RateSource.RAPIRA,
-            method=RateMethod.MID,
-            geo=GeoOption(settings.default_geo),
-            mode=BybitMode.ORDERBOOK,
-        )
-        rapira_payload = await rate_service.get_rate(rapira_query, force=force)
-        ttl = _ttl_for_source(settings, RateSource.RAPIRA)
-        rapira_rate = RateService.mark_stale(rapira_payload, ttl=ttl, warn_age=settings.rate_warn_age_sec)
-    except Exception:
-        pass
-    
-    # Получаем средний курс Bybit (для блока "Bybit (средний)")
-    try:
-        bybit_mid_query = RateQuery(
-            source=RateSource.BYBIT,
-            method=RateMethod.MID,
-            geo=GeoOption(settings.default_geo),
-            mode=BybitMode(settings.bybit_mode),
-        )
-        bybit_mid_payload = await rate_service.get_rate(bybit_mid_query, force=force)
-        ttl = _ttl_for_source(settings, RateSource.BYBIT)
-        bybit_mid = RateService.mark_stale(bybit_mid_payload, ttl=ttl, warn_age=settings.rate_warn_age_sec)
-    except Exception:
-        pass
-    
-    mosca_pair = await _fetch_mosca_pair(rate_service, settings)
-    
-    return format_all_rates(grinex_rate, rapira_rate, mosca_pair, bybit_mid, bybit_p2p)
-
-
-async def _fetch_mosca_pair(rate_service: RateService, settings: Settings) -> BidAsk | None:
-    """
-    Берем bid/ask из ордербука Bybit и представляем как пару Mosca.
-    """
-    provider = rate_service.providers.get(RateSource.BYBIT)
-    if not provider or not isinstance(provider, BybitProvider):
-        return None
-    query = RateQuery(
-        source=RateSource.BYBIT,
-        method=RateMethod.BEST,
-        geo=GeoOption(settings.default_geo),
-        mode=BybitMode.ORDERBOOK,
+
+async def _render_card(
+    source: RateSource,
+    rate_service: RateService,
+    settings: Settings,
+    force: bool = False,
+) -> str:
+    query = card_query(settings, source)
+    if force:
+        return await _render_rate(query, rate_service, settings, force=True)
+    view = await get_view(
+        rate_service.redis, card_view(source), lambda: _render_rate(query, rate_service, settings)
     )
-    try:
-        bid, ask = await provider.fetch_bid_ask(query)
-    except Exception:
-        return None
-    return BidAsk(bid=bid, ask=ask)
+    if view is None:
+        return await _render_rate(query, rate_service, settings)
+    return view.text
 
 
 @router.callback_query(lambda c: c.data == "rates")
@@ -214,7 +211,10 @@ async def _show_bybit_card(
         geo=GeoOption(prefs["geo"]),
         mode=BybitMode(prefs["mode"]),
     )
-    text = await _render_rate(query, rate_service, settings, force=force)
+    if query == card_query(settings, RateSource.BYBIT):
+        text = await _render_card(RateSource.BYBIT, rate_service, settings, force=force)
+    else:
+        text = await _render_rate(query, rate_service, settings, force=force)
     keyboard = build_rate_actions("rates:bybit")
     await edit_text_or_caption(callback.message, text, keyboard)
     await callback.answer()
@@ -290,13 +290,7 @@ async def rapira_actions(
     settings: Settings,
 ) -> None:
     force = callback.data.endswith(":refresh")
-    query = RateQuery(
-        source=RateSource.RAPIRA,
-        method=RateMethod.MID,
-        geo=GeoOption(settings.default_geo),
-        mode=BybitMode.ORDERBOOK,
-    )
-    text = await _render_rate(query, rate_service, settings, force=force)
+    text = await _render_card(RateSource.RAPIRA, rate_service, settings, force=force)
     await edit_text_or_caption(callback.message, text, build_rate_actions("rates:rapira"))
     await callback.answer()
 
@@ -308,13 +302,7 @@ async def grinex_actions(
     settings: Settings,
 ) -> None:
     force = callback.data.endswith(":refresh")
-    query = RateQuery(
-        source=RateSource.GRINEX,
-        method=RateMethod.MID,
-        geo=GeoOption(settings.default_geo),
-        mode=BybitMode.ORDERBOOK,
-    )
-    text = await _render_rate(query, rate_service, settings, force=force)
+    text = await _render_card(RateSource.GRINEX, rate_service, settings, force=force)
     await edit_text_or_caption(callback.message, text, build_rate_actions("rates:grinex"))
     await callback.answer()
 
@@ -325,10 +313,16 @@ async def mosca_actions(
     rate_service: RateService,
     settings: Settings,
 ) -> None:
-    pair = await _fetch_mosca_pair(rate_service, settings)
-    if pair:
-        text = format_mosca_pair(pair)
+    async def _render() -> str | None:
+        pair = await fetch_mosca_pair(rate_service, settings)
+        return format_mosca_pair(pair) if pair else None
+
+    if (callback.data or "").endswith(":refresh"):
+        text = await _render()
     else:
+        view = await get_view(rate_service.redis, MOSCA_VIEW, _render)
+        text = view.text if view else None
+    if text is None:
         text = "Данные Mosca недоступны. Попробуйте обновить позже."
     await edit_text_or_caption(callback.message, text, build_rate_actions("rates:mosca"))
     await callback.answer()
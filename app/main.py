@@ -2,27 +2,28 @@
 
 import asyncio
 
-import httpx
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.types import BotCommand, BotCommandScopeDefault
 from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.types import BotCommand, BotCommandScopeDefault
 
 from app.core.bot import create_bot, create_dispatcher, setup_dispatcher, shutdown_bot
 from app.core.config import Settings, get_settings
 from app.core.db import create_engine, create_session_factory
+from app.core.http import HttpClients
 from app.core.logging import setup_logging
 from app.core.redis import close_redis, create_redis
+from app.core.webhook import run_bot
 from app.handlers import register_handlers
-from app.rates.models import RateSource
-from app.rates.providers.bybit import BybitProvider
-from app.rates.providers.grinex import GrinexProvider
-from app.rates.providers.rapira import RapiraProvider
+from app.rates.demand import DemandTracker
+from app.rates.factory import build_rate_providers, start_rate_streams
 from app.rates.service import RateService
+from app.services.alerts.service import AlertService
+from app.services.aml.providers import GetBlockAmlProvider, GetBlockProvider
 from app.services.aml.service import AMLService
-from app.services.aml.providers import GetBlockProvider, GetBlockAmlProvider
 from app.services.leads.service import LeadService
+from app.services.sender.service import APP_SENDER, Sender, build_sender_worker
 
 
 async def _build_dispatcher(settings: Settings) -> tuple[Dispatcher, RateService, AMLService, LeadService]:
@@ -30,15 +31,13 @@ async def _build_dispatcher(settings: Settings) -> tuple[Dispatcher, RateService
     storage = RedisStorage(redis=redis)
     dp = create_dispatcher(storage=storage)
 
-    http_client = httpx.AsyncClient(timeout=10.0)
+    http_clients = HttpClients(settings)
 
-    providers = {
-        RateSource.BYBIT: BybitProvider(http_client, settings.bybit_endpoint),
-        RateSource.RAPIRA: RapiraProvider(http_client, settings.rapira_endpoint),
-        RateSource.GRINEX: GrinexProvider(http_client, settings.grinex_endpoint),
-    }
+    providers = build_rate_providers(http_clients.rates, settings, redis=redis)
 
-    rate_service = RateService(redis=redis, providers=providers, settings=settings)
+    rate_service = RateService(
+        redis=redis, providers=providers, settings=settings, demand=DemandTracker(redis)
+    )
 
     engine = create_engine(settings.database_url)
     session_factory = create_session_factory(engine)
@@ -46,7 +45,7 @@ async def _build_dispatcher(settings: Settings) -> tuple[Dispatcher, RateService
     # AML provider selection
     if settings.getblock_aml_token:
         aml_provider = GetBlockAmlProvider(
-            http_client,
+            http_clients.aml,
             settings.getblock_base_url or "https://api.getblock.net/rpc/v1/request",
             settings.getblock_aml_token.get_secret_value(),
             evm_probe_order=[s.strip() for s in (settings.getblock_evm_probe_order or "ETH,BSC,MATIC,ETC").split(",")],
@@ -58,7 +57,7 @@ async def _build_dispatcher(settings: Settings) -> tuple[Dispatcher, RateService
         aml_service = AMLService(provider=aml_provider)
     elif settings.getblock_api_key:
         aml_provider = GetBlockProvider(
-            http_client,
+            http_clients.aml,
             settings.getblock_base_url or "https://api.getblock.net/rpc/v1/request",
             settings.getblock_api_key.get_secret_value(),
             chain="ETH",
@@ -72,9 +71,12 @@ async def _build_dispatcher(settings: Settings) -> tuple[Dispatcher, RateService
     dp["settings"] = settings
     dp["rate_service"] = rate_service
     dp["lead_service"] = lead_service
+    dp["alert_service"] = AlertService(redis, max_per_chat=int(settings.alerts_max_per_chat or 0))
     dp["aml_service"] = aml_service
-    dp["http_client"] = http_client
+    dp["http_clients"] = http_clients
+    dp["http_client"] = http_clients.rates
     dp["redis"] = redis
+    dp["sender"] = Sender(redis, APP_SENDER)
     dp["engine"] = engine
     dp["session_factory"] = session_factory
 
@@ -91,20 +93,29 @@ async def run() -> None:
     bot.default = DefaultBotProperties(parse_mode=ParseMode.HTML)
 
 
-    dp, _, _, _ = await _build_dispatcher(settings)
+    dp, rate_service, _, _ = await _build_dispatcher(settings)
+    background = [
+        asyncio.create_task(rate_service.listen_updates()),
+        asyncio.create_task(build_sender_worker(bot, dp["redis"], APP_SENDER, settings).run()),
+    ]
+    background += start_rate_streams(rate_service.providers)
+    if rate_service.demand is not None:
+        background.append(asyncio.create_task(rate_service.demand.run()))
 
     try:
-        await dp.start_polling(bot)
+        await run_bot(dp, bot, dp["redis"], settings, "app")
     finally:
+        for task in background:
+            task.cancel()
         await shutdown(dp, bot)
 
 
 async def shutdown(dp: Dispatcher, bot: Bot) -> None:
-    http_client: httpx.AsyncClient = dp["http_client"]
+    http_clients: HttpClients = dp["http_clients"]
     redis = dp["redis"]
     engine = dp["engine"]
 
-    await http_client.aclose()
+    await http_clients.aclose()
     await close_redis(redis)
     await engine.dispose()
     await dp.storage.close()
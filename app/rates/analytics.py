@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Prices and quantities are stored as int64 fixed-point numbers with 8 decimals,
+# the precision Bybit quotes with. Prefix sums are exact Python ints.
+SCALE_DIGITS = 8
+SCALE = 10**SCALE_DIGITS
+DEFAULT_TRIM = Decimal("0.1")
+
+_DSCALE = Decimal(SCALE)
+_INT64_MAX = 2**63 - 1
+
+
+def _to_fixed(value: Decimal) -> Optional[int]:
+    scaled = value * _DSCALE
+    fixed = int(scaled)
+    if fixed != scaled or not 0 <= fixed <= _INT64_MAX:
+        return None
+    return fixed
+
+
+class BookSide:
+    """One side of an order book as fixed-point arrays, best level first.
+
+    Building the side is the single pass over the levels: it fills the
+    price/qty arrays and the cumulative qty/notional sums, after which every
+    statistic below is O(1) or O(log n).
+    """
+
+    __slots__ = ("prices", "qtys", "cum_qty", "cum_notional")
+
+    def __init__(
+        self, prices: array[int], qtys: array[int], cum_qty: List[int], cum_notional: List[int]
+    ) -> None:
+        self.prices = prices
+        self.qtys = qtys
+        self.cum_qty = cum_qty
+        self.cum_notional = cum_notional
+
+    @classmethod
+    def from_levels(cls, levels: Sequence[Tuple[Decimal, Decimal]]) -> Optional["BookSide"]:
+        """None when a level does not fit the fixed-point grid (caller falls back to Decimal)."""
+        prices = array("q")
+        qtys = array("q")
+        cum_qty: List[int] = []
+        cum_notional: List[int] = []
+        total_qty = 0
+        total_notional = 0
+        for price, qty in levels:
+            p = _to_fixed(price)
+            q = _to_fixed(qty)
+            if p is None or q is None:
+                return None
+            prices.append(p)
+            qtys.append(q)
+            total_qty += q
+            total_notional += p * q
+            cum_qty.append(total_qty)
+            cum_notional.append(total_notional)
+        return cls(prices, qtys, cum_qty, cum_notional)
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def _depth(self, depth: int) -> int:
+        if not self.prices:
+            raise ValueError("Orderbook is empty")
+        return min(max(depth, 1), len(self.prices))
+
+    def best(self) -> Decimal:
+        if not self.prices:
+            raise ValueError("Orderbook is empty")
+        return Decimal(self.prices[0]) / _DSCALE
+
+    def vwap(self, depth: int) -> Decimal:
+        n = self._depth(depth)
+        total_qty = self.cum_qty[n - 1]
+        if total_qty == 0:
+            raise ValueError("VWAP computation has zero quantity")
+        return Decimal(self.cum_notional[n - 1]) / Decimal(total_qty) / _DSCALE
+
+    def vwap_curve(self) -> List[Decimal]:
+        """VWAP for every depth 1..len(side), read off the prefix sums."""
+        return [
+            Decimal(notional) / Decimal(qty) / _DSCALE if qty else Decimal("0")
+            for notional, qty in zip(self.cum_notional, self.cum_qty, strict=True)
+        ]
+
+    def weighted_median(self, depth: int) -> Decimal:
+        """Price of the level holding the middle unit of quantity within ``depth``."""
+        n = self._depth(depth)
+        total_qty = self.cum_qty[n - 1]
+        if total_qty == 0:
+            raise ValueError("Median computation has zero quantity")
+        # First level whose cumulative qty reaches half of the total
+        idx = bisect_left(self.cum_qty, (total_qty + 1) // 2, 0, n)
+        return Decimal(self.prices[idx]) / _DSCALE
+
+    def _notional_upto(self, qty: Decimal, n: int) -> Decimal:
+        """Notional of the first ``qty`` units of the book (partial last level)."""
+        if qty <= 0:
+            return Decimal("0")
+        idx = bisect_left(self.cum_qty, qty, 0, n)
+        idx = min(idx, n - 1)
+        before_qty = self.cum_qty[idx - 1] if idx else 0
+        before_notional = self.cum_notional[idx - 1] if idx else 0
+        return Decimal(before_notional) + Decimal(self.prices[idx]) * (qty - before_qty)
+
+    def trimmed_mean(self, depth: int, trim: Decimal = DEFAULT_TRIM) -> Decimal:
+        """Quantity-weighted mean after dropping ``trim`` of the quantity from each tail."""
+        if not Decimal("0") <= trim < Decimal("0.5"):
+            raise ValueError("Trim fraction must be in [0, 0.5)")
+        n = self._depth(depth)
+        total_qty = Decimal(self.cum_qty[n - 1])
+        if total_qty == 0:
+            raise ValueError("Trimmed mean computation has zero quantity")
+        lo = total_qty * trim
+        hi = total_qty - lo
+        notional = self._notional_upto(hi, n) - self._notional_upto(lo, n)
+        return notional / (hi - lo) / _DSCALE
+
+    def summary(self, depth: int, trim: Decimal = DEFAULT_TRIM) -> Dict[str, Decimal]:
+        return {
+            "best": self.best(),
+            "vwap": self.vwap(depth),
+            "median": self.weighted_median(depth),
+            "trimmed_mean": self.trimmed_mean(depth, trim),
+        }
+
+
+class BookAnalytics:
+    """Bid and ask sides of one snapshot; two-sided rates are the mean of both sides."""
+
+    __slots__ = ("bids", "asks")
+
+    def __init__(self, bids: BookSide, asks: BookSide) -> None:
+        self.bids = bids
+        self.asks = asks
+
+    @classmethod
+    def from_levels(
+        cls,
+        bids: Sequence[Tuple[Decimal, Decimal]],
+        asks: Sequence[Tuple[Decimal, Decimal]],
+    ) -> Optional["BookAnalytics"]:
+        bid_side = BookSide.from_levels(bids)
+        ask_side = BookSide.from_levels(asks)
+        if bid_side is None or ask_side is None:
+            return None
+        return cls(bid_side, ask_side)
+
+    def mid(self) -> Decimal:
+        return (self.bids.best() + self.asks.best()) / Decimal("2")
+
+    def vwap(self, depth: int) -> Decimal:
+        return (self.bids.vwap(depth) + self.asks.vwap(depth)) / Decimal("2")
+
+    def weighted_median(self, depth: int) -> Decimal:
+        return (self.bids.weighted_median(depth) + self.asks.weighted_median(depth)) / Decimal("2")
+
+    def trimmed_mean(self, depth: int, trim: Decimal = DEFAULT_TRIM) -> Decimal:
+        total = self.bids.trimmed_mean(depth, trim) + self.asks.trimmed_mean(depth, trim)
+        return total / Decimal("2")
+
+    def vwap_curve(self) -> List[Decimal]:
+        """Two-sided VWAP for every depth both sides can serve."""
+        # The deeper side's extra levels have no counterpart: stop at the shorter one
+        curves = zip(self.bids.vwap_curve(), self.asks.vwap_curve(), strict=False)
+        return [(b + a) / Decimal("2") for b, a in curves]
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import List, Optional, Sequence, Tuple
+
+import asyncpg
+import orjson
+from sqlalchemy import Column, DateTime, Index, Numeric, SmallInteger, String, Table
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.core.db import metadata
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.rates.models import RateMethod, RateSource
+from app.rates.record import RateRecord, us_to_datetime
+
+log = get_logger(__name__)
+
+ARCHIVE_TABLE = "rate_archive"
+ARCHIVE_COLUMNS = (
+    "source", "method", "mode", "geo", "depth", "value", "updated_at", "valid_until", "extras"
+)
+
+rate_archive = Table(
+    ARCHIVE_TABLE,
+    metadata,
+    Column("source", String(16), nullable=False),
+    Column("method", String(16), nullable=False),
+    Column("mode", String(16), nullable=False),
+    Column("geo", String(16), nullable=False),
+    Column("depth", SmallInteger, nullable=False, server_default="0"),
+    Column("value", Numeric(20, 6), nullable=False),
+    Column("updated_at", DateTime(timezone=True), nullable=False),
+    Column("valid_until", DateTime(timezone=True)),
+    Column("extras", JSONB),
+    Index(None, "source", "updated_at"),
+    postgresql_partition_by="RANGE (updated_at)",
+)
+
+
+def partition_name(day: date) -> str:
+    return f"{ARCHIVE_TABLE}_p{day:%Y%m%d}"
+
+
+def _utc_midnight(day: date) -> str:
+    # An explicit offset: a bare date would be read in the session's TimeZone
+    return f"{day.isoformat()} 00:00:00+00"
+
+
+def _partition_day(name: str) -> Optional[date]:
+    try:
+        return datetime.strptime(name.rsplit("_p", 1)[1], "%Y%m%d").date()
+    except (IndexError, ValueError):
+        return None
+
+
+class RateArchive:
+    """Day-partitioned Postgres archive of stored rates.
+
+    Rows are written in bulk with ``COPY``; every UTC day is its own
+    partition, so retention is a ``DROP TABLE`` and range queries only touch
+    the partitions they cover.
+    """
+
+    def __init__(self, pool: asyncpg.Pool) -> None:
+        self.pool = pool
+
+    async def ensure_partitions(self, start: date, days: int = 3) -> None:
+        async with self.pool.acquire() as conn:
+            for offset in range(days):
+                day = start + timedelta(days=offset)
+                lower, upper = _utc_midnight(day), _utc_midnight(day + timedelta(days=1))
+                # DDL takes no bind parameters; the bounds are UTC timestamps we format ourselves
+                await conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {partition_name(day)} "
+                    f"PARTITION OF {ARCHIVE_TABLE} FOR VALUES FROM ('{lower}') TO ('{upper}')"
+                )
+
+    async def drop_partitions_before(self, cutoff: date) -> List[str]:
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT child.relname
+                FROM pg_inherits
+                JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                WHERE parent.relname = $1
+                """,
+                ARCHIVE_TABLE,
+            )
+            dropped = []
+            for row in rows:
+                day = _partition_day(row["relname"])
+                if day is not None and day < cutoff:
+                    await conn.execute(f"DROP TABLE IF EXISTS {row['relname']}")
+                    dropped.append(row["relname"])
+        if dropped:
+            log.info("Rate archive partitions dropped", partitions=dropped)
+        return dropped
+
+    async def copy(self, records: Sequence[RateRecord]) -> int:
+        rows = [
+            (
+                record.source,
+                record.method,
+                record.mode,
+                record.geo,
+                record.depth or 0,
+                record.value,
+                us_to_datetime(record.updated_at_us),
+                None if record.valid_until_us is None else us_to_datetime(record.valid_until_us),
+                orjson.dumps(record.extras, default=str).decode(),
+            )
+            for record in records
+        ]
+        async with self.pool.acquire() as conn:
+            await conn.copy_records_to_table(ARCHIVE_TABLE, records=rows, columns=ARCHIVE_COLUMNS)
+        metrics.inc("rates.archive.rows", len(rows))
+        return len(rows)
+
+    async def query(
+        self,
+        source: RateSource,
+        start: datetime,
+        end: datetime,
+        method: Optional[RateMethod] = None,
+        limit: int = 10000,
+    ) -> List[Tuple[datetime, Decimal]]:
+        """(updated_at, value) pairs with ``start <= updated_at < end``, oldest first."""
+        sql = (
+            f"SELECT updated_at, value FROM {ARCHIVE_TABLE}"
+            " WHERE source = $1 AND updated_at >= $2 AND updated_at < $3"
+        )
+        args: List[object] = [source.value, start, end]
+        if method is not None:
+            args.append(method.value)
+            sql += f" AND method = ${len(args)}"
+        args.append(limit)
+        sql += f" ORDER BY updated_at LIMIT ${len(args)}"
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(sql, *args)
+        return [(row["updated_at"], row["value"]) for row in rows]
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+from enum import Enum
+from typing import Awaitable, Callable, TypeVar
+
+from redis.asyncio import Redis
+
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+
+log = get_logger(__name__)
+
+T = TypeVar("T")
+
+# Marks a circuit that tripped and has not closed again; kept well past any open period
+_TRIPPED_TTL = 24 * 3600
+
+# Counts a failure and starts the window on the first one, in one step: a
+# process dying between the INCR and the PEXPIRE would leave a counter that
+# never expires
+_FAILURE_SCRIPT = """
+local failures = redis.call('incr', KEYS[1])
+if failures == 1 then
+    redis.call('pexpire', KEYS[1], ARGV[1])
+end
+return failures
+"""
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """The upstream is known to be failing; the call was not attempted."""
+
+    def __init__(self, circuit: str) -> None:
+        super().__init__(f"Circuit {circuit} is open")
+        self.circuit = circuit
+
+
+class CircuitBreaker:
+    """Circuit breakers whose state lives in Redis, shared by every process.
+
+    Per circuit (e.g. ``bybit:api.bybit.com/v5/market/tickers``):
+
+    * ``closed`` — calls go through; ``failure_threshold`` failures within
+      ``window_sec`` open the circuit.
+    * ``open`` — calls fail fast with ``CircuitOpenError`` for ``open_sec``.
+    * ``half_open`` — after that, one probe call per ``probe_interval_ms``
+      across all processes is let through; success closes the circuit,
+      failure opens it again.
+
+    Redis errors never block a call: the circuit is then treated as closed.
+    """
+
+    def __init__(
+        self,
+        redis: Redis[bytes],
+        open_sec: float = 60.0,
+        failure_threshold: int = 5,
+        window_sec: float = 30.0,
+        probe_interval_ms: int = 5000,
+        prefix: str = "breaker",
+    ) -> None:
+        self.redis = redis
+        self.open_ms = int(open_sec * 1000)
+        self.failure_threshold = failure_threshold
+        self.window_ms = int(window_sec * 1000)
+        self.probe_interval_ms = probe_interval_ms
+        self.prefix = prefix
+
+    def _key(self, circuit: str, part: str) -> str:
+        return f"{self.prefix}:{circuit}:{part}"
+
+    async def state(self, circuit: str) -> CircuitState:
+        keys = self._key(circuit, "open"), self._key(circuit, "tripped")
+        opened, tripped = await self.redis.mget(keys)
+        if opened:
+            return CircuitState.OPEN
+        if tripped:
+            return CircuitState.HALF_OPEN
+        return CircuitState.CLOSED
+
+    async def call(self, circuit: str, fn: Callable[[], Awaitable[T]]) -> T:
+        try:
+            state = await self.state(circuit)
+            if state == CircuitState.HALF_OPEN and not await self._acquire_probe(circuit):
+                state = CircuitState.OPEN
+        except Exception as exc:  # noqa: BLE001 - never let the breaker take the call down
+            log.warning("Circuit breaker state unavailable", circuit=circuit, error=str(exc))
+            return await fn()
+
+        if state == CircuitState.OPEN:
+            metrics.inc("breaker.rejected", circuit=circuit)
+            raise CircuitOpenError(circuit)
+
+        try:
+            result = await fn()
+        except Exception:
+            await self._guard(self._on_failure(circuit, state), circuit)
+            raise
+        if state == CircuitState.HALF_OPEN:
+            await self._guard(self._close(circuit), circuit)
+        return result
+
+    async def _guard(self, update: Awaitable[None], circuit: str) -> None:
+        try:
+            await update
+        except Exception as exc:  # noqa: BLE001 - the call's own outcome matters more
+            log.warning("Circuit breaker update failed", circuit=circuit, error=str(exc))
+
+    async def _acquire_probe(self, circuit: str) -> bool:
+        probe = self._key(circuit, "probe")
+        return bool(await self.redis.set(probe, 1, nx=True, px=self.probe_interval_ms))
+
+    async def _on_failure(self, circuit: str, state: CircuitState) -> None:
+        if state == CircuitState.HALF_OPEN:
+            await self._open(circuit, state)
+            return
+        failures_key = self._key(circuit, "failures")
+        counted = await self.redis.eval(  # type: ignore[no-untyped-call]
+            _FAILURE_SCRIPT, 1, failures_key, self.window_ms
+        )
+        failures = int(counted)
+        if failures >= self.failure_threshold:
+            await self._open(circuit, state)
+
+    async def _open(self, circuit: str, previous: CircuitState) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(self._key(circuit, "open"), 1, px=self.open_ms)
+            pipe.set(self._key(circuit, "tripped"), 1, ex=_TRIPPED_TTL)
+            pipe.delete(self._key(circuit, "failures"))
+            await pipe.execute()
+        self._transition(circuit, previous, CircuitState.OPEN)
+
+    async def _close(self, circuit: str) -> None:
+        parts = ("tripped", "failures", "probe")
+        await self.redis.delete(*(self._key(circuit, part) for part in parts))
+        self._transition(circuit, CircuitState.HALF_OPEN, CircuitState.CLOSED)
+
+    @staticmethod
+    def _transition(circuit: str, previous: CircuitState, current: CircuitState) -> None:
+        before, after = previous.value, current.value
+        metrics.inc("breaker.transition", circuit=circuit, previous=before, current=after)
+        log.warning("Circuit breaker transition", circuit=circuit, previous=before, current=after)
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from app.core.metrics import metrics
+from app.rates.record import RateRecord
+
+
+class LocalRateCache:
+    """Bounded, TTL-aware in-process cache of decoded rate records.
+
+    Sits in front of Redis so hot keys cost neither a round trip nor a decode.
+    Entries are evicted in LRU order once ``max_entries`` is reached;
+    ``max_entries=0`` disables the cache.
+    """
+
+    def __init__(
+        self, max_entries: int = 1024, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, RateRecord]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[RateRecord]:
+        entry = self._entries.get(key)
+        if entry is None:
+            metrics.inc("rates.l1.miss")
+            return None
+        expires_at, record = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            metrics.inc("rates.l1.expired")
+            return None
+        self._entries.move_to_end(key)
+        metrics.inc("rates.l1.hit")
+        return record
+
+    def put(self, key: str, record: RateRecord, ttl: float) -> None:
+        if self.max_entries <= 0 or ttl <= 0:
+            return
+        self._entries[key] = (self._clock() + ttl, record)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            metrics.inc("rates.l1.evicted")
+
+    def touch(self, key: str, updated_at_us: int, ttl: float) -> bool:
+        """Move the cached record's ``updated_at`` forward; ``False`` if it is not cached."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        record = entry[1].refreshed(updated_at_us)
+        self.put(key, record, ttl - record.age())
+        return True
+
+    def invalidate(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
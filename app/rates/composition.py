@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.rates.singleflight import SingleFlight
+
+log = get_logger(__name__)
+
+LegLoader = Callable[[], Awaitable[Tuple[Decimal, Dict[str, Any]]]]
+
+
+class CompositionError(ValueError):
+    """A composed rate cannot be produced: some leg has no usable value."""
+
+
+@dataclass(frozen=True)
+class NodeValue:
+    value: Decimal
+    updated_at: datetime
+    loaded_at: float = 0.0  # graph clock; only meaningful for legs
+    raw: Dict[str, Any] = field(default_factory=dict, compare=False, repr=False)
+    reused: bool = False
+
+    def describe(self, now: datetime) -> Dict[str, Any]:
+        return {
+            "value": str(self.value),
+            "fetched_at": self.updated_at.isoformat(),
+            "age_sec": round((now - self.updated_at).total_seconds(), 3),
+            "reused": self.reused,
+        }
+
+
+@dataclass(frozen=True)
+class _Leg:
+    loader: LegLoader
+    ttl: float
+    max_age: float
+
+
+@dataclass(frozen=True)
+class _Node:
+    inputs: Tuple[str, ...]
+    combine: Callable[..., Decimal]
+
+
+class RateGraph:
+    """Rates defined as a graph of legs (fetched) and nodes (computed).
+
+    ``resolve(name)`` fetches only the legs ``name`` depends on that are older
+    than their ``ttl``, concurrently and under one deadline. A leg that fails
+    keeps its last value while that is younger than ``max_age``. Whenever a
+    leg changes — fetched here or pushed with ``set`` (e.g. from a stream) —
+    only the nodes downstream of it are recomputed; every node's last result
+    stays cached, so composed queries sharing legs never refetch them.
+    """
+
+    def __init__(self, name: str = "rates", clock: Callable[[], float] = time.monotonic) -> None:
+        self.name = name
+        self._clock = clock
+        self._legs: Dict[str, _Leg] = {}
+        self._nodes: Dict[str, _Node] = {}
+        # Nodes in registration order, which is a topological order (inputs must exist first)
+        self._order: List[str] = []
+        self._dependents: Dict[str, Set[str]] = {}
+        self._values: Dict[str, NodeValue] = {}
+        self._flight: SingleFlight[NodeValue] = SingleFlight(f"composition:{name}")
+
+    def leg(self, name: str, loader: LegLoader, ttl: float, max_age: float = 0.0) -> None:
+        self._check_new(name)
+        self._legs[name] = _Leg(loader, ttl, max(max_age, ttl))
+        self._dependents[name] = set()
+
+    def node(self, name: str, inputs: Sequence[str], combine: Callable[..., Decimal]) -> None:
+        self._check_new(name)
+        missing = [item for item in inputs if item not in self._dependents]
+        if missing:
+            raise ValueError(f"Node {name} depends on unknown {missing}")
+        self._nodes[name] = _Node(tuple(inputs), combine)
+        self._order.append(name)
+        self._dependents[name] = set()
+        for item in inputs:
+            self._dependents[item].add(name)
+
+    def _check_new(self, name: str) -> None:
+        if name in self._dependents:
+            raise ValueError(f"{name} is already defined")
+
+    def value(self, name: str) -> Optional[NodeValue]:
+        return self._values.get(name)
+
+    def _upstream(self, name: str) -> Set[str]:
+        """``name`` and every leg and node it (transitively) depends on."""
+        found: Set[str] = set()
+        stack = [name]
+        while stack:
+            current = stack.pop()
+            if current not in found:
+                found.add(current)
+                if current in self._nodes:
+                    stack.extend(self._nodes[current].inputs)
+        return found
+
+    def legs_of(self, name: str) -> List[str]:
+        """The legs ``name`` depends on, in registration order."""
+        upstream = self._upstream(name)
+        return [leg for leg in self._legs if leg in upstream]
+
+    def set(self, leg: str, value: Decimal, raw: Optional[Dict[str, Any]] = None) -> None:
+        """Store a new leg value and recompute what depends on it."""
+        self._values[leg] = NodeValue(value, datetime.now(timezone.utc), self._clock(), raw or {})
+        self._propagate({leg})
+
+    def _propagate(self, changed: Set[str]) -> None:
+        affected: Set[str] = set()
+        stack = list(changed)
+        while stack:
+            for dependent in self._dependents[stack.pop()]:
+                if dependent not in affected:
+                    affected.add(dependent)
+                    stack.append(dependent)
+        for name in self._order:
+            if name in affected:
+                self._recompute(name)
+
+    def _recompute(self, name: str) -> None:
+        node = self._nodes[name]
+        inputs = [self._values.get(item) for item in node.inputs]
+        if any(item is None for item in inputs):
+            self._values.pop(name, None)
+            return
+        try:
+            value = node.combine(*(item.value for item in inputs))  # type: ignore[union-attr]
+        except (ArithmeticError, InvalidOperation, ValueError) as exc:
+            log.warning("Composed rate failed", graph=self.name, node=name, error=str(exc))
+            self._values.pop(name, None)
+            return
+        updated_at = min(item.updated_at for item in inputs)  # type: ignore[union-attr]
+        self._values[name] = NodeValue(value, updated_at)
+        metrics.inc("composition.recomputed", graph=self.name, node=name)
+
+    def _fresh(self, leg: str) -> bool:
+        current = self._values.get(leg)
+        return current is not None and self._clock() - current.loaded_at <= self._legs[leg].ttl
+
+    async def _load(self, leg: str) -> NodeValue:
+        value, raw = await self._legs[leg].loader()
+        self.set(leg, value, raw)
+        return self._values[leg]
+
+    async def resolve(self, name: str, deadline: Optional[float] = None) -> NodeValue:
+        stale = [leg for leg in self.legs_of(name) if not self._fresh(leg)]
+        if stale:
+            await self._refresh(stale, deadline)
+        result = self._values.get(name)
+        if result is None:
+            raise CompositionError(f"{self.name}:{name} has no value")
+        return result
+
+    async def _refresh(self, legs: List[str], deadline: Optional[float]) -> None:
+        tasks = {
+            leg: asyncio.ensure_future(self._flight.do(leg, partial(self._load, leg)))
+            for leg in legs
+        }
+        try:
+            done, _ = await asyncio.wait(tasks.values(), timeout=deadline)
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        missing: Dict[str, str] = {}
+        for leg, task in tasks.items():
+            if task in done and task.exception() is None:
+                continue
+            error = str(task.exception()) if task in done else "deadline exceeded"
+            last = self._values.get(leg)
+            if last is None or self._clock() - last.loaded_at > self._legs[leg].max_age:
+                metrics.inc("composition.leg.failed", graph=self.name, leg=leg)
+                missing[leg] = error
+                continue
+            metrics.inc("composition.leg.reused", graph=self.name, leg=leg)
+            log.warning("Composed rate leg reused", graph=self.name, leg=leg, error=error)
+            # Same value, so nothing downstream needs recomputing
+            self._values[leg] = replace(last, reused=True)
+        if missing:
+            raise CompositionError(f"{self.name} legs unavailable: {missing}")
+
+    def describe(self, name: str) -> Dict[str, Any]:
+        """Each leg's freshness and each node's value behind ``name``, for extras."""
+        now = datetime.now(timezone.utc)
+        upstream = self._upstream(name)
+        known = upstream & self._values.keys()
+        legs = {leg: self._values[leg].describe(now) for leg in self._legs if leg in known}
+        nodes = {node: str(self._values[node].value) for node in self._order if node in known}
+        return {"legs": legs, "composed": nodes}
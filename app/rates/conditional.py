@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+import orjson
+
+from app.core.metrics import metrics
+
+
+@dataclass(frozen=True)
+class Fetched:
+    """A JSON document and whether it differs from the previous one for its URL."""
+
+    data: Any
+    digest: str
+    changed: bool
+
+
+@dataclass(frozen=True)
+class _Entry:
+    etag: Optional[str]
+    last_modified: Optional[str]
+    digest: str
+    size: int
+    data: Any
+
+
+def body_digest(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class ConditionalCache:
+    """Per-URL validators and body digests of the last good response.
+
+    Requests carry ``If-None-Match`` / ``If-Modified-Since`` when the upstream
+    sent validators; a ``304`` or a body hashing to the same digest returns the
+    previous parsed document, so unchanged payloads are neither downloaded
+    again (where supported) nor re-parsed.
+    """
+
+    def __init__(self, source: str, max_entries: int = 64) -> None:
+        self.source = source
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    def headers(self, url: str) -> Dict[str, str]:
+        entry = self._entries.get(url)
+        if entry is None:
+            return {}
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def handle(
+        self, url: str, resp: httpx.Response, parse: Callable[[bytes], Any] = orjson.loads
+    ) -> Fetched:
+        entry = self._entries.get(url)
+        if resp.status_code == httpx.codes.NOT_MODIFIED and entry is not None:
+            self._entries.move_to_end(url)
+            metrics.inc("rates.http.not_modified", source=self.source)
+            metrics.inc("rates.http.bytes_saved", entry.size, source=self.source)
+            return Fetched(entry.data, entry.digest, changed=False)
+        resp.raise_for_status()
+
+        body = resp.content
+        digest = body_digest(body)
+        if entry is not None and entry.digest == digest:
+            self._entries.move_to_end(url)
+            metrics.inc("rates.http.unchanged", source=self.source)
+            return Fetched(entry.data, digest, changed=False)
+
+        data = parse(body)
+        self._entries[url] = _Entry(
+            etag=resp.headers.get("ETag"),
+            last_modified=resp.headers.get("Last-Modified"),
+            digest=digest,
+            size=len(body),
+            data=data,
+        )
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return Fetched(data, digest, changed=True)
@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+import orjson
+from redis.asyncio import Redis
+
+from app.core.config import Settings
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.rates.models import BybitMode, GeoOption, RateMethod, RatePayload, RateQuery, RateSource
+from app.rates.providers.bybit import BybitProvider
+from app.rates.service import RateService
+from app.utils.formatting import BidAsk, format_all_rates, format_mosca_pair, format_rate
+
+log = get_logger(__name__)
+
+DASHBOARD_VIEW = "dashboard"
+MOSCA_VIEW = "card:mosca"
+CARD_SOURCES = (RateSource.GRINEX, RateSource.RAPIRA, RateSource.BYBIT)
+
+VIEW_KEY_PREFIX = "render:"
+VIEW_VERSION_KEY = "render:version"
+
+
+def card_view(source: RateSource) -> str:
+    return f"card:{source.value}"
+
+
+def view_key(name: str) -> str:
+    return f"{VIEW_KEY_PREFIX}{name}"
+
+
+@dataclass(frozen=True)
+class RenderedView:
+    """A rendered rates screen.
+
+    ``version`` grows every time the worker publishes a changed text; views
+    rendered locally because no published one was available carry
+    ``fallback=True`` and version 0.
+    """
+
+    text: str
+    version: int
+    rendered_at: float
+    fallback: bool = False
+
+    def encode(self) -> bytes:
+        return orjson.dumps(
+            {
+                "text": self.text,
+                "version": self.version,
+                "rendered_at": self.rendered_at,
+                "fallback": self.fallback,
+            }
+        )
+
+    @classmethod
+    def decode(cls, raw: bytes) -> "RenderedView":
+        data = orjson.loads(raw)
+        return cls(
+            text=data["text"],
+            version=int(data["version"]),
+            rendered_at=float(data["rendered_at"]),
+            fallback=bool(data.get("fallback", False)),
+        )
+
+
+def dashboard_queries(settings: Settings) -> Dict[RateSource, RateQuery]:
+    """Rates shown on the "Курсы" dashboard."""
+    return {
+        source: RateQuery(
+            source=source,
+            method=RateMethod.MID,
+            geo=GeoOption(settings.default_geo),
+            # Средний курс Bybit (для блока "Bybit (средний)") берется в режиме из настроек
+            mode=(
+                BybitMode(settings.bybit_mode)
+                if source == RateSource.BYBIT
+                else BybitMode.ORDERBOOK
+            ),
+        )
+        for source in CARD_SOURCES
+    }
+
+
+def card_query(settings: Settings, source: RateSource) -> RateQuery:
+    """Query behind a source card with the default preferences."""
+    if source == RateSource.BYBIT:
+        return RateQuery(
+            source=source,
+            method=RateMethod(settings.default_method),
+            geo=GeoOption(settings.default_geo),
+            mode=BybitMode(settings.bybit_mode),
+        )
+    return RateQuery(
+        source=source,
+        method=RateMethod.MID,
+        geo=GeoOption(settings.default_geo),
+        mode=BybitMode.ORDERBOOK,
+    )
+
+
+def view_queries(settings: Settings, cards: bool = True) -> Dict[str, RateQuery]:
+    """Every rate the pre-rendered screens need, by name."""
+    queries = {
+        f"{DASHBOARD_VIEW}:{source.value}": query
+        for source, query in dashboard_queries(settings).items()
+    }
+    if cards:
+        queries.update({card_view(source): card_query(settings, source) for source in CARD_SOURCES})
+    return queries
+
+
+async def fetch_mosca_pair(rate_service: RateService, settings: Settings) -> Optional[BidAsk]:
+    """
+    Берем bid/ask из ордербука Bybit и представляем как пару Mosca.
+    """
+    provider = rate_service.providers.get(RateSource.BYBIT)
+    if not provider or not isinstance(provider, BybitProvider):
+        return None
+    query = RateQuery(
+        source=RateSource.BYBIT,
+        method=RateMethod.BEST,
+        geo=GeoOption(settings.default_geo),
+        mode=BybitMode.ORDERBOOK,
+    )
+    try:
+        bid, ask = await provider.fetch_bid_ask(query)
+    except Exception:
+        return None
+    return BidAsk(bid=bid, ask=ask)
+
+
+async def fetch_p2p_pair(rate_service: RateService) -> Optional[BidAsk]:
+    """Bid/ask from the Bybit P2P ads snapshot, if P2P is enabled."""
+    provider = rate_service.providers.get(RateSource.BYBIT)
+    p2p = getattr(provider, "p2p", None)
+    if p2p is None:
+        return None
+    try:
+        bid, ask = (await p2p.snapshot()).bid_ask()
+    except Exception as exc:  # noqa: BLE001 - the block then says there is no data
+        log.warning("Failed to load Bybit P2P ads", error=str(exc))
+        return None
+    return BidAsk(bid=bid, ask=ask)
+
+
+def _ttl_for_source(settings: Settings, source: RateSource) -> int:
+    ttls = settings.cache_ttl_per_source.model_dump()
+    return int(ttls.get(source.value, 30))
+
+
+async def render_views(
+    rate_service: RateService,
+    settings: Settings,
+    force: bool = False,
+    cards: bool = True,
+) -> Dict[str, str]:
+    """Render the dashboard (and, with ``cards``, every default source card).
+
+    All rates come from one ``get_many`` call; the Bybit bid/ask pair and the
+    P2P snapshot are fetched concurrently with it.
+    """
+    queries = view_queries(settings, cards=cards)
+    payloads_result, mosca_result, p2p_result = await asyncio.gather(
+        rate_service.get_many(queries, force=force),
+        fetch_mosca_pair(rate_service, settings),
+        fetch_p2p_pair(rate_service),
+        return_exceptions=True,
+    )
+    payloads: Dict[str, RatePayload] = {}
+    if isinstance(payloads_result, BaseException):
+        log.warning("Failed to load rates for rendering", error=str(payloads_result))
+    else:
+        payloads = payloads_result
+    mosca_pair: Optional[BidAsk] = None if isinstance(mosca_result, BaseException) else mosca_result
+    p2p_pair: Optional[BidAsk] = None if isinstance(p2p_result, BaseException) else p2p_result
+
+    for payload in payloads.values():
+        ttl = _ttl_for_source(settings, payload.source)
+        RateService.mark_stale(payload, ttl=ttl, warn_age=int(settings.rate_warn_age_sec or ttl))
+
+    dashboard = {
+        source: payloads.get(f"{DASHBOARD_VIEW}:{source.value}") for source in CARD_SOURCES
+    }
+    views = {
+        DASHBOARD_VIEW: format_all_rates(
+            dashboard[RateSource.GRINEX],
+            dashboard[RateSource.RAPIRA],
+            mosca_pair,
+            dashboard[RateSource.BYBIT],
+            p2p_pair,
+        )
+    }
+    if cards:
+        for source in CARD_SOURCES:
+            card = payloads.get(card_view(source))
+            if card is not None:
+                views[card_view(source)] = format_rate(card)
+        if mosca_pair is not None:
+            views[MOSCA_VIEW] = format_mosca_pair(mosca_pair)
+    return views
+
+
+async def load_view(redis: Redis[bytes], name: str) -> Optional[RenderedView]:
+    try:
+        raw = await redis.get(view_key(name))
+    except Exception as exc:  # noqa: BLE001 - render locally instead
+        log.warning("Failed to load rendered view", view=name, error=str(exc))
+        return None
+    if not raw:
+        return None
+    try:
+        return RenderedView.decode(raw)
+    except (orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+        return None
+
+
+async def load_views(redis: Redis[bytes], names: Sequence[str]) -> Dict[str, RenderedView]:
+    """The published views among ``names``, in one round trip; never renders."""
+    try:
+        raws = await redis.mget([view_key(name) for name in names])
+    except Exception as exc:  # noqa: BLE001 - callers treat it as nothing published
+        log.warning("Failed to load rendered views", error=str(exc))
+        return {}
+    views: Dict[str, RenderedView] = {}
+    for name, raw in zip(names, raws, strict=True):
+        if not raw:
+            continue
+        try:
+            views[name] = RenderedView.decode(raw)
+        except (orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+            continue
+    return views
+
+
+async def get_view(
+    redis: Redis[bytes],
+    name: str,
+    render: Callable[[], Awaitable[Optional[str]]],
+) -> Optional[RenderedView]:
+    """The published view, or one rendered locally (``fallback=True``) if there is none."""
+    view = await load_view(redis, name)
+    if view is not None:
+        metrics.inc("rates.view.hit", view=name)
+        return view
+    metrics.inc("rates.view.fallback", view=name)
+    text = await render()
+    if text is None:
+        return None
+    return RenderedView(text=text, version=0, rendered_at=time.time(), fallback=True)
+
+
+class ViewPublisher:
+    """Publishes rendered views to Redis, bumping the version only on change.
+
+    Unchanged views are rewritten as they were, which only extends their
+    expiry: readers can cache by version, and the entries disappear if the
+    worker stops refreshing them.
+    """
+
+    def __init__(self, redis: Redis[bytes], ttl: int = 30) -> None:
+        self.redis = redis
+        self.ttl = ttl
+        self._views: Dict[str, RenderedView] = {}
+
+    async def publish(self, views: Dict[str, str]) -> List[str]:
+        """Store ``views``; returns the names whose text changed."""
+        unknown = [name for name in views if name not in self._views]
+        if unknown:
+            # After a restart compare against what is already published
+            published = await self.redis.mget([view_key(name) for name in unknown])
+            for name, raw in zip(unknown, published, strict=True):
+                if raw:
+                    try:
+                        self._views[name] = RenderedView.decode(raw)
+                    except (orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+                        pass
+
+        changed = [
+            name
+            for name, text in views.items()
+            if name not in self._views or self._views[name].text != text
+        ]
+        if changed:
+            version = int(await self.redis.incr(VIEW_VERSION_KEY))
+            rendered_at = time.time()
+            for name in changed:
+                self._views[name] = RenderedView(
+                    text=views[name], version=version, rendered_at=rendered_at
+                )
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for name in views:
+                pipe.set(view_key(name), self._views[name].encode(), ex=self.ttl)
+            await pipe.execute()
+        if changed:
+            metrics.inc("rates.view.published", len(changed))
+            log.info("Rendered views published", version=version, views=changed)
+        return changed
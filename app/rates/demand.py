@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from typing import Dict, Set
+
+from redis.asyncio import Redis
+
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.rates.models import RateQuery
+
+log = get_logger(__name__)
+
+# Hash of cache key -> requests since the scheduler last drained it
+DEMAND_KEY = "rates:demand"
+# Hash of cache key -> RateQuery JSON, so the worker can refresh keys it never saw
+DEMAND_QUERIES_KEY = "rates:demand:queries"
+DEMAND_QUERIES_TTL = 7 * 24 * 3600
+
+
+class DemandTracker:
+    """Counts rate requests per cache key and flushes the counts to Redis.
+
+    Recording is a dict increment; one pipeline per ``flush_interval`` ships
+    the batch to the worker's refresh scheduler.
+    """
+
+    def __init__(self, redis: Redis[bytes], flush_interval: float = 5.0) -> None:
+        self.redis = redis
+        self.flush_interval = flush_interval
+        self._counts: Counter[str] = Counter()
+        self._queries: Dict[str, RateQuery] = {}
+        self._announced: Set[str] = set()
+
+    def record(self, key: str, query: RateQuery) -> None:
+        self._counts[key] += 1
+        if key not in self._announced:
+            self._queries[key] = query
+
+    async def flush(self) -> None:
+        if not self._counts:
+            return
+        counts, self._counts = self._counts, Counter()
+        new = {
+            key: self._queries[key].model_dump_json()
+            for key in counts
+            if key not in self._announced
+        }
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, count in counts.items():
+                    pipe.hincrby(DEMAND_KEY, key, count)
+                for key, query_json in new.items():
+                    pipe.hset(DEMAND_QUERIES_KEY, key, query_json)
+                pipe.expire(DEMAND_QUERIES_KEY, DEMAND_QUERIES_TTL)
+                await pipe.execute()
+        except Exception:
+            # Keep the batch for the next attempt
+            self._counts.update(counts)
+            raise
+        self._announced.update(new)
+        for key in new:
+            self._queries.pop(key, None)
+        metrics.inc("rates.demand.flushed", sum(counts.values()))
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # noqa: BLE001 - retried on the next flush
+                log.warning("Failed to flush rate demand", error=str(exc))
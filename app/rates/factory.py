@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+import httpx
+from redis.asyncio import Redis
+
+from app.core.config import Settings
+from app.rates.breaker import CircuitBreaker
+from app.rates.fx import FxOracle
+from app.rates.models import RateSource
+from app.rates.orderbook import OrderBookSnapshot, SnapshotCache
+from app.rates.providers.bybit import BybitProvider
+from app.rates.providers.bybit_p2p import BybitP2PBook
+from app.rates.providers.bybit_stream import BybitStreamProvider
+from app.rates.providers.grinex import GrinexProvider
+from app.rates.providers.rapira import RapiraProvider
+from app.rates.service import RateProvider
+
+
+def build_rate_providers(
+    http_client: httpx.AsyncClient,
+    settings: Settings,
+    redis: Optional[Redis[bytes]] = None,
+) -> Dict[RateSource, RateProvider]:
+    """Providers shared by the bot and the worker, wired to one FX oracle.
+
+    With ``redis`` every upstream endpoint gets a circuit breaker shared by
+    all processes.
+    """
+    breaker = None
+    if redis is not None:
+        breaker = CircuitBreaker(
+            redis,
+            open_sec=float(settings.circuit_breaker_open_sec or 60),
+            failure_threshold=int(settings.circuit_breaker_failures or 5),
+            window_sec=float(settings.circuit_breaker_window_sec or 30),
+            probe_interval_ms=int(settings.circuit_breaker_probe_ms or 5000),
+        )
+    fx_oracle = FxOracle(
+        http_client,
+        ttl=float(settings.fx_cache_ttl_sec or 60),
+        hedge_delay=float(settings.fx_hedge_delay_ms or 300) / 1000,
+    )
+    tick = float(settings.orderbook_tick_sec or 1.0)
+    snapshots: SnapshotCache[OrderBookSnapshot] = SnapshotCache(tick=tick)
+    leg_deadline = float(settings.bybit_leg_deadline_ms or 2500) / 1000
+    leg_max_age = float(settings.bybit_leg_max_age_sec or 300)
+    p2p = build_p2p_book(http_client, settings, breaker)
+    bybit: BybitProvider
+    if settings.bybit_ws_endpoint:
+        bybit = BybitStreamProvider(
+            http_client,
+            settings.bybit_endpoint or "",
+            ws_endpoint=settings.bybit_ws_endpoint,
+            symbol=settings.bybit_ws_symbol or "USDTRUB",
+            snapshots=snapshots,
+            fx_oracle=fx_oracle,
+            breaker=breaker,
+            leg_deadline=leg_deadline,
+            leg_max_age=leg_max_age,
+            p2p=p2p,
+        )
+    else:
+        bybit = BybitProvider(
+            http_client,
+            settings.bybit_endpoint or "",
+            snapshots=snapshots,
+            fx_oracle=fx_oracle,
+            breaker=breaker,
+            leg_deadline=leg_deadline,
+            leg_max_age=leg_max_age,
+            p2p=p2p,
+        )
+    return {
+        RateSource.BYBIT: bybit,
+        RateSource.RAPIRA: RapiraProvider(
+            http_client,
+            settings.rapira_endpoint or "",
+            fx_oracle=fx_oracle,
+            breaker=breaker,
+            snapshots=SnapshotCache(tick=float(settings.orderbook_tick_sec or 1.0)),
+        ),
+        RateSource.GRINEX: GrinexProvider(
+            http_client, settings.grinex_endpoint or "", fx_oracle=fx_oracle, breaker=breaker
+        ),
+    }
+
+
+def build_p2p_book(
+    http_client: httpx.AsyncClient,
+    settings: Settings,
+    breaker: Optional[CircuitBreaker] = None,
+) -> Optional[BybitP2PBook]:
+    if not settings.feature_flags.enable_p2p_source:
+        return None
+    payments = [p.strip() for p in (settings.bybit_p2p_payments or "").split(",") if p.strip()]
+    amount = settings.bybit_p2p_amount
+    return BybitP2PBook(
+        http_client,
+        settings.bybit_p2p_endpoint or "",
+        payments=payments,
+        amount=Decimal(str(amount)) if amount else None,
+        page_size=int(settings.bybit_p2p_page_size or 20),
+        max_pages=int(settings.bybit_p2p_max_pages or 5),
+        concurrency=int(settings.bybit_p2p_concurrency or 4),
+        percentile=float(settings.bybit_p2p_percentile or 10),
+        cache_sec=float(settings.bybit_p2p_cache_sec or 30),
+        breaker=breaker,
+    )
+
+
+def start_rate_streams(providers: Dict[RateSource, RateProvider]) -> List[asyncio.Task[None]]:
+    """Start background tasks for providers fed by a stream (cancel them on shutdown)."""
+    return [
+        asyncio.create_task(provider.run())
+        for provider in providers.values()
+        if isinstance(provider, BybitStreamProvider)
+    ]
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.rates.conditional import ConditionalCache
+from app.rates.singleflight import SingleFlight
+
+log = get_logger(__name__)
+
+FxQuote = Tuple[Decimal, Dict[str, Any]]
+
+DEFAULT_FX_ENDPOINTS: Tuple[str, ...] = (
+    # exchangerate.host
+    "https://api.exchangerate.host/latest?base=USD&symbols=RUB",
+    # open.er-api.com
+    "https://open.er-api.com/v6/latest/USD",
+    # frankfurter.app
+    "https://api.frankfurter.app/latest?from=USD&to=RUB",
+    # fawazahmed0/currency-api (cdn, community)
+    "https://cdn.jsdelivr.net/gh/fawazahmed0/currency-api@1/latest/currencies/usd/rub.json",
+)
+
+
+def parse_usd_rub(data: Any) -> Optional[Decimal]:
+    """Extract USD->RUB from the response shapes of the known public FX APIs."""
+    if not isinstance(data, dict):
+        return None
+    # Try known shapes
+    if "rates" in data and isinstance(data["rates"], dict) and "RUB" in data["rates"]:
+        return Decimal(str(data["rates"]["RUB"]))
+    if "result" in data and isinstance(data["result"], dict) and "RUB" in data["result"]:
+        return Decimal(str(data["result"]["RUB"]))
+    if "rub" in data:  # fawazahmed0 json shape
+        return Decimal(str(data["rub"]))
+    if "RUB" in data:  # some APIs may flatten
+        return Decimal(str(data["RUB"]))
+    # As a last resort, if there's a numeric 'rate' field
+    rate_val = data.get("rate")
+    if rate_val is not None:
+        return Decimal(str(rate_val))
+    return None
+
+
+@dataclass
+class EndpointHealth:
+    failures: int = 0
+    skip_until: float = 0.0
+
+
+class FxOracle:
+    """Shared USD->RUB rate for every provider's fallback path.
+
+    Answers come from a TTL cache; on a miss the public endpoints are queried
+    hedged: the next endpoint starts after ``hedge_delay`` (or as soon as the
+    previous one fails) and the first valid answer wins. Endpoints failing
+    ``failure_threshold`` times in a row are skipped for ``cooldown`` seconds.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        endpoints: Sequence[str] = DEFAULT_FX_ENDPOINTS,
+        ttl: float = 60.0,
+        hedge_delay: float = 0.3,
+        failure_threshold: int = 3,
+        cooldown: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.client = client
+        self.endpoints = list(endpoints)
+        self.ttl = ttl
+        self.hedge_delay = hedge_delay
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._clock = clock
+        self._health: Dict[str, EndpointHealth] = {url: EndpointHealth() for url in self.endpoints}
+        self._cached: Optional[Tuple[float, FxQuote]] = None
+        self._flight: SingleFlight[FxQuote] = SingleFlight("fx")
+        # These endpoints publish once a day or so; most polls come back 304 or byte-identical
+        self._conditional = ConditionalCache("fx", max_entries=max(len(self.endpoints), 1))
+
+    @property
+    def health(self) -> Dict[str, EndpointHealth]:
+        return self._health
+
+    async def get_usd_rub(self) -> FxQuote:
+        cached = self._cached
+        if cached is not None and cached[0] > self._clock():
+            metrics.inc("fx.cache.hit")
+            return cached[1]
+        return await self._flight.do("usd_rub", self._refresh)
+
+    def _candidates(self) -> List[str]:
+        now = self._clock()
+        healthy = [url for url in self.endpoints if self._health[url].skip_until <= now]
+        # When everything is cooling down, probe them all rather than fail outright
+        return healthy or list(self.endpoints)
+
+    async def _refresh(self) -> FxQuote:
+        quote = await self._fetch_hedged(self._candidates())
+        self._cached = (self._clock() + self.ttl, quote)
+        return quote
+
+    async def _fetch_hedged(self, urls: List[str]) -> FxQuote:
+        queue = list(urls)
+        pending: Set[asyncio.Task[FxQuote]] = set()
+        try:
+            while queue or pending:
+                if queue:
+                    if pending:
+                        metrics.inc("fx.hedged")
+                    pending.add(asyncio.create_task(self._query(queue.pop(0))))
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=self.hedge_delay if queue else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise RuntimeError("Failed to fetch USD->RUB from public endpoints")
+
+    async def _query(self, url: str) -> FxQuote:
+        host = urlsplit(url).netloc
+        started = self._clock()
+        try:
+            resp = await self.client.get(url, headers=self._conditional.headers(url))
+            data = self._conditional.handle(url, resp).data
+            rate = parse_usd_rub(data)
+            if rate is None:
+                raise ValueError("USD->RUB not found in response")
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            self._record_failure(url, host, exc)
+            raise
+        health = self._health[url]
+        health.failures = 0
+        health.skip_until = 0.0
+        metrics.inc("fx.endpoint.ok", host=host)
+        metrics.observe("fx.endpoint.latency_sec", self._clock() - started, host=host)
+        return rate, data
+
+    def _record_failure(self, url: str, host: str, exc: Exception) -> None:
+        health = self._health[url]
+        health.failures += 1
+        metrics.inc("fx.endpoint.failed", host=host)
+        if health.failures >= self.failure_threshold:
+            health.skip_until = self._clock() + self.cooldown
+            log.warning("FX endpoint skipped", host=host, failures=health.failures, error=str(exc))
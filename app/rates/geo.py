@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, Mapping, Union
+
+from app.core.config import Settings
+from app.rates.models import GeoOption, RatePayload, RateQuery
+
+_QUANT = Decimal("0.000001")
+
+
+class GeoTable:
+    """City coefficients applied on top of the base (geo ``none``) rate.
+
+    A city's rate is ``base * (1 + k)``. Only the base rate is fetched and
+    cached; every city is derived from it in process, so adding a city costs
+    no upstream calls and no cache entries.
+    """
+
+    def __init__(self, coefficients: Mapping[str, Union[Decimal, float, str]]) -> None:
+        self._coefficients: Dict[str, Decimal] = {
+            name.lower(): Decimal(str(k)) for name, k in coefficients.items()
+        }
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "GeoTable":
+        # GEO_K_RIO / GEO_K_BERLIN predate the table and still seed it
+        table: Dict[str, Union[Decimal, float, str]] = {
+            GeoOption.RIO.value: settings.geo_k_rio or 0.0,
+            GeoOption.BERLIN.value: settings.geo_k_berlin or 0.0,
+        }
+        table.update(settings.geo_coefficients or {})
+        return cls(table)
+
+    def coefficient(self, geo: GeoOption) -> Decimal:
+        return self._coefficients.get(geo.value, Decimal(0))
+
+    @staticmethod
+    def base(query: RateQuery) -> RateQuery:
+        if query.geo == GeoOption.NONE:
+            return query
+        return query.model_copy(update={"geo": GeoOption.NONE})
+
+    def apply(self, payload: RatePayload, geo: GeoOption) -> RatePayload:
+        if geo == GeoOption.NONE:
+            return payload
+        k = self.coefficient(geo)
+        value = (payload.value * (1 + k)).quantize(_QUANT, rounding=ROUND_HALF_UP)
+        extras = {**payload.extras, "geo_k": str(k), "base_value": str(payload.value)}
+        return payload.model_copy(update={"geo": geo, "value": value, "extras": extras})
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import struct
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+from app.core.metrics import metrics
+from app.rates.record import VALUE_DIGITS, RateRecord
+
+# Raw points: one sorted set per cache key, scored by epoch microseconds. The
+# member is the packed (timestamp, value) pair, so equal values at different
+# times stay distinct and a read needs no second lookup.
+SERIES_PREFIX = "hist:"
+SERIES_INDEX_KEY = "hist:series"
+CURSOR_PREFIX = "hist:cursor:"
+CANDLE_PREFIX = "ohlc:"
+
+# Candle resolution in seconds -> number of candles kept
+RESOLUTIONS: Dict[int, int] = {60: 24 * 60, 300: 7 * 24 * 12, 3600: 90 * 24}
+RESOLUTION_LABELS: Dict[str, int] = {"1m": 60, "5m": 300, "1h": 3600}
+
+_POINT = struct.Struct(">qq")
+_CANDLE = struct.Struct(">qqqqqi")
+_US = 1_000_000
+
+
+@dataclass(frozen=True)
+class RatePoint:
+    ts_us: int
+    value_micros: int
+
+    @property
+    def value(self) -> Decimal:
+        return Decimal(self.value_micros).scaleb(-VALUE_DIGITS)
+
+    def pack(self) -> bytes:
+        return _POINT.pack(self.ts_us, self.value_micros)
+
+    @classmethod
+    def unpack(cls, raw: bytes) -> "RatePoint":
+        return cls(*_POINT.unpack(raw))
+
+
+@dataclass
+class Candle:
+    start: int  # epoch seconds, aligned to the resolution
+    open: int
+    high: int
+    low: int
+    close: int
+    count: int
+
+    @classmethod
+    def first(cls, start: int, value: int) -> "Candle":
+        return cls(start, value, value, value, value, 1)
+
+    def add(self, value: int) -> None:
+        self.high = max(self.high, value)
+        self.low = min(self.low, value)
+        self.close = value
+        self.count += 1
+
+    def price(self, field: str) -> Decimal:
+        return Decimal(getattr(self, field)).scaleb(-VALUE_DIGITS)
+
+    def pack(self) -> bytes:
+        return _CANDLE.pack(self.start, self.open, self.high, self.low, self.close, self.count)
+
+    @classmethod
+    def unpack(cls, raw: bytes) -> "Candle":
+        return cls(*_CANDLE.unpack(raw))
+
+
+def series_name(cache_key: str) -> str:
+    """``rate:bybit:mid:none:orderbook:0`` -> ``bybit:mid:none:orderbook:0``."""
+    return cache_key.split(":", 1)[1] if cache_key.startswith("rate:") else cache_key
+
+
+class RateHistory:
+    """Per-key rate time series and their OHLC rollups in Redis sorted sets.
+
+    Appends ride along with the rate write pipeline; each series is capped at
+    ``max_points`` like a ring buffer. Range reads are ``ZRANGEBYSCORE``, i.e.
+    O(log n + m) without scanning.
+    """
+
+    def __init__(self, redis: Redis[bytes], max_points: int = 20000) -> None:
+        self.redis = redis
+        self.max_points = max_points
+
+    @staticmethod
+    def series_key(series: str) -> str:
+        return f"{SERIES_PREFIX}{series}"
+
+    @staticmethod
+    def candle_key(series: str, resolution: int) -> str:
+        return f"{CANDLE_PREFIX}{resolution}:{series}"
+
+    def append_in(self, pipe: Pipeline[bytes], cache_key: str, record: RateRecord) -> None:
+        if self.max_points <= 0:
+            return
+        series = series_name(cache_key)
+        key = self.series_key(series)
+        point = RatePoint(record.updated_at_us, record.value_micros)
+        pipe.zadd(key, {point.pack(): point.ts_us})
+        pipe.zremrangebyrank(key, 0, -self.max_points - 1)
+        pipe.sadd(SERIES_INDEX_KEY, series)
+
+    async def points(self, series: str, start: float, end: float) -> List[RatePoint]:
+        """Raw points with ``start <= ts <= end`` (epoch seconds)."""
+        key = self.series_key(series)
+        raw = await self.redis.zrangebyscore(key, int(start * _US), int(end * _US))
+        return [RatePoint.unpack(item) for item in raw]
+
+    async def candles(self, series: str, resolution: int, start: float, end: float) -> List[Candle]:
+        """Candles whose bucket starts within ``[start, end]`` (epoch seconds)."""
+        key = self.candle_key(series, resolution)
+        raw = await self.redis.zrangebyscore(key, int(start), int(end))
+        return [Candle.unpack(item) for item in raw]
+
+    async def series(self) -> List[str]:
+        members = await self.redis.smembers(SERIES_INDEX_KEY)
+        return sorted(item.decode() if isinstance(item, bytes) else item for item in members)
+
+    async def roll_up(self, series: str, until: float) -> int:
+        """Fold the points appended since the last call into every resolution.
+
+        Only points up to ``until`` (epoch seconds) are taken, so a writer
+        that lands slightly late is not skipped. Returns the number of points
+        processed.
+        """
+        cursor_key = f"{CURSOR_PREFIX}{series}"
+        cursor = await self.redis.get(cursor_key)
+        low = f"({int(cursor)}" if cursor else "-inf"
+        raw = await self.redis.zrangebyscore(self.series_key(series), low, int(until * _US))
+        if not raw:
+            return 0
+        points = [RatePoint.unpack(item) for item in raw]
+
+        # The candle the previous run left open may keep growing
+        first_ts = points[0].ts_us // _US
+        open_candles: Dict[int, Optional[Candle]] = {}
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for resolution in RESOLUTIONS:
+                bucket = first_ts - first_ts % resolution
+                pipe.zrangebyscore(self.candle_key(series, resolution), bucket, bucket)
+            for resolution, found in zip(RESOLUTIONS, await pipe.execute(), strict=True):
+                open_candles[resolution] = Candle.unpack(found[-1]) if found else None
+
+        updated: Dict[int, List[Candle]] = {}
+        for resolution in RESOLUTIONS:
+            candles = updated.setdefault(resolution, [])
+            current = open_candles[resolution]
+            for point in points:
+                ts = point.ts_us // _US
+                bucket = ts - ts % resolution
+                if current is not None and current.start == bucket:
+                    current.add(point.value_micros)
+                    continue
+                if current is not None:
+                    candles.append(current)
+                current = Candle.first(bucket, point.value_micros)
+            if current is not None:
+                candles.append(current)
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for resolution, candles in updated.items():
+                key = self.candle_key(series, resolution)
+                for candle in candles:
+                    pipe.zremrangebyscore(key, candle.start, candle.start)
+                    pipe.zadd(key, {candle.pack(): candle.start})
+                pipe.zremrangebyrank(key, 0, -RESOLUTIONS[resolution] - 1)
+            pipe.set(cursor_key, points[-1].ts_us)
+            await pipe.execute()
+        metrics.inc("rates.history.rolled_up", len(points))
+        return len(points)
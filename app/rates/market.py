@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import json
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Union
+
+import orjson
+
+from app.core.metrics import metrics
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r"\s*")
+_SEPARATORS = re.compile(r"[\s,]*")
+_NON_ALNUM = re.compile(r"[^A-Z0-9]")
+
+
+def normalize_symbol(symbol: str) -> str:
+    """``usdt/rub``, ``USDT_RUB`` and ``USDTRUB`` all index as ``USDTRUB``."""
+    return _NON_ALNUM.sub("", symbol.upper())
+
+
+class MarketSnapshot:
+    """Symbol-indexed view of an exchange's market list, decoded on demand.
+
+    Only the top-level fields up to the list are decoded up front. List items
+    are decoded one at a time with ``raw_decode`` when a symbol that is not
+    indexed yet is asked for, and the scan stops at the first match; the next
+    lookup resumes where it left off. Every symbol is decoded at most once per
+    document, however many pairs are served from it.
+
+    Documents without the list (e.g. a plain FX endpoint) are decoded whole
+    into ``document``.
+    """
+
+    def __init__(self, body: Union[bytes, str], list_key: str = "data") -> None:
+        self._text = body.decode() if isinstance(body, bytes) else body
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self.document: Dict[str, Any] = {}
+        self.fetched_at = datetime.now(timezone.utc)
+        self.scanned = 0
+        self._pos: Optional[int] = self._seek_list(list_key)
+        self.has_list = self._pos is not None
+        if not self.has_list:
+            self.document = orjson.loads(self._text)
+
+    def _skip(self, pos: int) -> int:
+        return _WHITESPACE.match(self._text, pos).end()  # type: ignore[union-attr]
+
+    def _seek_list(self, list_key: str) -> Optional[int]:
+        """Position just inside the top-level ``list_key`` array, if there is one."""
+        text = self._text
+        pos = self._skip(0)
+        if not text.startswith("{", pos):
+            return None
+        pos += 1
+        while True:
+            pos = _SEPARATORS.match(text, pos).end()  # type: ignore[union-attr]
+            if pos >= len(text) or text[pos] == "}":
+                return None
+            key, pos = _DECODER.raw_decode(text, pos)
+            pos = self._skip(pos)
+            if not text.startswith(":", pos):
+                raise ValueError("Malformed market document")
+            pos = self._skip(pos + 1)
+            if key == list_key and text.startswith("[", pos):
+                return pos + 1
+            self.document[key], pos = _DECODER.raw_decode(text, pos)
+
+    def _next_item(self) -> Optional[Dict[str, Any]]:
+        while self._pos is not None:
+            pos = _SEPARATORS.match(self._text, self._pos).end()  # type: ignore[union-attr]
+            if pos >= len(self._text) or self._text[pos] == "]":
+                self._pos = None
+                return None
+            try:
+                item, self._pos = _DECODER.raw_decode(self._text, pos)
+            except ValueError:
+                self._pos = None
+                raise
+            self.scanned += 1
+            if isinstance(item, dict):
+                return item
+        return None
+
+    def _add(self, item: Dict[str, Any]) -> None:
+        symbol = item.get("symbol")
+        if symbol:
+            self._index.setdefault(normalize_symbol(str(symbol)), item)
+        base, quote = item.get("baseCurrency"), item.get("quoteCurrency")
+        if base and quote:
+            # Rapira names the pair quote-first in these fields (USDT/RUB has base RUB)
+            self._index.setdefault(normalize_symbol(f"{quote}{base}"), item)
+
+    def get(self, symbol: str) -> Optional[Dict[str, Any]]:
+        key = normalize_symbol(symbol)
+        item = self._index.get(key)
+        if item is not None:
+            metrics.inc("rates.market.index_hit")
+            return item
+        while True:
+            item = self._next_item()
+            if item is None:
+                return self._index.get(key)
+            self._add(item)
+            if key in self._index:
+                return self._index[key]
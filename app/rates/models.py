@@ -56,6 +56,9 @@ class RatePayload(BaseModel):
 class CachedRate(BaseModel):
     payload: RatePayload
     raw_source: Dict[str, Any] = Field(default_factory=dict)
+    # Digest of the upstream document the rate was parsed from; the same digest
+    # for the same key means nothing changed upstream since the previous fetch
+    source_digest: Optional[str] = None
 
 
 class RateQuery(BaseModel):
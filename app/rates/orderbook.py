@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+from functools import cached_property
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+from app.rates.analytics import DEFAULT_TRIM, BookAnalytics
+from app.rates.models import RateMethod, RateSource
+from app.rates.singleflight import SingleFlight
+
+S = TypeVar("S")
+
+Level = Tuple[Decimal, Decimal]
+
+
+# Decimal reference implementations; OrderBookSnapshot uses them when the book
+# does not fit the fixed-point grid of app.rates.analytics.
+def compute_mid(bids: Sequence[Sequence[Any]], asks: Sequence[Sequence[Any]]) -> Decimal:
+    if not bids or not asks:
+        raise ValueError("Orderbook is empty")
+    best_bid = Decimal(str(bids[0][0]))
+    best_ask = Decimal(str(asks[0][0]))
+    return (best_bid + best_ask) / Decimal("2")
+
+
+def compute_vwap(levels: Sequence[Sequence[Any]], depth: int) -> Decimal:
+    # levels: list of [price, qty]
+    taken = levels[: max(depth, 1)]
+    total_notional = Decimal("0")
+    total_qty = Decimal("0")
+    for price, qty in taken:
+        p = Decimal(str(price))
+        q = Decimal(str(qty))
+        total_notional += p * q
+        total_qty += q
+    if total_qty == 0:
+        raise ValueError("VWAP computation has zero quantity")
+    return total_notional / total_qty
+
+
+def _parse_levels(levels: Iterable[Sequence[Any]]) -> Tuple[Level, ...]:
+    try:
+        return tuple((Decimal(str(level[0])), Decimal(str(level[1]))) for level in levels)
+    except (InvalidOperation, IndexError, TypeError) as exc:
+        raise ValueError("Invalid orderbook level") from exc
+
+
+@dataclass(frozen=True)
+class OrderBookSnapshot:
+    """One upstream view of a market from which every ``RateMethod`` is derived.
+
+    ``bids``/``asks`` hold (price, qty) levels best-first. Upstreams that only
+    give a single price (FX APIs, the BTC ratio path) produce a snapshot with
+    no levels and a ``reference`` price instead.
+    """
+
+    source: RateSource
+    symbol: str
+    bids: Tuple[Level, ...] = ()
+    asks: Tuple[Level, ...] = ()
+    reference: Optional[Decimal] = None
+    fetched_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    raw: Dict[str, Any] = field(default_factory=dict, compare=False, repr=False)
+
+    @classmethod
+    def from_levels(
+        cls,
+        source: RateSource,
+        symbol: str,
+        bids: Iterable[Sequence[Any]],
+        asks: Iterable[Sequence[Any]],
+        raw: Optional[Dict[str, Any]] = None,
+    ) -> "OrderBookSnapshot":
+        return cls(
+            source=source,
+            symbol=symbol,
+            bids=_parse_levels(bids),
+            asks=_parse_levels(asks),
+            raw=raw or {},
+        )
+
+    @classmethod
+    def from_price(
+        cls, source: RateSource, symbol: str, price: Decimal, raw: Optional[Dict[str, Any]] = None
+    ) -> "OrderBookSnapshot":
+        return cls(source=source, symbol=symbol, reference=price, raw=raw or {})
+
+    @classmethod
+    def from_bybit_v5(
+        cls, source: RateSource, symbol: str, data: Dict[str, Any]
+    ) -> "OrderBookSnapshot":
+        """Build a snapshot from a /v5/market/orderbook or /v5/market/tickers response."""
+        result = data.get("result") or {}
+        if "b" in result and "a" in result:  # orderbook format
+            bids, asks = result.get("b", []), result.get("a", [])
+            return cls.from_levels(source, symbol, bids, asks, raw=data)
+        tickers = result.get("list") or []
+        if tickers:
+            item = tickers[0]
+            bid = item.get("bid1Price") or item.get("bidPrice")
+            ask = item.get("ask1Price") or item.get("askPrice")
+            last = item.get("lastPrice")
+            try:
+                if bid and ask:
+                    # A ticker is a one-level book; its size only matters across levels
+                    bid_qty = item.get("bid1Size") or "1"
+                    ask_qty = item.get("ask1Size") or "1"
+                    return cls.from_levels(
+                        source, symbol, [(bid, bid_qty)], [(ask, ask_qty)], raw=data
+                    )
+                if last:
+                    return cls.from_price(source, symbol, Decimal(str(last)), raw=data)
+            except InvalidOperation as exc:
+                raise ValueError("Invalid numeric value in ticker") from exc
+        raise ValueError("Unsupported Bybit response shape")
+
+    @property
+    def has_book(self) -> bool:
+        return bool(self.bids and self.asks)
+
+    def best_bid_ask(self) -> Tuple[Decimal, Decimal]:
+        if not self.has_book:
+            raise ValueError("Orderbook is empty")
+        return self.bids[0][0], self.asks[0][0]
+
+    @cached_property
+    def analytics(self) -> Optional[BookAnalytics]:
+        """Fixed-point arrays of the book, built once per snapshot."""
+        if not self.has_book:
+            return None
+        return BookAnalytics.from_levels(self.bids, self.asks)
+
+    def price(self, method: RateMethod | str, depth: int, trim: Decimal = DEFAULT_TRIM) -> Decimal:
+        if not self.has_book:
+            if self.reference is None:
+                raise ValueError("Snapshot has neither levels nor a reference price")
+            return self.reference
+        method_str = method.value if isinstance(method, RateMethod) else str(method)
+        book = self.analytics
+        if book is None:
+            if method_str in (RateMethod.MEDIAN.value, RateMethod.TRIMMED_MEAN.value):
+                raise ValueError("Book precision exceeds the analytics grid")
+            if method_str == RateMethod.VWAP.value:
+                total = compute_vwap(self.bids, depth) + compute_vwap(self.asks, depth)
+                return total / Decimal("2")
+            return compute_mid(self.bids, self.asks)
+        if method_str == RateMethod.VWAP.value:
+            return book.vwap(depth)
+        if method_str == RateMethod.MEDIAN.value:
+            return book.weighted_median(depth)
+        if method_str == RateMethod.TRIMMED_MEAN.value:
+            return book.trimmed_mean(depth, trim)
+        # MID and BEST: mid of the best levels
+        return book.mid()
+
+
+class SnapshotCache(Generic[S]):
+    """Keeps one snapshot per name for ``tick`` seconds and coalesces loads."""
+
+    def __init__(self, tick: float = 1.0, clock: Callable[[], float] = time.monotonic) -> None:
+        self.tick = tick
+        self._clock = clock
+        # A failed load is remembered for the tick too, so a dead upstream is not
+        # hit again by every method/depth variant requested in the same instant
+        self._entries: Dict[str, Tuple[float, S | Exception]] = {}
+        self._flight: SingleFlight[S] = SingleFlight("orderbook")
+
+    async def get(self, name: str, loader: Callable[[], Awaitable[S]]) -> S:
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] > self._clock():
+            if isinstance(entry[1], Exception):
+                raise entry[1]
+            return entry[1]
+        return await self._flight.do(name, lambda: self._load(name, loader))
+
+    async def _load(self, name: str, loader: Callable[[], Awaitable[S]]) -> S:
+        try:
+            snapshot = await loader()
+        except Exception as exc:
+            self._entries[name] = (self._clock() + self.tick, exc)
+            raise
+        self._entries[name] = (self._clock() + self.tick, snapshot)
+        return snapshot
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        if name is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(name, None)
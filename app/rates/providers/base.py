@@ -2,11 +2,16 @@
 
 from abc import ABC, abstractmethod
 from decimal import Decimal
-from typing import Any, Awaitable, Callable, Dict, Tuple, TypeVar
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+from urllib.parse import urlsplit
 
 import httpx
+import orjson
 from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
 
+from app.rates.breaker import CircuitBreaker
+from app.rates.conditional import ConditionalCache, Fetched
+from app.rates.fx import FxOracle
 from app.rates.models import CachedRate, RateQuery, RateSource
 
 T = TypeVar("T")
@@ -15,51 +20,56 @@ T = TypeVar("T")
 class BaseRateProvider(ABC):
     source: RateSource
 
-    def __init__(self, client: httpx.AsyncClient) -> None:
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        fx_oracle: Optional[FxOracle] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
         self.client = client
+        self.fx_oracle = fx_oracle or FxOracle(client)
+        self.breaker = breaker
+        self.conditional = ConditionalCache(self.source.value)
 
     @abstractmethod
     async def fetch(self, query: RateQuery) -> CachedRate:
         raise NotImplementedError
 
+    def _circuit(self, url: str) -> str:
+        parts = urlsplit(url)
+        return f"{self.source.value}:{parts.netloc}{parts.path}"
+
+    async def _get_json(self, url: str) -> Dict[str, Any]:
+        """GET a JSON document through the endpoint's circuit breaker.
+
+        Raises ``CircuitOpenError`` without touching the network while the
+        endpoint is known to be down, so callers drop to their fallback at once.
+        """
+        data: Dict[str, Any] = (await self._fetch_json(url)).data
+        return data
+
+    async def _fetch_json(self, url: str, parse: Callable[[bytes], Any] = orjson.loads) -> Fetched:
+        """Like ``_get_json``, as a conditional request that also says whether
+        the document changed since the previous call for ``url``.
+
+        ``parse`` turns a new body into the document; unchanged bodies are not
+        parsed again.
+        """
+
+        async def _call() -> Fetched:
+            resp = await self.client.get(url, headers=self.conditional.headers(url))
+            return self.conditional.handle(url, resp, parse)
+
+        if self.breaker is None:
+            return await _call()
+        return await self.breaker.call(self._circuit(url), _call)
+
     async def fetch_usd_to_rub_no_key(self) -> Tuple[Decimal, Dict[str, Any]]:
-        """Try several public, no-key FX sources for USD->RUB.
+        """USD->RUB from the shared FX oracle (public, no-key sources).
 
         Returns a tuple of (rate, raw_source_json).
         """
-        endpoints = [
-            # exchangerate.host
-            "https://api.exchangerate.host/latest?base=USD&symbols=RUB",
-            # open.er-api.com
-            "https://open.er-api.com/v6/latest/USD",
-            # frankfurter.app
-            "https://api.frankfurter.app/latest?from=USD&to=RUB",
-            # fawazahmed0/currency-api (cdn, community)
-            "https://cdn.jsdelivr.net/gh/fawazahmed0/currency-api@1/latest/currencies/usd/rub.json",
-        ]
-
-        for url in endpoints:
-            try:
-                resp = await self.client.get(url)
-                resp.raise_for_status()
-                data = resp.json()
-                # Try known shapes
-                if isinstance(data, dict):
-                    if "rates" in data and isinstance(data["rates"], dict) and "RUB" in data["rates"]:
-                        return Decimal(str(data["rates"]["RUB"])), data
-                    if "result" in data and isinstance(data["result"], dict) and "RUB" in data["result"]:
-                        return Decimal(str(data["result"]["RUB"])), data
-                    if "rub" in data:  # fawazahmed0 json shape
-                        return Decimal(str(data["rub"])), data
-                    if "RUB" in data:  # some APIs may flatten
-                        return Decimal(str(data["RUB"])), data
-                # As a last resort, if there's a numeric 'rate' field
-                rate_val = data.get("rate") if isinstance(data, dict) else None
-                if rate_val is not None:
-                    return Decimal(str(rate_val)), data
-            except Exception:
-                continue
-        raise RuntimeError("Failed to fetch USD->RUB from public endpoints")
+        return await self.fx_oracle.get_usd_rub()
 
 
 async def request_with_retry(call: Callable[[], Awaitable[T]], attempts: int = 3) -> T:
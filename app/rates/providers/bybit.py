@@ -1,78 +1,91 @@
 ﻿from __future__ import annotations
 
+import asyncio
 from datetime import datetime, timezone
-from decimal import Decimal, InvalidOperation
-from typing import Any, Dict, List, Tuple
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 import httpx
 
-from app.rates.models import BybitMode, CachedRate, GeoOption, RateMethod, RatePayload, RateQuery, RateSource
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.rates.breaker import CircuitBreaker
+from app.rates.composition import RateGraph
+from app.rates.fx import FxOracle
+from app.rates.models import BybitMode, CachedRate, GeoOption, RatePayload, RateQuery, RateSource
+from app.rates.orderbook import OrderBookSnapshot, SnapshotCache, compute_mid, compute_vwap
 from app.rates.providers.base import BaseRateProvider
+from app.rates.providers.bybit_p2p import BybitP2PBook
+
+_SYMBOL = "USDTRUB"
+# Fetch the book once at the deepest level we serve; every VWAP depth is a prefix of it
+_BOOK_LIMIT = 50
+# The ticker is only a one-level book, so give the full book a head start before racing it
+_BOOK_HEDGE_DELAY = 1.0
+# Root of the composition graph served for BybitMode.COMPOSED (and by the ratio path)
+COMPOSED_ROOT = "usdt_rub"
+
+log = get_logger(__name__)
 
 
 class BybitProvider(BaseRateProvider):
     source = RateSource.BYBIT
 
-    def __init__(self, client: httpx.AsyncClient, endpoint: str) -> None:
-        super().__init__(client)
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        endpoint: str,
+        snapshots: Optional[SnapshotCache[OrderBookSnapshot]] = None,
+        fx_oracle: Optional[FxOracle] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        leg_deadline: float = 2.5,
+        leg_max_age: float = 300.0,
+        p2p: Optional[BybitP2PBook] = None,
+    ) -> None:
+        super().__init__(client, fx_oracle, breaker)
+        # Serves BybitMode.P2P; without it that mode falls back to the ratio path
+        self.p2p = p2p
+        self.snapshots: SnapshotCache[OrderBookSnapshot] = snapshots or SnapshotCache()
         # If not provided via env, default to a public, no-key endpoint (USD->RUB)
         # We treat USDT≈USD for fiat conversion when Bybit spot pair is unavailable
         self.endpoint = (
             endpoint or "https://api.exchangerate.host/latest?base=USD&symbols=RUB"
         )
+        # The legs share one deadline; a leg that misses it (or fails) keeps its
+        # last good value while that is younger than leg_max_age
+        self.leg_deadline = leg_deadline
+        self.graph = self._build_graph(self.snapshots.tick, leg_max_age)
+
+    def _build_graph(self, tick: float, max_age: float) -> RateGraph:
+        """USDT->RUB = (BTCUSD_last / BTCUSDT_last) * (USD->RUB).
+
+        Other composed rates (e.g. P2P x spot) hang further nodes off the same
+        legs, so no leg is fetched twice within a tick.
+        """
+        base = self.endpoint.rstrip("/")
+        linear = f"{base}/v5/market/tickers?category=linear&symbol=BTCUSDT"
+        inverse = f"{base}/v5/market/tickers?category=inverse&symbol=BTCUSD"
+        graph = RateGraph(self.source.value)
+        graph.leg("linear", lambda: self._ticker_leg(linear), ttl=tick, max_age=max_age)
+        graph.leg("inverse", lambda: self._ticker_leg(inverse), ttl=tick, max_age=max_age)
+        # The FX oracle keeps its own TTL cache, polling it every tick is free
+        graph.leg("fx", self.fetch_usd_to_rub_no_key, ttl=tick, max_age=max_age)
+        graph.node("usd_per_usdt", ("inverse", "linear"), lambda inverse, linear: inverse / linear)
+        graph.node(COMPOSED_ROOT, ("usd_per_usdt", "fx"), lambda ratio, fx: ratio * fx)
+        return graph
 
     @staticmethod
     def _compute_mid_from_orderbook(bids: List[Tuple[str, str]], asks: List[Tuple[str, str]]) -> Decimal:
-        if not bids or not asks:
-            raise ValueError("Orderbook is empty")
-        best_bid = Decimal(str(bids[0][0]))
-        best_ask = Decimal(str(asks[0][0]))
-        return (best_bid + best_ask) / Decimal("2")
+        return compute_mid(bids, asks)
 
     @staticmethod
     def _compute_vwap(levels: List[Tuple[str, str]], depth: int) -> Decimal:
-        # levels: list of [price, qty]
-        taken = levels[: max(depth, 1)]
-        total_notional = Decimal("0")
-        total_qty = Decimal("0")
-        for price, qty in taken:
-            p = Decimal(str(price))
-            q = Decimal(str(qty))
-            total_notional += p * q
-            total_qty += q
-        if total_qty == 0:
-            raise ValueError("VWAP computation has zero quantity")
-        return total_notional / total_qty
+        return compute_vwap(levels, depth)
 
     @staticmethod
     def _extract_price_from_bybit_v5(data: Dict[str, Any], method: str, depth: int) -> Decimal:
         # Accepts response for /v5/market/orderbook or /v5/market/tickers
-        result = data.get("result") or {}
-        if "b" in result and "a" in result:  # orderbook format
-            bids = result.get("b", [])
-            asks = result.get("a", [])
-            if method == "vwap":
-                bid_vwap = BybitProvider._compute_vwap(bids, depth)
-                ask_vwap = BybitProvider._compute_vwap(asks, depth)
-                return (bid_vwap + ask_vwap) / Decimal("2")
-            if method == "best":
-                return BybitProvider._compute_mid_from_orderbook(bids, asks)
-            return BybitProvider._compute_mid_from_orderbook(bids, asks)
-        tickers = result.get("list") or []
-        if tickers:
-            item = tickers[0]
-            # Prefer mid of bid1 and ask1 if present, else use lastPrice
-            bid = item.get("bid1Price") or item.get("bidPrice")
-            ask = item.get("ask1Price") or item.get("askPrice")
-            last = item.get("lastPrice")
-            try:
-                if bid and ask:
-                    return (Decimal(str(bid)) + Decimal(str(ask))) / Decimal("2")
-                if last:
-                    return Decimal(str(last))
-            except InvalidOperation as exc:
-                raise ValueError("Invalid numeric value in ticker") from exc
-        raise ValueError("Unsupported Bybit response shape")
+        return OrderBookSnapshot.from_bybit_v5(RateSource.BYBIT, _SYMBOL, data).price(method, depth)
 
     @staticmethod
     def _extract_price_from_exchangerate_host(data: Dict[str, Any]) -> Decimal:
@@ -85,57 +98,117 @@ class BybitProvider(BaseRateProvider):
     @staticmethod
     def _extract_bid_ask_from_bybit_v5(data: Dict[str, Any]) -> Tuple[Decimal, Decimal]:
         """Извлекает bid и ask цены из ответа Bybit v5 API."""
-        result = data.get("result") or {}
-        if "b" in result and "a" in result:  # orderbook format
-            bids = result.get("b", [])
-            asks = result.get("a", [])
-            if not bids or not asks:
-                raise ValueError("Orderbook is empty")
-            best_bid = Decimal(str(bids[0][0]))
-            best_ask = Decimal(str(asks[0][0]))
-            return best_bid, best_ask
-        tickers = result.get("list") or []
-        if tickers:
-            item = tickers[0]
-            bid = item.get("bid1Price") or item.get("bidPrice")
-            ask = item.get("ask1Price") or item.get("askPrice")
-            if bid and ask:
-                return Decimal(str(bid)), Decimal(str(ask))
-        raise ValueError("Unsupported Bybit response shape for bid/ask")
+        return OrderBookSnapshot.from_bybit_v5(RateSource.BYBIT, _SYMBOL, data).best_bid_ask()
+
+    async def _load_book(self) -> OrderBookSnapshot:
+        """Spot USDTRUB book at full depth, or the ticker as a one-level book.
+
+        The ticker request is hedged: it starts when the book fails or has not
+        answered within ``_BOOK_HEDGE_DELAY``, and the first valid answer wins.
+        """
+        base = self.endpoint.rstrip("/")
+        urls = [
+            f"{base}/v5/market/orderbook?category=spot&symbol=USDTRUB&limit={_BOOK_LIMIT}",
+            f"{base}/v5/market/tickers?category=spot&symbol=USDTRUB",
+        ]
+        pending: Set[asyncio.Task[OrderBookSnapshot]] = set()
+        error: Optional[BaseException] = None
+        try:
+            while urls or pending:
+                if urls:
+                    if pending:
+                        metrics.inc("bybit.book.hedged")
+                    pending.add(asyncio.create_task(self._book_from(urls.pop(0))))
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=_BOOK_HEDGE_DELAY if urls else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                snapshot = None
+                for task in done:
+                    if task.exception() is None:
+                        snapshot = snapshot or task.result()
+                    else:
+                        error = task.exception()
+                if snapshot is not None:
+                    return snapshot
+        finally:
+            for task in pending:
+                task.cancel()
+        assert error is not None
+        raise error
+
+    async def _book_from(self, url: str) -> OrderBookSnapshot:
+        return OrderBookSnapshot.from_bybit_v5(self.source, _SYMBOL, await self._get_json(url))
+
+    @staticmethod
+    def _last_price(data: Dict[str, Any]) -> Decimal:
+        lst = (data.get("result") or {}).get("list") or []
+        if not lst:
+            raise ValueError("Empty ticker list")
+        return Decimal(str(lst[0].get("lastPrice")))
+
+    async def _ticker_leg(self, url: str) -> Tuple[Decimal, Dict[str, Any]]:
+        data = await self._get_json(url)
+        return self._last_price(data), data
+
+    async def _load_ratio(self) -> OrderBookSnapshot:
+        """USDT->RUB derived from derivatives tickers and the USD->RUB FX rate."""
+        result = await self.graph.resolve(COMPOSED_ROOT, deadline=self.leg_deadline)
+        raw: Dict[str, Any] = {}
+        for leg in self.graph.legs_of(COMPOSED_ROOT):
+            value = self.graph.value(leg)
+            raw[leg] = value.raw if value is not None else {}
+        # Leg freshness and every intermediate value end up in the rate's extras
+        raw.update(self.graph.describe(COMPOSED_ROOT))
+        return OrderBookSnapshot.from_price(self.source, _SYMBOL, result.value, raw=raw)
+
+    async def _load_custom(self) -> OrderBookSnapshot:
+        """Snapshot from a non-Bybit endpoint configured via BYBIT_ENDPOINT."""
+        data = await self._get_json(self.endpoint)
+        if "rates" in data:
+            return OrderBookSnapshot.from_price(
+                self.source, _SYMBOL, self._extract_price_from_exchangerate_host(data), raw=data
+            )
+        # Try common shapes
+        if isinstance(data.get("price"), (int, float, str)):
+            price = Decimal(str(data["price"]))
+            return OrderBookSnapshot.from_price(self.source, _SYMBOL, price, raw=data)
+        if "orderbook" in data and isinstance(data["orderbook"], dict):
+            ob = data["orderbook"]
+            return OrderBookSnapshot.from_levels(
+                self.source, _SYMBOL, ob.get("bids") or [], ob.get("asks") or [], raw=data
+            )
+        raise ValueError("Unsupported response format for endpoint")
+
+    async def _load_fx(self) -> OrderBookSnapshot:
+        # Fallback to public fiat rate (USDT≈USD)
+        value, raw = await self.fetch_usd_to_rub_no_key()
+        return OrderBookSnapshot.from_price(self.source, _SYMBOL, value, raw=raw)
+
+    async def _load_rate_snapshot(self, mode: BybitMode) -> OrderBookSnapshot:
+        try:
+            if "api.bybit.com" not in self.endpoint:
+                return await self.snapshots.get("custom", self._load_custom)
+            try:
+                # COMPOSED is the graph root itself; the other modes start from it too
+                return await self.snapshots.get("ratio", self._load_ratio)
+            except Exception:
+                # If ratio path fails, try spot USDTRUB (rarely available)
+                if mode == BybitMode.ORDERBOOK:
+                    return await self.snapshots.get("book", self._load_book)
+                raise
+        except Exception:
+            return await self.snapshots.get("fx", self._load_fx)
 
     async def fetch_bid_ask(self, query: RateQuery) -> Tuple[Decimal, Decimal]:
         """Получает bid и ask цены для Bybit."""
-        url = self.endpoint
-        
-        async def _get_json(target: str) -> Dict[str, Any]:
-            resp = await self.client.get(target)
-            resp.raise_for_status()
-            return resp.json()
-
         try:
-            if "api.bybit.com" in url:
-                try:
-                    ob = await _get_json(
-                        f"{url.rstrip('/')}/v5/market/orderbook?category=spot&symbol=USDTRUB&limit=1"
-                    )
-                    return self._extract_bid_ask_from_bybit_v5(ob)
-                except Exception:
-                    tickers = await _get_json(
-                        f"{url.rstrip('/')}/v5/market/tickers?category=spot&symbol=USDTRUB"
-                    )
-                    return self._extract_bid_ask_from_bybit_v5(tickers)
+            if "api.bybit.com" in self.endpoint:
+                snapshot = await self.snapshots.get("book", self._load_book)
             else:
-                data = await _get_json(url)
-                if "orderbook" in data and isinstance(data["orderbook"], dict):
-                    ob = data["orderbook"]
-                    bids = ob.get("bids") or []
-                    asks = ob.get("asks") or []
-                    if not bids or not asks:
-                        raise ValueError("Orderbook is empty")
-                    best_bid = Decimal(str(bids[0][0]))
-                    best_ask = Decimal(str(asks[0][0]))
-                    return best_bid, best_ask
-                raise ValueError("Unsupported response format for endpoint")
+                snapshot = await self.snapshots.get("custom", self._load_custom)
+            return snapshot.best_bid_ask()
         except Exception:
             # Fallback: используем среднюю цену как bid и ask
             fx_rate, _ = await self.fetch_usd_to_rub_no_key()
@@ -148,87 +221,26 @@ class BybitProvider(BaseRateProvider):
         # 1) Try Bybit public endpoints if endpoint looks like api.bybit.com and mode=orderbook
         # 2) Otherwise, treat endpoint as a full URL returning JSON and try to extract a value
         # 3) As a safe default, exchangerate.host latest USD->RUB w/o API keys
+        # Every method/depth is computed from one snapshot per tick, so MID, BEST and
+        # VWAP requested together cost a single upstream round trip.
 
         mode = query.mode if isinstance(query.mode, BybitMode) else BybitMode(query.mode)
         geo = query.geo if isinstance(query.geo, GeoOption) else GeoOption(query.geo)
-        method_str = query.method.value if hasattr(query.method, "value") else str(query.method)
         depth = query.depth or 5
 
-        url = self.endpoint
-        value: Decimal
-        raw: Dict[str, Any] = {}
-
-        async def _get_json(target: str) -> Dict[str, Any]:
-            resp = await self.client.get(target)
-            resp.raise_for_status()
-            return resp.json()
+        if mode == BybitMode.P2P and self.p2p is not None:
+            try:
+                return await self._fetch_p2p(query, geo)
+            except Exception as exc:  # noqa: BLE001 - the exchange rate is a usable answer
+                metrics.inc("rates.p2p.fallback")
+                log.warning("Bybit P2P quote unavailable", error=str(exc))
 
+        snapshot = await self._load_rate_snapshot(mode)
         try:
-            if "api.bybit.com" in url:
-                # Prefer deriving USDT/USD ratio from Bybit tickers (derivatives if needed)
-                # USDT/USD = Price(BTCUSDT) / Price(BTCUSD) inverted? We want USD per USDT = BTCUSD / BTCUSDT
-                # Final USDT->RUB = (BTCUSD_last / BTCUSDT_last) * (USD->RUB)
-                try:
-                    lin = await _get_json(
-                        f"{url.rstrip('/')}/v5/market/tickers?category=linear&symbol=BTCUSDT"
-                    )
-                    inv = await _get_json(
-                        f"{url.rstrip('/')}/v5/market/tickers?category=inverse&symbol=BTCUSD"
-                    )
-                    raw = {"linear": lin, "inverse": inv}
-                    def _last(d: Dict[str, Any]) -> Decimal:
-                        lst = (d.get("result") or {}).get("list") or []
-                        if not lst:
-                            raise ValueError("Empty ticker list")
-                        return Decimal(str(lst[0].get("lastPrice")))
-                    btcusdt = _last(lin)
-                    btcusd = _last(inv)
-                    usd_per_usdt = btcusd / btcusdt
-                    fx, fx_raw = await self.fetch_usd_to_rub_no_key()
-                    value = usd_per_usdt * fx
-                    raw["fx"] = fx_raw
-                except Exception:
-                    # If ratio path fails, try spot USDTRUB (rarely available)
-                    if mode == BybitMode.ORDERBOOK:
-                        try:
-                            ob = await _get_json(
-                                f"{url.rstrip('/')}/v5/market/orderbook?category=spot&symbol=USDTRUB&limit={max(depth,1)}"
-                            )
-                            raw = ob
-                            value = self._extract_price_from_bybit_v5(ob, method_str, depth)
-                        except Exception:
-                            tickers = await _get_json(
-                                f"{url.rstrip('/')}/v5/market/tickers?category=spot&symbol=USDTRUB"
-                            )
-                            raw = tickers
-                            value = self._extract_price_from_bybit_v5(tickers, method_str, depth)
-                    else:
-                        # Non-orderbook modes: fall back directly
-                        value, raw = await self.fetch_usd_to_rub_no_key()
-            else:
-                data = await _get_json(url)
-                raw = data
-                if "rates" in data:
-                    value = self._extract_price_from_exchangerate_host(data)
-                else:
-                    # Try common shapes
-                    if isinstance(data.get("price"), (int, float, str)):
-                        value = Decimal(str(data["price"]))
-                    elif "orderbook" in data and isinstance(data["orderbook"], dict):
-                        ob = data["orderbook"]
-                        bids = ob.get("bids") or []
-                        asks = ob.get("asks") or []
-                        if method_str == "vwap":
-                            bid_vwap = self._compute_vwap(bids, depth)
-                            ask_vwap = self._compute_vwap(asks, depth)
-                            value = (bid_vwap + ask_vwap) / Decimal("2")
-                        else:
-                            value = self._compute_mid_from_orderbook(bids, asks)
-                    else:
-                        raise ValueError("Unsupported response format for endpoint")
-        except Exception:
-            # Fallback to public fiat rate (USDT≈USD)
-            value, raw = await self.fetch_usd_to_rub_no_key()
+            value = snapshot.price(query.method, depth)
+        except ValueError:
+            snapshot = await self.snapshots.get("fx", self._load_fx)
+            value = snapshot.price(query.method, depth)
 
         payload = RatePayload(
             source=self.source,
@@ -238,6 +250,40 @@ class BybitProvider(BaseRateProvider):
             depth=query.depth,
             value=value,
             updated_at=datetime.now(timezone.utc),
-            extras={"endpoint": url, "note": "public-no-key"},
+            extras=self._extras(snapshot),
         )
-        return CachedRate(payload=payload, raw_source=raw)
+        return CachedRate(payload=payload, raw_source=snapshot.raw)
+
+    async def _fetch_p2p(self, query: RateQuery, geo: GeoOption) -> CachedRate:
+        assert self.p2p is not None
+        snapshot = await self.p2p.snapshot()
+        bid, ask = snapshot.bid_ask(query.method)
+        payload = RatePayload(
+            source=self.source,
+            method=query.method,
+            mode=BybitMode.P2P,
+            geo=geo,
+            depth=query.depth,
+            value=(bid + ask) / 2,
+            updated_at=datetime.now(timezone.utc),
+            extras={
+                "endpoint": self.p2p.endpoint,
+                "ask": str(ask),
+                "bid": str(bid),
+                "snapshot_at": snapshot.fetched_at.isoformat(),
+                "p2p": snapshot.summary(),
+            },
+        )
+        return CachedRate(payload=payload, raw_source=snapshot.summary())
+
+    def _extras(self, snapshot: OrderBookSnapshot) -> Dict[str, Any]:
+        extras: Dict[str, Any] = {
+            "endpoint": self.endpoint,
+            "note": "public-no-key",
+            "snapshot_at": snapshot.fetched_at.isoformat(),
+        }
+        # Ratio snapshots carry how the value was composed and how old each leg is
+        for field in ("legs", "composed"):
+            if field in snapshot.raw:
+                extras[field] = snapshot.raw[field]
+        return extras
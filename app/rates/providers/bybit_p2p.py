@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import asyncio
+import math
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.rates.analytics import DEFAULT_TRIM
+from app.rates.breaker import CircuitBreaker
+from app.rates.models import RateMethod
+from app.rates.orderbook import SnapshotCache
+
+log = get_logger(__name__)
+
+DEFAULT_P2P_ENDPOINT = "https://api2.bybit.com/fiat/otc/item/online"
+
+# Bybit's "side" is from the taker's point of view: "1" lists the ads a user
+# buys USDT from (our ask), "0" the ads a user sells USDT to (our bid)
+SIDE_BUY = "1"
+SIDE_SELL = "0"
+_SIDE_NAMES = {SIDE_BUY: "buy", SIDE_SELL: "sell"}
+_QUANT = Decimal("0.000001")
+
+
+@dataclass(frozen=True)
+class P2PAd:
+    price: Decimal
+    quantity: Decimal
+    min_amount: Decimal
+    max_amount: Decimal
+    payments: FrozenSet[str]
+
+    @classmethod
+    def parse(cls, item: Dict[str, Any]) -> Optional["P2PAd"]:
+        try:
+            return cls(
+                price=Decimal(str(item["price"])),
+                quantity=Decimal(str(item.get("lastQuantity") or item.get("quantity") or 0)),
+                min_amount=Decimal(str(item.get("minAmount") or 0)),
+                max_amount=Decimal(str(item.get("maxAmount") or 0)),
+                payments=frozenset(str(p) for p in item.get("payments") or ()),
+            )
+        except (KeyError, InvalidOperation, TypeError):
+            return None
+
+
+@dataclass(frozen=True)
+class P2PSideStats:
+    side: str
+    ads: int
+    volume: Decimal
+    best: Decimal
+    percentile: Decimal
+    median: Decimal
+    vwap: Decimal
+    trimmed_mean: Decimal
+
+    def price(self, method: RateMethod) -> Decimal:
+        if method == RateMethod.BEST:
+            return self.best
+        if method == RateMethod.VWAP:
+            return self.vwap
+        if method == RateMethod.MEDIAN:
+            return self.median
+        if method == RateMethod.TRIMMED_MEAN:
+            return self.trimmed_mean
+        return self.percentile
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "ads": self.ads,
+            "volume": str(self.volume),
+            "best": str(self.best),
+            "percentile": str(self.percentile),
+            "median": str(self.median),
+            "vwap": str(self.vwap),
+        }
+
+
+def side_stats(
+    side: str, ads: Iterable[P2PAd], percentile: float, trim: Decimal = DEFAULT_TRIM
+) -> Optional[P2PSideStats]:
+    """Price statistics over ``ads`` gathered in a single pass.
+
+    Prices are ranked best first (lowest for buying, highest for selling);
+    ``percentile`` is the nearest-rank price among them, so one outlier ad at
+    the top of the book does not set the quote.
+    """
+    prices: List[Decimal] = []
+    volume = Decimal(0)
+    notional = Decimal(0)
+    for ad in ads:
+        prices.append(ad.price)
+        volume += ad.quantity
+        notional += ad.price * ad.quantity
+    if not prices:
+        return None
+    prices.sort(reverse=side == SIDE_SELL)
+    n = len(prices)
+    rank = min(max(math.ceil(percentile / 100 * n), 1), n)
+    if n % 2:
+        median = prices[n // 2]
+    else:
+        median = (prices[n // 2 - 1] + prices[n // 2]) / 2
+    cut = int(n * trim)
+    trimmed = prices[cut : n - cut] or prices
+    return P2PSideStats(
+        side=_SIDE_NAMES[side],
+        ads=n,
+        volume=volume,
+        best=prices[0],
+        percentile=prices[rank - 1],
+        median=median.quantize(_QUANT),
+        vwap=(notional / volume if volume else median).quantize(_QUANT),
+        trimmed_mean=(sum(trimmed, Decimal(0)) / len(trimmed)).quantize(_QUANT),
+    )
+
+
+@dataclass(frozen=True)
+class P2PSnapshot:
+    buy: Optional[P2PSideStats]
+    sell: Optional[P2PSideStats]
+    pages: int
+    fetched_at: datetime
+
+    def bid_ask(self, method: RateMethod = RateMethod.MID) -> Tuple[Decimal, Decimal]:
+        """(bid, ask): what a user gets selling USDT and pays buying it."""
+        if self.buy is None or self.sell is None:
+            raise ValueError("P2P book has no ads on one side")
+        return self.sell.price(method), self.buy.price(method)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "buy": self.buy.summary() if self.buy else None,
+            "sell": self.sell.summary() if self.sell else None,
+            "pages": self.pages,
+            "fetched_at": self.fetched_at.isoformat(),
+        }
+
+
+class BybitP2PBook:
+    """USDT/RUB quotes aggregated from Bybit P2P ads.
+
+    Both sides' first pages are requested together; the remaining pages (up to
+    ``max_pages`` per side) follow concurrently with at most ``concurrency``
+    requests in flight. Ads are filtered by payment method and by whether they
+    accept ``amount`` RUB, then reduced to per-side statistics. The result is
+    cached as one snapshot for ``cache_sec``.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        endpoint: str = DEFAULT_P2P_ENDPOINT,
+        payments: Sequence[str] = (),
+        amount: Optional[Decimal] = None,
+        page_size: int = 20,
+        max_pages: int = 5,
+        concurrency: int = 4,
+        percentile: float = 10.0,
+        cache_sec: float = 30.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        self.client = client
+        self.endpoint = endpoint or DEFAULT_P2P_ENDPOINT
+        self.payments = frozenset(payments)
+        self.amount = amount
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.percentile = percentile
+        self.breaker = breaker
+        self._semaphore = asyncio.Semaphore(max(concurrency, 1))
+        self._snapshots: SnapshotCache[P2PSnapshot] = SnapshotCache(tick=cache_sec)
+        parts = urlsplit(self.endpoint)
+        self._circuit = f"bybit:{parts.netloc}{parts.path}"
+
+    async def snapshot(self) -> P2PSnapshot:
+        return await self._snapshots.get("p2p", self._load)
+
+    async def _post(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        async def _call() -> Dict[str, Any]:
+            async with self._semaphore:
+                resp = await self.client.post(self.endpoint, json=body)
+            resp.raise_for_status()
+            data = resp.json()
+            if data.get("ret_code", 0) != 0:
+                raise ValueError(f"Bybit P2P error {data.get('ret_code')}: {data.get('ret_msg')}")
+            return data.get("result") or {}
+
+        if self.breaker is None:
+            return await _call()
+        return await self.breaker.call(self._circuit, _call)
+
+    def _request(self, side: str, page: int) -> Dict[str, Any]:
+        return {
+            "userId": "",
+            "tokenId": "USDT",
+            "currencyId": "RUB",
+            "payment": sorted(self.payments),
+            "side": side,
+            "size": str(self.page_size),
+            "page": str(page),
+            "amount": str(self.amount) if self.amount is not None else "",
+            "authMaker": False,
+            "canTrade": False,
+        }
+
+    def _accepts(self, ad: P2PAd) -> bool:
+        if ad.quantity <= 0:
+            return False
+        if self.payments and not (ad.payments & self.payments):
+            return False
+        if self.amount is not None:
+            if ad.min_amount and self.amount < ad.min_amount:
+                return False
+            if ad.max_amount and self.amount > ad.max_amount:
+                return False
+        return True
+
+    async def _side_pages(self, side: str, first: Dict[str, Any]) -> List[Dict[str, Any]]:
+        count = int(first.get("count") or 0)
+        pages = min(self.max_pages, math.ceil(count / self.page_size)) if self.page_size else 1
+        if pages <= 1:
+            return [first]
+        rest = await asyncio.gather(
+            *(self._post(self._request(side, page)) for page in range(2, pages + 1))
+        )
+        return [first, *rest]
+
+    async def _load(self) -> P2PSnapshot:
+        firsts = await asyncio.gather(
+            self._post(self._request(SIDE_BUY, 1)), self._post(self._request(SIDE_SELL, 1))
+        )
+        buy_pages, sell_pages = await asyncio.gather(
+            self._side_pages(SIDE_BUY, firsts[0]), self._side_pages(SIDE_SELL, firsts[1])
+        )
+        stats = {}
+        for side, pages in ((SIDE_BUY, buy_pages), (SIDE_SELL, sell_pages)):
+            ads = (P2PAd.parse(item) for page in pages for item in page.get("items") or ())
+            accepted = (ad for ad in ads if ad is not None and self._accepts(ad))
+            stats[side] = side_stats(side, accepted, self.percentile)
+        total_pages = len(buy_pages) + len(sell_pages)
+        metrics.inc("rates.p2p.pages", total_pages)
+        return P2PSnapshot(
+            buy=stats[SIDE_BUY],
+            sell=stats[SIDE_SELL],
+            pages=total_pages,
+            fetched_at=datetime.now(timezone.utc),
+        )
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+import httpx
+import orjson
+
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.rates.breaker import CircuitBreaker
+from app.rates.fx import FxOracle
+from app.rates.models import BybitMode, CachedRate, GeoOption, RatePayload, RateQuery, RateSource
+from app.rates.orderbook import OrderBookSnapshot, SnapshotCache
+from app.rates.providers.bybit import BybitProvider
+from app.rates.providers.bybit_p2p import BybitP2PBook
+
+log = get_logger(__name__)
+
+DEFAULT_WS_ENDPOINT = "wss://stream.bybit.com/v5/public/spot"
+
+
+class BookGapError(Exception):
+    """A delta does not continue the replica's update sequence."""
+
+
+class LocalOrderBook:
+    """Sequence-checked replica of one Bybit order book.
+
+    Built from ``orderbook.{depth}.{symbol}`` frames: a snapshot replaces the
+    book, a delta must carry ``u == previous u + 1`` and sets (or, with a zero
+    quantity, removes) the listed levels.
+    """
+
+    def __init__(self, symbol: str, depth: int = 50) -> None:
+        self.symbol = symbol
+        self.depth = depth
+        self.bids: Dict[Decimal, Decimal] = {}
+        self.asks: Dict[Decimal, Decimal] = {}
+        self.update_id: Optional[int] = None
+        self.seq: Optional[int] = None
+        self.updated_at: float = 0.0
+        self._view: Optional[OrderBookSnapshot] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.update_id is not None and bool(self.bids) and bool(self.asks)
+
+    def age(self) -> float:
+        return time.monotonic() - self.updated_at if self.updated_at else float("inf")
+
+    def reset(self) -> None:
+        self.bids.clear()
+        self.asks.clear()
+        self.update_id = None
+        self.seq = None
+        self._view = None
+
+    def apply_snapshot(self, data: Dict[str, Any]) -> None:
+        self.bids = {Decimal(p): Decimal(q) for p, q in data.get("b", [])}
+        self.asks = {Decimal(p): Decimal(q) for p, q in data.get("a", [])}
+        self._touch(data)
+
+    def apply_delta(self, data: Dict[str, Any]) -> None:
+        update_id = int(data["u"])
+        if update_id == 1:
+            # Bybit restarts the sequence with a full book after a service restart
+            self.apply_snapshot(data)
+            return
+        if self.update_id is None or update_id != self.update_id + 1:
+            expected = None if self.update_id is None else self.update_id + 1
+            raise BookGapError(f"expected u={expected}, got {update_id}")
+        self._apply_side(self.bids, data.get("b", []))
+        self._apply_side(self.asks, data.get("a", []))
+        self._touch(data)
+
+    @staticmethod
+    def _apply_side(side: Dict[Decimal, Decimal], levels: List[Tuple[str, str]]) -> None:
+        for price, qty in levels:
+            p = Decimal(price)
+            q = Decimal(qty)
+            if q == 0:
+                side.pop(p, None)
+            else:
+                side[p] = q
+
+    def _touch(self, data: Dict[str, Any]) -> None:
+        self.update_id = int(data["u"])
+        self.seq = data.get("seq")
+        self.updated_at = time.monotonic()
+        self._view = None
+
+    def view(self, source: RateSource) -> OrderBookSnapshot:
+        """Best-first snapshot of the replica, built once per applied frame."""
+        if self._view is None:
+            bids = sorted(self.bids.items(), key=lambda level: level[0], reverse=True)[: self.depth]
+            asks = sorted(self.asks.items(), key=lambda level: level[0])[: self.depth]
+            self._view = OrderBookSnapshot(
+                source=source,
+                symbol=self.symbol,
+                bids=tuple(bids),
+                asks=tuple(asks),
+                raw={"u": self.update_id, "seq": self.seq},
+            )
+        return self._view
+
+
+class BybitStreamProvider(BybitProvider):
+    """Bybit provider answering from a WebSocket-fed local order-book replica.
+
+    ``run()`` keeps the replica in sync; while it is fresh, ``live_rate`` and
+    ``fetch_bid_ask`` are served from memory. Until then (or when the stream
+    lags more than ``max_age`` seconds) the REST implementation is used.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        endpoint: str,
+        ws_endpoint: str = DEFAULT_WS_ENDPOINT,
+        symbol: str = "USDTRUB",
+        depth: int = 50,
+        max_age: float = 5.0,
+        ping_interval: float = 20.0,
+        reconnect_delay: float = 1.0,
+        snapshots: Optional[SnapshotCache[OrderBookSnapshot]] = None,
+        fx_oracle: Optional[FxOracle] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        leg_deadline: float = 2.5,
+        leg_max_age: float = 300.0,
+        p2p: Optional[BybitP2PBook] = None,
+    ) -> None:
+        super().__init__(
+            client,
+            endpoint,
+            snapshots=snapshots,
+            fx_oracle=fx_oracle,
+            breaker=breaker,
+            leg_deadline=leg_deadline,
+            leg_max_age=leg_max_age,
+            p2p=p2p,
+        )
+        self.ws_endpoint = ws_endpoint
+        self.topic = f"orderbook.{depth}.{symbol}"
+        self.book = LocalOrderBook(symbol, depth)
+        self.max_age = max_age
+        self.ping_interval = ping_interval
+        self.reconnect_delay = reconnect_delay
+
+    def _live_snapshot(self) -> Optional[OrderBookSnapshot]:
+        if not self.book.ready or self.book.age() > self.max_age:
+            return None
+        return self.book.view(self.source)
+
+    def live_rate(self, query: RateQuery) -> Optional[RatePayload]:
+        """Answer an order-book query from the replica, or None if it is not usable."""
+        mode = query.mode if isinstance(query.mode, BybitMode) else BybitMode(query.mode)
+        if mode != BybitMode.ORDERBOOK:
+            return None
+        snapshot = self._live_snapshot()
+        if snapshot is None:
+            return None
+        try:
+            value = snapshot.price(query.method, query.depth or 5)
+        except ValueError:
+            return None
+        metrics.inc("bybit.stream.served")
+        return RatePayload(
+            source=self.source,
+            method=query.method,
+            mode=mode,
+            geo=query.geo if isinstance(query.geo, GeoOption) else GeoOption(query.geo),
+            depth=query.depth,
+            value=value,
+            updated_at=datetime.now(timezone.utc),
+            extras={
+                "endpoint": self.ws_endpoint,
+                "note": "stream",
+                "update_id": self.book.update_id,
+            },
+        )
+
+    async def fetch(self, query: RateQuery) -> CachedRate:
+        payload = self.live_rate(query)
+        if payload is None:
+            return await super().fetch(query)
+        raw = {"u": self.book.update_id, "seq": self.book.seq}
+        return CachedRate(payload=payload, raw_source=raw)
+
+    async def fetch_bid_ask(self, query: RateQuery) -> Tuple[Decimal, Decimal]:
+        snapshot = self._live_snapshot()
+        if snapshot is None:
+            return await super().fetch_bid_ask(query)
+        return snapshot.best_bid_ask()
+
+    async def run(self) -> None:
+        """Maintain the replica forever, reconnecting on errors."""
+        async with aiohttp.ClientSession() as session:
+            while True:
+                try:
+                    await self._consume(session)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as exc:  # noqa: BLE001 - reconnect after a pause
+                    log.warning("Bybit stream disconnected", error=str(exc))
+                self.book.reset()
+                metrics.inc("bybit.stream.reconnects")
+                await asyncio.sleep(self.reconnect_delay)
+
+    async def _consume(self, session: aiohttp.ClientSession) -> None:
+        async with session.ws_connect(self.ws_endpoint) as ws:
+            await self._subscribe(ws)
+            pinger = asyncio.create_task(self._ping(ws))
+            try:
+                async for message in ws:
+                    if message.type != aiohttp.WSMsgType.TEXT:
+                        if message.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                            break
+                        continue
+                    await self._handle(ws, orjson.loads(message.data))
+            finally:
+                pinger.cancel()
+
+    async def _subscribe(self, ws: aiohttp.ClientWebSocketResponse) -> None:
+        await ws.send_str(orjson.dumps({"op": "subscribe", "args": [self.topic]}).decode())
+
+    async def _resync(self, ws: aiohttp.ClientWebSocketResponse) -> None:
+        # Re-subscribing makes Bybit push a fresh snapshot for the topic
+        self.book.reset()
+        await ws.send_str(orjson.dumps({"op": "unsubscribe", "args": [self.topic]}).decode())
+        await self._subscribe(ws)
+
+    async def _ping(self, ws: aiohttp.ClientWebSocketResponse) -> None:
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            await ws.send_str('{"op":"ping"}')
+
+    async def _handle(self, ws: aiohttp.ClientWebSocketResponse, frame: Dict[str, Any]) -> None:
+        if frame.get("topic") != self.topic:
+            return  # subscription acks and pongs
+        data = frame.get("data") or {}
+        metrics.inc("bybit.stream.frames", type=frame.get("type"))
+        if frame.get("type") == "snapshot":
+            self.book.apply_snapshot(data)
+            return
+        if self.book.update_id is None:
+            return  # deltas before the (re)subscription snapshot are meaningless
+        try:
+            self.book.apply_delta(data)
+        except BookGapError as exc:
+            metrics.inc("bybit.stream.gaps")
+            log.warning("Bybit order book gap, resyncing", topic=self.topic, error=str(exc))
+            await self._resync(ws)
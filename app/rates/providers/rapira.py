@@ -2,77 +2,96 @@
 
 from datetime import datetime, timezone
 from decimal import Decimal
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Tuple
 
 import httpx
 
+from app.rates.breaker import CircuitBreaker
+from app.rates.conditional import Fetched
+from app.rates.fx import FxOracle
+from app.rates.market import MarketSnapshot
 from app.rates.models import CachedRate, RateMethod, RatePayload, RateQuery, RateSource
+from app.rates.orderbook import SnapshotCache
 from app.rates.providers.base import BaseRateProvider
 
+_SYMBOL = "USDT/RUB"
+
 
 class RapiraProvider(BaseRateProvider):
     source = RateSource.RAPIRA
 
-    def __init__(self, client: httpx.AsyncClient, endpoint: str) -> None:
-        super().__init__(client)
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        endpoint: str,
+        fx_oracle: Optional[FxOracle] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        snapshots: Optional[SnapshotCache[Fetched]] = None,
+    ) -> None:
+        super().__init__(client, fx_oracle, breaker)
         # Default to a public, no-key endpoint for USD->RUB if RAPIRA_ENDPOINT is not set
         self.endpoint = (
             endpoint or "https://api.exchangerate.host/latest?base=USD&symbols=RUB"
         )
+        # One market document per tick serves every pair and every query variant
+        self.snapshots: SnapshotCache[Fetched] = snapshots or SnapshotCache()
 
-    async def fetch(self, query: RateQuery) -> CachedRate:
-        async def _get_json(url: str) -> Dict[str, Any]:
-            resp = await self.client.get(url)
-            resp.raise_for_status()
-            return resp.json()
+    async def _load_market(self) -> Fetched:
+        # A byte-identical document comes back as the same, already indexed snapshot
+        return await self._fetch_json(self.endpoint, parse=MarketSnapshot)
+
+    async def market(self) -> Fetched:
+        return await self.snapshots.get("market", self._load_market)
+
+    @staticmethod
+    def _price(item: Dict[str, Any]) -> Tuple[Decimal, Dict[str, Any]]:
+        ask = item.get("askPrice")
+        bid = item.get("bidPrice")
+        close = item.get("close")
+        if ask is not None and bid is not None:
+            value = (Decimal(str(ask)) + Decimal(str(bid))) / Decimal("2")
+        elif close is not None:
+            value = Decimal(str(close))
+        else:
+            raise ValueError("Rapira data item missing ask/bid/close")
+        return value, {"symbol": item.get("symbol"), "ask": ask, "bid": bid}
+
+    @classmethod
+    def _parse(
+        cls, market: MarketSnapshot, symbol: str = _SYMBOL
+    ) -> Tuple[Decimal, Dict[str, Any]]:
+        # 1) Native Rapira open API shape
+        #    { "data": [ { "symbol": "USDT/RUB", "askPrice": 82.43, "bidPrice": 82.42 } ], ... }
+        if market.has_list:
+            item = market.get(symbol)
+            if item is None:
+                raise ValueError(f"{symbol} not found in Rapira data list")
+            return cls._price(item)
 
+        # 2) exchangerate.host and similar (fallback if endpoint is not Rapira)
+        data = market.document
+        if "rates" in data and "RUB" in data["rates"]:
+            return Decimal(str(data["rates"]["RUB"])), {}
+
+        # 3) Generic single-number price
+        if isinstance(data.get("price"), (int, float, str)):
+            return Decimal(str(data["price"])), {}
+        raise ValueError("Unsupported response format for Rapira endpoint")
+
+    async def quote(self, symbol: str) -> Tuple[Decimal, Dict[str, Any]]:
+        """Mid (or last close) of any pair listed by Rapira, from this tick's snapshot."""
+        fetched = await self.market()
+        return self._parse(fetched.data, symbol)
+
+    async def fetch(self, query: RateQuery) -> CachedRate:
         raw: Dict[str, Any] = {}
+        digest: Optional[str] = None
         try:
-            data = await _get_json(self.endpoint)
-            raw = data
-                                                         
-            # 1) Native Rapira open API shape
-            #    { "data": [ { "symbol": "USDT/RUB", "askPrice": 82.43, "bidPrice": 82.42, ... } ], ... }
-            if isinstance(data.get("data"), list):
-                items = [item for item in data["data"] if isinstance(item, dict)]
-                def _is_usdtrub(item: Dict[str, Any]) -> bool:
-                    symbol = str(item.get("symbol", ""))
-                    base = str(item.get("baseCurrency", "")).upper()
-                    quote = str(item.get("quoteCurrency", "")).upper()
-                    return (
-                        symbol.upper() in {"USDT/RUB", "USDTRUB", "USDT_RUB"}
-                        or (base == "RUB" and quote == "USDT")
-                    )
-                target = next((it for it in items if _is_usdtrub(it)), None)
-                if target:
-                    ask = target.get("askPrice")
-                    bid = target.get("bidPrice")
-                    close = target.get("close")
-                    if ask is not None and bid is not None:
-                        value = (Decimal(str(ask)) + Decimal(str(bid))) / Decimal("2")
-                    elif close is not None:
-                        value = Decimal(str(close))
-                    else:
-                        raise ValueError("Rapira data item missing ask/bid/close")
-                    extras = {
-                        "symbol": target.get("symbol"),
-                        "ask": ask,
-                        "bid": bid,
-                    }
-                else:
-                    raise ValueError("USDT/RUB not found in Rapira data list")
-
-            # 2) exchangerate.host and similar (fallback if endpoint is not Rapira)
-            elif "rates" in data and "RUB" in data["rates"]:
-                value = Decimal(str(data["rates"]["RUB"]))
-                extras = {}
-
-            # 3) Generic single-number price
-            elif isinstance(data.get("price"), (int, float, str)):
-                value = Decimal(str(data["price"]))
-                extras = {}
-            else:
-                raise ValueError("Unsupported response format for Rapira endpoint")
+            fetched = await self.market()
+            market: MarketSnapshot = fetched.data
+            value, extras = self._parse(market)
+            raw = (market.get(_SYMBOL) or {}) if market.has_list else market.document
+            digest = fetched.digest
         except Exception:
             # Public fallback via shared helper
             value, raw = await self.fetch_usd_to_rub_no_key()
@@ -88,4 +107,4 @@ class RapiraProvider(BaseRateProvider):
             updated_at=datetime.now(timezone.utc),
             extras={"endpoint": self.endpoint, "note": "public-no-key", **(extras or {})},
         )
-        return CachedRate(payload=payload, raw_source=raw)
+        return CachedRate(payload=payload, raw_source=raw, source_digest=digest)
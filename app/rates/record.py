@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+import orjson
+
+from app.rates.models import BybitMode, GeoOption, RateMethod, RatePayload, RateSource
+
+# RatePayload quantizes values to 6 decimal places, so micro-units are exact
+VALUE_DIGITS = 6
+WIRE_VERSION = 1
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_US = timedelta(microseconds=1)
+
+# Plain dict lookups are several times cheaper than calling the Enum by value
+_SOURCES = {item.value: item for item in RateSource}
+_METHODS = {item.value: item for item in RateMethod}
+_MODES = {item.value: item for item in BybitMode}
+_GEOS = {item.value: item for item in GeoOption}
+
+
+def now_us() -> int:
+    return time.time_ns() // 1000
+
+
+def datetime_to_us(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // _ONE_US
+
+
+def us_to_datetime(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def _copy_extras(value: Any) -> Any:
+    """Copy of JSON-like ``extras`` down to the leaves (which are immutable).
+
+    Far cheaper than ``copy.deepcopy`` for the small nested dicts providers
+    put there (``fx``, ``ask``/``bid``, book metadata).
+    """
+    if isinstance(value, dict):
+        return {key: _copy_extras(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy_extras(item) for item in value]
+    return value
+
+
+class RateRecord:
+    """Compact cache representation of a rate.
+
+    Used on the cache hot path (L1, Redis, pub/sub) instead of ``RatePayload``:
+    values are fixed-point micro-units, timestamps are epoch microseconds and
+    the wire format is a flat orjson array, so neither encoding nor decoding
+    runs pydantic validation. ``to_payload()`` builds the pydantic model at
+    the API boundary.
+    """
+
+    __slots__ = (
+        "source",
+        "method",
+        "mode",
+        "geo",
+        "depth",
+        "value_micros",
+        "updated_at_us",
+        "valid_until_us",
+        "extras",
+        "_payload",
+    )
+
+    def __init__(
+        self,
+        source: str,
+        method: str,
+        mode: str,
+        geo: str,
+        depth: Optional[int],
+        value_micros: int,
+        updated_at_us: int,
+        valid_until_us: Optional[int] = None,
+        extras: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.source = source
+        self.method = method
+        self.mode = mode
+        self.geo = geo
+        self.depth = depth
+        self.value_micros = value_micros
+        self.updated_at_us = updated_at_us
+        self.valid_until_us = valid_until_us
+        self.extras = extras or {}
+        self._payload: Optional[RatePayload] = None
+
+    @classmethod
+    def from_payload(cls, payload: RatePayload) -> "RateRecord":
+        return cls(
+            source=payload.source.value,
+            method=payload.method.value,
+            mode=payload.mode.value,
+            geo=payload.geo.value,
+            depth=payload.depth,
+            value_micros=int(payload.value.scaleb(VALUE_DIGITS)),
+            updated_at_us=datetime_to_us(payload.updated_at),
+            valid_until_us=datetime_to_us(payload.valid_until) if payload.valid_until else None,
+            # The caller keeps its payload; the record must not share its extras
+            extras=_copy_extras(payload.extras),
+        )
+
+    def refreshed(self, updated_at_us: int) -> "RateRecord":
+        """The same rate, fetched again at ``updated_at_us``."""
+        return RateRecord(
+            self.source,
+            self.method,
+            self.mode,
+            self.geo,
+            self.depth,
+            self.value_micros,
+            updated_at_us,
+            self.valid_until_us,
+            self.extras,
+        )
+
+    @property
+    def value(self) -> Decimal:
+        return Decimal(self.value_micros).scaleb(-VALUE_DIGITS)
+
+    def age(self, now: Optional[int] = None) -> float:
+        """Seconds since the rate was fetched."""
+        return ((now if now is not None else now_us()) - self.updated_at_us) / 1_000_000
+
+    def to_payload(self) -> RatePayload:
+        """Pydantic view of the record; a fresh copy per call since callers mutate it.
+
+        ``extras`` is copied all the way down: the record may sit in L1 and
+        must not change when a handler edits a nested dict of its payload.
+        """
+        if self._payload is None:
+            # Every field was validated when the record was built from a payload
+            self._payload = RatePayload.model_construct(
+                source=_SOURCES[self.source],
+                method=_METHODS[self.method],
+                mode=_MODES[self.mode],
+                geo=_GEOS[self.geo],
+                depth=self.depth,
+                value=self.value,
+                updated_at=us_to_datetime(self.updated_at_us),
+                valid_until=(
+                    None if self.valid_until_us is None else us_to_datetime(self.valid_until_us)
+                ),
+                stale=False,
+                extras=self.extras,
+            )
+        return self._payload.model_copy(update={"extras": _copy_extras(self.extras)})
+
+    def to_wire(self) -> List[Any]:
+        return [
+            WIRE_VERSION,
+            self.source,
+            self.method,
+            self.mode,
+            self.geo,
+            self.depth,
+            self.value_micros,
+            self.updated_at_us,
+            self.valid_until_us,
+            self.extras,
+        ]
+
+    @classmethod
+    def from_wire(cls, data: Any) -> "RateRecord":
+        if isinstance(data, dict):
+            # Entries written before the compact format: validate once, then convert
+            return cls.from_payload(RatePayload(**data))
+        if not isinstance(data, list) or len(data) != 10 or data[0] != WIRE_VERSION:
+            raise ValueError("Unsupported rate record format")
+        return cls(*data[1:])
+
+    def encode(self) -> bytes:
+        # Providers may put Decimals into extras; keep them as strings
+        return orjson.dumps(self.to_wire(), default=str)
+
+    @classmethod
+    def decode(cls, raw: bytes) -> "RateRecord":
+        return cls.from_wire(orjson.loads(raw))
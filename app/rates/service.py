@@ -2,77 +2,486 @@ from __future__ import annotations
 
 import asyncio
 from datetime import datetime, timezone
-from typing import Dict, Optional, Protocol
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Protocol,
+    Sequence,
+    Set,
+    Tuple,
+)
 
 import orjson
 from redis.asyncio import Redis
 
 from app.core.config import Settings
 from app.core.logging import get_logger
-from app.rates.models import CachedRate, RatePayload, RateQuery, RateSource
+from app.core.metrics import metrics
+from app.rates.cache import LocalRateCache
+from app.rates.demand import DemandTracker
+from app.rates.geo import GeoTable
+from app.rates.history import RateHistory
+from app.rates.models import CachedRate, GeoOption, RatePayload, RateQuery, RateSource
+from app.rates.record import RateRecord, now_us
+from app.rates.singleflight import RedisLease, SingleFlight
 
 log = get_logger(__name__)
 
+RATE_UPDATES_CHANNEL = "rates:updated"
+
 
 class RateProvider(Protocol):
     async def fetch(self, query: RateQuery) -> CachedRate:
         raise NotImplementedError
 
 
+class _PendingWrite(NamedTuple):
+    key: str
+    record: RateRecord
+    ttl: int
+    lease: Optional[Tuple[str, str]]
+    changed: bool = True
+    # Upstream document digest, kept next to the record for the next fetch to compare
+    digest: Optional[str] = None
+
+
 class RateService:
-    def __init__(self, redis: Redis, providers: Dict[RateSource, RateProvider], settings: Settings) -> None:
+    def __init__(
+        self,
+        redis: Redis,
+        providers: Dict[RateSource, RateProvider],
+        settings: Settings,
+        demand: Optional[DemandTracker] = None,
+    ) -> None:
         self.redis = redis
         self.providers = providers
         self.settings = settings
+        # Request counts feeding the worker's refresh scheduler
+        self.demand = demand
+        # One upstream fetch per cache key inside the process ...
+        self._flight: SingleFlight[RatePayload] = SingleFlight("rates")
+        # ... and across the bot replicas and the worker
+        self._lease = RedisLease(redis, ttl_ms=int(settings.rate_lease_ms or 15000))
+        # L1 in front of Redis, kept in sync through RATE_UPDATES_CHANNEL
+        self._l1 = LocalRateCache(max_entries=int(settings.rates_l1_max_entries or 0))
+        self._revalidations: Set[asyncio.Task[RatePayload]] = set()
+        # Every stored rate is also appended to its time series
+        self.history = RateHistory(redis, max_points=int(settings.history_max_points or 0))
+        # Geo variants are derived from the base rate, never fetched or stored
+        self.geo = GeoTable.from_settings(settings)
 
-    def _cache_key(self, query: RateQuery) -> str:
+    def cache_key(self, query: RateQuery) -> str:
         geo = query.geo.value if hasattr(query.geo, "value") else query.geo
         mode = query.mode.value if hasattr(query.mode, "value") else query.mode
         method = query.method.value if hasattr(query.method, "value") else query.method
         return f"rate:{query.source.value}:{method}:{geo}:{mode}:{query.depth or 0}"
 
-    async def _get_cached(self, key: str) -> Optional[RatePayload]:
+    @staticmethod
+    def _lease_key(key: str) -> str:
+        return f"lease:{key}"
+
+    @staticmethod
+    def _digest_key(key: str) -> str:
+        return f"digest:{key}"
+
+    def ttl_for(self, source: RateSource) -> int:
+        return int(self.settings.cache_ttl_per_source.model_dump().get(source.value, 30))
+
+    def _grace_for(self, source: RateSource) -> int:
+        if not self.settings.rates_serve_stale:
+            return 0
+        return int(self.settings.stale_grace_per_source.model_dump().get(source.value, 0))
+
+    async def _get_cached(self, key: str, ttl: int, *, local: bool = True) -> Optional[RateRecord]:
+        """Return the cached record if it is younger than ``ttl`` (TTL plus grace)."""
+        if local:
+            hit = self._l1.get(key)
+            if hit is not None:
+                return hit
         raw = await self.redis.get(key)
         if not raw:
             return None
-        data = orjson.loads(raw)
-        return RatePayload(**data)
+        record = RateRecord.decode(raw)
+        self._l1.put(key, record, ttl - record.age())
+        return record
+
+    async def _store_cached(
+        self,
+        key: str,
+        record: RateRecord,
+        ttl: int,
+        changed: bool = True,
+        digest: Optional[str] = None,
+    ) -> None:
+        await self._store_many([_PendingWrite(key, record, ttl, None, changed, digest)])
+
+    async def _store_many(self, writes: Sequence[_PendingWrite]) -> None:
+        """Store, publish and release the leases of ``writes`` in one round trip.
+
+        Unchanged upstream payloads refresh the stored entry and publish only
+        a touch (key, ttl, ``updated_at_us``), so subscribers extend their L1
+        copy; they are not archived and add no history point.
+        """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for write in writes:
+                wire = write.record.to_wire()
+                pipe.set(write.key, orjson.dumps(wire, default=str), ex=write.ttl)
+                if write.digest is not None:
+                    pipe.set(self._digest_key(write.key), write.digest, ex=write.ttl)
+                else:
+                    pipe.delete(self._digest_key(write.key))
+                if not write.changed:
+                    metrics.inc("rates.store.skipped", source=write.record.source)
+                    touch = orjson.dumps([write.key, write.ttl, write.record.updated_at_us])
+                    pipe.publish(RATE_UPDATES_CHANNEL, touch)
+                    continue
+                update = orjson.dumps([write.key, write.ttl, wire], default=str)
+                pipe.publish(RATE_UPDATES_CHANNEL, update)
+                self.history.append_in(pipe, write.key, write.record)
+            for write in writes:
+                if write.lease is not None:
+                    self._lease.release_in(pipe, *write.lease)
+            await pipe.execute()
+        for write in writes:
+            self._l1.put(write.key, write.record, write.ttl)
+
+    def _live_write(
+        self, key: str, query: RateQuery, payload: RatePayload
+    ) -> Optional[_PendingWrite]:
+        """A stream-served rate stored like a fetched one, but only once it moves.
+
+        Storing publishes it, so alerts, history and the archive see stream
+        values too. The comparison is against the L1 copy, which every
+        process's stores keep current, so a value another replica overwrote
+        is written again; an unchanged one is only re-stored once it ages
+        past its TTL.
+        """
+        record = RateRecord.from_payload(payload)
+        ttl = self.ttl_for(query.source)
+        current = self._l1.get(key)
+        changed = current is None or current.value_micros != record.value_micros
+        if not changed and current is not None and current.age() <= ttl:
+            return None
+        return _PendingWrite(key, record, ttl + self._grace_for(query.source), None, changed)
 
-    async def _store_cached(self, key: str, payload: RatePayload, ttl: int) -> None:
-        # Use JSON mode to ensure types like Decimal and datetime are JSON-serializable
-        await self.redis.set(key, orjson.dumps(payload.model_dump(mode="json")), ex=ttl)
+    async def _store_live(self, writes: Sequence[Optional[_PendingWrite]]) -> None:
+        pending = [write for write in writes if write is not None]
+        if not pending:
+            return
+        try:
+            await self._store_many(pending)
+        except Exception as exc:  # noqa: BLE001 - the live rate is still good to return
+            log.warning("Failed to store live rates", keys=[w.key for w in pending], error=str(exc))
+
+    def _apply_update(self, message: bytes) -> None:
+        try:
+            data = orjson.loads(message)
+            if isinstance(data, dict):
+                # Published by a process still on the old payload format
+                self._l1.invalidate(str(data.get("key")))
+                return
+            key, ttl, wire = data
+        except (orjson.JSONDecodeError, TypeError, ValueError):
+            log.warning("Malformed rate update message", message=message[:200])
+            return
+        if isinstance(wire, int):
+            # Re-stored unchanged: only the age of the copy we may hold moved
+            if self._l1.touch(str(key), wire, int(ttl)):
+                metrics.inc("rates.l1.touched")
+            return
+        try:
+            record = RateRecord.from_wire(wire)
+        except Exception:  # noqa: BLE001 - drop the entry instead of serving a bad one
+            self._l1.invalidate(str(key))
+            return
+        self._l1.put(str(key), record, int(ttl) - record.age())
+        metrics.inc("rates.l1.refreshed")
+
+    async def listen_updates(self, reconnect_delay: float = 1.0) -> None:
+        """Keep the L1 cache in sync with rates stored by other processes."""
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(RATE_UPDATES_CHANNEL)
+                # Whatever was published while we were disconnected is lost
+                self._l1.clear()
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._apply_update(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # noqa: BLE001 - resubscribe after a pause
+                log.warning("Rate updates subscription failed", error=str(exc))
+                self._l1.clear()
+                await asyncio.sleep(reconnect_delay)
+            finally:
+                await pubsub.aclose()  # type: ignore[attr-defined]
 
     async def get_rate(self, query: RateQuery, *, force: bool = False) -> RatePayload:
-        key = self._cache_key(query)
-        ttl = self.settings.cache_ttl_per_source.model_dump().get(query.source.value, 30)
-        if not force:
-            cached = await self._get_cached(key)
-            if cached:
-                return cached
+        if query.geo != GeoOption.NONE:
+            base = await self.get_rate(self.geo.base(query), force=force)
+            return self.geo.apply(base, query.geo)
 
         provider = self.providers.get(query.source)
+        key = self.cache_key(query)
+        if self.demand is not None:
+            self.demand.record(key, query)
+        live_rate = getattr(provider, "live_rate", None)
+        if live_rate is not None and not force:
+            # Stream-fed providers answer from memory, fresher than any cache entry
+            live: Optional[RatePayload] = live_rate(query)
+            if live is not None:
+                await self._store_live([self._live_write(key, query, live)])
+                return live
+
+        ttl = self.ttl_for(query.source)
+        grace = self._grace_for(query.source)
+        cached = None if force else await self._get_cached(key, ttl + grace)
+        if cached and cached.age() <= ttl:
+            return cached.to_payload()
+
         if not provider:
             raise ValueError(f"Provider for source {query.source} is not configured")
 
-        cached_rate = await provider.fetch(query)
-        payload = cached_rate.payload
-        await self._store_cached(key, payload, ttl=ttl)
-        return payload
+        if cached:
+            return self._serve_stale(key, query, provider, cached, ttl, grace)
 
-    async def warm_up(self, queries: Dict[str, RateQuery]) -> None:
-        async def _warm(query: RateQuery) -> None:
+        return await self._flight.do(
+            key, lambda: self._refresh(key, query, provider, ttl, grace, force)
+        )
+
+    async def get_many(
+        self,
+        queries: Dict[str, RateQuery],
+        *,
+        force: bool = False,
+        refresh_ahead: float = 0.0,
+    ) -> Dict[str, RatePayload]:
+        """Bulk ``get_rate``: one MGET for everything L1 misses, concurrent upstream
+        fetches for the rest and a single pipeline writing them back.
+
+        With ``refresh_ahead`` (a fraction of the TTL) records in the last part
+        of their TTL are refetched rather than served, and nothing stale is
+        served. Queries that fail are logged and left out of the result.
+        """
+        geos = {name: query.geo for name, query in queries.items() if query.geo != GeoOption.NONE}
+        if geos:
+            base = await self.get_many(
+                {name: self.geo.base(query) for name, query in queries.items()},
+                force=force,
+                refresh_ahead=refresh_ahead,
+            )
+            return {
+                name: self.geo.apply(payload, geos.get(name, GeoOption.NONE))
+                for name, payload in base.items()
+            }
+
+        results: Dict[str, RatePayload] = {}
+        lookups: Dict[str, Tuple[str, RateQuery, int, int]] = {}
+        live_writes: List[Optional[_PendingWrite]] = []
+        for name, query in queries.items():
+            key = self.cache_key(query)
+            if self.demand is not None:
+                self.demand.record(key, query)
+            live_rate = getattr(self.providers.get(query.source), "live_rate", None)
+            if live_rate is not None and not force:
+                live = live_rate(query)
+                if live is not None:
+                    results[name] = live
+                    live_writes.append(self._live_write(key, query, live))
+                    continue
+            lookups[name] = (key, query, self.ttl_for(query.source), self._grace_for(query.source))
+        await self._store_live(live_writes)
+
+        cached = {} if force else await self._get_cached_many(lookups)
+        misses: Dict[str, Tuple[str, RateQuery, RateProvider, int, int]] = {}
+        for name, (key, query, ttl, grace) in lookups.items():
+            record = cached.get(name)
+            if record is not None and record.age() <= ttl * (1 - refresh_ahead):
+                results[name] = record.to_payload()
+                continue
+            provider = self.providers.get(query.source)
+            if not provider:
+                log.warning("Provider is not configured", source=query.source.value)
+                continue
+            if record is not None and not refresh_ahead:
+                results[name] = self._serve_stale(key, query, provider, record, ttl, grace)
+                continue
+            misses[name] = (key, query, provider, ttl, grace)
+
+        metrics.observe("rates.batch.size", len(queries))
+        metrics.observe("rates.batch.misses", len(misses))
+        if misses:
+            # Shielded so a cancelled caller cannot strand fetched rates and held leases
+            results.update(await asyncio.shield(self._fetch_many(misses, force)))
+        return results
+
+    async def _get_cached_many(
+        self, lookups: Dict[str, Tuple[str, RateQuery, int, int]]
+    ) -> Dict[str, RateRecord]:
+        found: Dict[str, RateRecord] = {}
+        remote: List[str] = []
+        for name, (key, _, _, _) in lookups.items():
+            hit = self._l1.get(key)
+            if hit is not None:
+                found[name] = hit
+            else:
+                remote.append(name)
+        if not remote:
+            return found
+        raws = await self.redis.mget([lookups[name][0] for name in remote])
+        for name, raw in zip(remote, raws, strict=True):
+            if not raw:
+                continue
+            key, _, ttl, grace = lookups[name]
+            record = RateRecord.decode(raw)
+            self._l1.put(key, record, ttl + grace - record.age())
+            found[name] = record
+        return found
+
+    async def _fetch_many(
+        self,
+        misses: Dict[str, Tuple[str, RateQuery, RateProvider, int, int]],
+        force: bool,
+    ) -> Dict[str, RatePayload]:
+        writes: List[_PendingWrite] = []
+
+        def _call(
+            key: str, query: RateQuery, provider: RateProvider, ttl: int, grace: int
+        ) -> Callable[[], Awaitable[RatePayload]]:
+            return lambda: self._refresh(key, query, provider, ttl, grace, force, deferred=writes)
+
+        outcomes = await asyncio.gather(
+            *(self._flight.do(miss[0], _call(*miss)) for miss in misses.values()),
+            return_exceptions=True,
+        )
+        if writes:
             try:
-                await self.get_rate(query, force=True)
-            except Exception as exc:  # noqa: BLE001 - log and continue
-                log.warning("Failed to warm cache", query=query.model_dump(), error=str(exc))
+                await self._store_many(writes)
+            except Exception as exc:  # noqa: BLE001 - the rates are still good to return
+                keys = [write.key for write in writes]
+                log.warning("Failed to store fetched rates", keys=keys, error=str(exc))
+                for write in writes:
+                    if write.lease is not None:
+                        await self._release_quietly(*write.lease)
+
+        results: Dict[str, RatePayload] = {}
+        for (name, (_, query, _, _, _)), outcome in zip(misses.items(), outcomes, strict=True):
+            if isinstance(outcome, BaseException):
+                log.warning("Failed to fetch rate", query=query.model_dump(), error=str(outcome))
+            else:
+                results[name] = outcome
+        return results
+
+    async def _release_quietly(self, lease_key: str, token: str) -> None:
+        try:
+            await self._lease.release(lease_key, token)
+        except Exception:  # noqa: BLE001 - the lease expires on its own
+            pass
+
+    def _serve_stale(
+        self,
+        key: str,
+        query: RateQuery,
+        provider: RateProvider,
+        cached: RateRecord,
+        ttl: int,
+        grace: int,
+    ) -> RatePayload:
+        # Past its TTL but within the grace window: answer now, refresh behind the user
+        metrics.inc("rates.stale.served", source=query.source.value)
+        metrics.observe("rates.stale.age_sec", cached.age(), source=query.source.value)
+        self._revalidate(key, query, provider, ttl, grace)
+        payload = cached.to_payload()
+        warn_age = int(self.settings.rate_warn_age_sec or ttl)
+        return self.mark_stale(payload, ttl=ttl, warn_age=warn_age)
+
+    def _revalidate(
+        self, key: str, query: RateQuery, provider: RateProvider, ttl: int, grace: int
+    ) -> None:
+        task = asyncio.create_task(
+            self._flight.do(key, lambda: self._refresh(key, query, provider, ttl, grace, False))
+        )
+        self._revalidations.add(task)
 
-        await asyncio.gather(*(_warm(q) for q in queries.values()))
+        def _done(done: asyncio.Task[RatePayload]) -> None:
+            self._revalidations.discard(done)
+            if not done.cancelled() and done.exception() is not None:
+                metrics.inc("rates.stale.revalidate_failed", source=query.source.value)
+                log.warning("Background rate refresh failed", key=key, error=str(done.exception()))
+
+        task.add_done_callback(_done)
+
+    async def _refresh(
+        self,
+        key: str,
+        query: RateQuery,
+        provider: RateProvider,
+        ttl: int,
+        grace: int,
+        force: bool,
+        deferred: Optional[List[_PendingWrite]] = None,
+    ) -> RatePayload:
+        """Fetch from upstream and cache; with ``deferred`` the store (and lease
+        release) is queued for the caller to flush in one pipeline instead."""
+        source = query.source.value
+        requested_at = now_us()
+        lease_key = self._lease_key(key)
+        token = await self._lease.acquire(lease_key)
+        if token is None:
+            # Another process is fetching this key: wait for it and reuse its result
+            metrics.inc("rates.lease.waited", source=source)
+            if await self._lease.wait_released(lease_key):
+                cached = await self._get_cached(key, ttl + grace, local=False)
+                if (
+                    cached is not None
+                    and cached.age() <= ttl
+                    and (not force or cached.updated_at_us >= requested_at)
+                ):
+                    metrics.inc("rates.lease.coalesced", source=source)
+                    return cached.to_payload()
+            metrics.inc("rates.lease.fallthrough", source=source)
+
+        handed_off = False
+        try:
+            raw, previous_digest = await self.redis.mget(key, self._digest_key(key))
+            if token is not None and not force and raw:
+                # Another process may have stored the key between our miss and the lease
+                stored = RateRecord.decode(raw)
+                if stored.age() <= ttl:
+                    self._l1.put(key, stored, ttl + grace - stored.age())
+                    metrics.inc("rates.lease.rechecked", source=source)
+                    return stored.to_payload()
+            metrics.inc("rates.upstream.fetch", source=source)
+            cached_rate = await provider.fetch(query)
+            payload = cached_rate.payload
+            record = RateRecord.from_payload(payload)
+            digest = cached_rate.source_digest
+            # Compared with what is stored, whichever process stored it
+            changed = digest is None or digest.encode() != previous_digest
+            if deferred is None:
+                await self._store_cached(key, record, ttl + grace, changed, digest)
+            else:
+                lease = (lease_key, token) if token is not None else None
+                deferred.append(_PendingWrite(key, record, ttl + grace, lease, changed, digest))
+                handed_off = True
+            return payload
+        finally:
+            if token is not None and not handed_off:
+                await self._lease.release(lease_key, token)
+
+    async def warm_up(self, queries: Dict[str, RateQuery]) -> None:
+        await self.get_many(queries, force=True)
 
     @staticmethod
     def mark_stale(payload: RatePayload, ttl: int, warn_age: int) -> RatePayload:
         now = datetime.now(timezone.utc)
         age = (now - payload.updated_at).total_seconds()
-        if age > warn_age:
+        if age > ttl or age > warn_age:
             payload.stale = True
         if payload.valid_until and payload.valid_until < now:
             payload.stale = True
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Generic, Optional, TypeVar
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+from app.core.metrics import metrics
+
+T = TypeVar("T")
+
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight(Generic[T]):
+    """Coalesces concurrent calls for the same key into one in-flight task.
+
+    The first caller for a key starts the call, every other caller awaits the
+    same task. The task is shielded so a cancelled waiter does not cancel the
+    shared fetch for the rest.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._inflight: Dict[str, asyncio.Future[T]] = {}
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        future = self._inflight.get(key)
+        if future is not None:
+            metrics.inc("singleflight.coalesced", group=self.name)
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(call())
+        self._inflight[key] = future
+        metrics.inc("singleflight.leader", group=self.name)
+
+        def _done(fut: asyncio.Future[T]) -> None:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+            # Mark the exception as retrieved even if every waiter was cancelled
+            if not fut.cancelled():
+                fut.exception()
+
+        future.add_done_callback(_done)
+        return await asyncio.shield(future)
+
+
+class RedisLease:
+    """Short-lived Redis lease that lets one process refresh a key at a time."""
+
+    def __init__(
+        self, redis: Redis[bytes], ttl_ms: int = 15000, poll_interval: float = 0.05
+    ) -> None:
+        self.redis = redis
+        self.ttl_ms = ttl_ms
+        self.poll_interval = poll_interval
+
+    async def acquire(self, key: str) -> Optional[str]:
+        token = uuid.uuid4().hex
+        acquired = await self.redis.set(key, token, nx=True, px=self.ttl_ms)
+        return token if acquired else None
+
+    async def release(self, key: str, token: str) -> None:
+        await self.redis.eval(_RELEASE_SCRIPT, 1, key, token)  # type: ignore[no-untyped-call]
+
+    def release_in(self, pipe: Pipeline[bytes], key: str, token: str) -> None:
+        """Queue the release on a pipeline so it rides along with other writes."""
+        pipe.eval(_RELEASE_SCRIPT, 1, key, token)
+
+    async def wait_released(self, key: str, timeout: Optional[float] = None) -> bool:
+        """Poll until the lease disappears; False if it is still held after ``timeout``."""
+        deadline = time.monotonic() + (timeout if timeout is not None else self.ttl_ms / 1000)
+        while await self.redis.exists(key):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(self.poll_interval)
+        return True
@@ -0,0 +1 @@
+"""Rate alert subscriptions."""
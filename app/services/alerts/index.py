@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Tuple
+
+ABOVE = "above"
+BELOW = "below"
+SIDES = (ABOVE, BELOW)
+
+_MAX_ID = 2**63
+
+# (threshold in micro-units, alert id); ties on the threshold keep id order
+Entry = Tuple[int, int]
+
+
+class ThresholdIndex:
+    """Alert thresholds of every series in sorted lists.
+
+    ``above`` entries fire once the rate reaches their threshold, ``below``
+    entries once it drops to theirs, so the crossed entries of an update are
+    always a prefix of ``above`` and a suffix of ``below``: two bisects find
+    them, however many alerts are waiting, i.e. O(log n + k) per update.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[Tuple[str, str], List[Entry]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    def __contains__(self, series: str) -> bool:
+        return (ABOVE, series) in self._entries or (BELOW, series) in self._entries
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def add(self, series: str, side: str, threshold: int, alert_id: int) -> None:
+        entries = self._entries.setdefault((side, series), [])
+        entry = (threshold, alert_id)
+        pos = bisect_left(entries, entry)
+        # An add replayed after a reload that already picked it up
+        if pos == len(entries) or entries[pos] != entry:
+            entries.insert(pos, entry)
+
+    def load(self, series: str, side: str, entries: Iterable[Entry]) -> None:
+        """Bulk insert, sorting once instead of once per entry."""
+        merged = self._entries.get((side, series), []) + list(entries)
+        if merged:
+            merged.sort()
+            self._entries[(side, series)] = merged
+
+    def remove(self, series: str, side: str, threshold: int, alert_id: int) -> bool:
+        entries = self._entries.get((side, series))
+        if not entries:
+            return False
+        pos = bisect_left(entries, (threshold, alert_id))
+        if pos == len(entries) or entries[pos] != (threshold, alert_id):
+            return False
+        del entries[pos]
+        if not entries:
+            del self._entries[(side, series)]
+        return True
+
+    def pop_crossed(self, series: str, value: int) -> List[Entry]:
+        """Remove and return the entries ``value`` (micro-units) has reached."""
+        crossed: List[Entry] = []
+        above = self._entries.get((ABOVE, series))
+        if above:
+            end = bisect_right(above, (value, _MAX_ID))
+            if end:
+                crossed += above[:end]
+                del above[:end]
+        below = self._entries.get((BELOW, series))
+        if below:
+            start = bisect_left(below, (value, -1))
+            if start < len(below):
+                crossed += below[start:]
+                del below[start:]
+        for side in SIDES:
+            if not self._entries.get((side, series), True):
+                del self._entries[(side, series)]
+        return crossed
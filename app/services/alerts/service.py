@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import asdict, dataclass
+from decimal import Decimal
+from typing import Any, Iterable, List, Optional, Tuple
+
+import orjson
+from redis.asyncio import Redis
+
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.rates.history import series_name
+from app.rates.record import VALUE_DIGITS, RateRecord
+from app.rates.service import RATE_UPDATES_CHANNEL
+from app.services.alerts.index import ABOVE, BELOW, ThresholdIndex
+from app.services.sender.service import LANE_HIGH, Sender
+from app.utils.formatting import format_alert_fired
+
+log = get_logger(__name__)
+
+# Durable state: every alert's definition in one hash, its thresholds in one
+# sorted set per (side, series) scored by micro-units, and the ids per chat.
+ALERTS_CHANNEL = "alerts:changed"
+ALERT_SEQ_KEY = "alerts:seq"
+ALERT_DEFS_KEY = "alerts:def"
+ALERT_SERIES_KEY = "alerts:series"
+ALERT_CHAT_PREFIX = "alerts:chat:"
+ALERT_INDEX_PREFIX = "alerts:idx:"
+
+# Adds ARGV[1] to the chat's set unless it already holds ARGV[2] alerts (0: no limit)
+_RESERVE_SCRIPT = """
+local limit = tonumber(ARGV[2])
+if limit > 0 and redis.call('scard', KEYS[1]) >= limit then
+    return 0
+end
+redis.call('sadd', KEYS[1], ARGV[1])
+return 1
+"""
+
+KIND_ABOVE = "above"
+KIND_BELOW = "below"
+KIND_MOVE = "move"
+
+
+def to_micros(value: Decimal) -> int:
+    return int(value.scaleb(VALUE_DIGITS))
+
+
+def from_micros(value: int) -> Decimal:
+    return Decimal(value).scaleb(-VALUE_DIGITS)
+
+
+class AlertLimitError(ValueError):
+    """The chat already has as many alerts as it may."""
+
+
+@dataclass(frozen=True)
+class Alert:
+    """A one-shot rate alert.
+
+    ``above`` alerts carry ``upper``, ``below`` alerts ``lower`` and ``move``
+    alerts both: ``reference`` moved by ``percent`` either way.
+    """
+
+    id: int
+    chat_id: int
+    source: str
+    series: str
+    kind: str
+    upper: Optional[int] = None
+    lower: Optional[int] = None
+    reference: Optional[int] = None
+    percent: Optional[str] = None
+    created_at: float = 0.0
+
+    def thresholds(self) -> List[Tuple[str, int]]:
+        sides: List[Tuple[str, int]] = []
+        if self.upper is not None:
+            sides.append((ABOVE, self.upper))
+        if self.lower is not None:
+            sides.append((BELOW, self.lower))
+        return sides
+
+    def encode(self) -> bytes:
+        return orjson.dumps(asdict(self))
+
+    @classmethod
+    def decode(cls, raw: Any) -> "Alert":
+        return cls(**orjson.loads(raw))
+
+
+def index_key(side: str, series: str) -> str:
+    return f"{ALERT_INDEX_PREFIX}{side}:{series}"
+
+
+def chat_key(chat_id: int) -> str:
+    return f"{ALERT_CHAT_PREFIX}{chat_id}"
+
+
+class AlertService:
+    """Alert subscriptions stored in Redis; changes are announced on ``ALERTS_CHANNEL``."""
+
+    def __init__(self, redis: Redis[bytes], max_per_chat: int = 20) -> None:
+        self.redis = redis
+        self.max_per_chat = max_per_chat
+
+    async def create(
+        self,
+        chat_id: int,
+        source: str,
+        series: str,
+        kind: str,
+        upper: Optional[int] = None,
+        lower: Optional[int] = None,
+        reference: Optional[int] = None,
+        percent: Optional[str] = None,
+    ) -> Alert:
+        alert = Alert(
+            id=int(await self.redis.incr(ALERT_SEQ_KEY)),
+            chat_id=chat_id,
+            source=source,
+            series=series,
+            kind=kind,
+            upper=upper,
+            lower=lower,
+            reference=reference,
+            percent=percent,
+            created_at=time.time(),
+        )
+        # Checked and taken in one step, so concurrent /alert commands cannot overshoot
+        reserved = await self.redis.eval(  # type: ignore[no-untyped-call]
+            _RESERVE_SCRIPT, 1, chat_key(chat_id), alert.id, self.max_per_chat
+        )
+        if not reserved:
+            raise AlertLimitError(f"At most {self.max_per_chat} alerts per chat")
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(ALERT_DEFS_KEY, str(alert.id), alert.encode())
+                for side, threshold in alert.thresholds():
+                    pipe.zadd(index_key(side, series), {str(alert.id): threshold})
+                pipe.sadd(ALERT_SERIES_KEY, series)
+                pipe.publish(ALERTS_CHANNEL, orjson.dumps(["add", asdict(alert)]))
+                await pipe.execute()
+        except Exception:
+            await self.redis.srem(chat_key(chat_id), alert.id)
+            raise
+        metrics.inc("alerts.created", kind=kind)
+        return alert
+
+    async def get_many(self, alert_ids: Iterable[int]) -> List[Alert]:
+        ids = [str(alert_id) for alert_id in alert_ids]
+        if not ids:
+            return []
+        raw = await self.redis.hmget(ALERT_DEFS_KEY, ids)
+        return [Alert.decode(item) for item in raw if item]
+
+    async def list(self, chat_id: int) -> List[Alert]:
+        members = await self.redis.smembers(chat_key(chat_id))
+        alerts = await self.get_many(int(item) for item in members)
+        return sorted(alerts, key=lambda alert: alert.id)
+
+    async def remove(self, chat_id: int, alert_id: int) -> bool:
+        alerts = await self.get_many([alert_id])
+        if not alerts or alerts[0].chat_id != chat_id:
+            return False
+        return await self.claim(alerts[0])
+
+    async def claim(self, alert: Alert) -> bool:
+        """Delete ``alert``; only the caller whose delete found it gets ``True``.
+
+        Firing and removing both go through here, so an alert crossed while it
+        is being removed (or seen by two matchers) notifies at most once.
+        """
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hdel(ALERT_DEFS_KEY, str(alert.id))
+            for side, _ in alert.thresholds():
+                pipe.zrem(index_key(side, alert.series), str(alert.id))
+            pipe.srem(chat_key(alert.chat_id), alert.id)
+            pipe.publish(ALERTS_CHANNEL, orjson.dumps(["remove", asdict(alert)]))
+            results = await pipe.execute()
+        return bool(results[0])
+
+    async def load_index(self, index: ThresholdIndex) -> int:
+        """Fill ``index`` from the sorted sets; returns the number of entries."""
+        index.clear()
+        members = await self.redis.smembers(ALERT_SERIES_KEY)
+        series_list = sorted(item.decode() if isinstance(item, bytes) else item for item in members)
+        if not series_list:
+            return 0
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for series in series_list:
+                for side in (ABOVE, BELOW):
+                    pipe.zrange(index_key(side, series), 0, -1, withscores=True)
+            results = await pipe.execute()
+        loaded = 0
+        for pos, series in enumerate(series_list):
+            for offset, side in enumerate((ABOVE, BELOW)):
+                entries = [(int(score), int(member)) for member, score in results[2 * pos + offset]]
+                index.load(series, side, entries)
+                loaded += len(entries)
+        return loaded
+
+
+class AlertMatcher:
+    """Matches published rate updates against the in-memory threshold index.
+
+    The index mirrors the sorted sets: it is rebuilt whenever the
+    subscription (re)starts and kept current from ``ALERTS_CHANNEL``. Only the
+    crossed entries of an update are touched; their alerts are claimed in
+    Redis before the notification is queued on ``sender``.
+    """
+
+    def __init__(self, service: AlertService, sender: Sender) -> None:
+        self.service = service
+        self.sender = sender
+        self.index = ThresholdIndex()
+
+    def _apply_change(self, message: bytes) -> None:
+        try:
+            action, data = orjson.loads(message)
+            alert = Alert(**data)
+        except (orjson.JSONDecodeError, TypeError, ValueError):
+            log.warning("Malformed alert change message", message=message[:200])
+            return
+        for side, threshold in alert.thresholds():
+            if action == "add":
+                self.index.add(alert.series, side, threshold, alert.id)
+            else:
+                self.index.remove(alert.series, side, threshold, alert.id)
+
+    async def _on_rate(self, message: bytes) -> None:
+        try:
+            key, _, wire = orjson.loads(message)
+        except (orjson.JSONDecodeError, TypeError, ValueError):
+            return
+        series = series_name(str(key))
+        if series not in self.index:
+            return
+        try:
+            value = RateRecord.from_wire(wire).value_micros
+        except Exception:  # noqa: BLE001 - a bad update must not stop matching
+            return
+        crossed = self.index.pop_crossed(series, value)
+        if crossed:
+            await self._fire(value, crossed)
+
+    async def _fire(self, value: int, crossed: List[Tuple[int, int]]) -> None:
+        alerts = await self.service.get_many(dict.fromkeys(alert_id for _, alert_id in crossed))
+        for alert in alerts:
+            # A move alert has a second threshold that must not fire again
+            for side, threshold in alert.thresholds():
+                self.index.remove(alert.series, side, threshold, alert.id)
+            if not await self.service.claim(alert):
+                continue
+            metrics.inc("alerts.fired", source=alert.source, kind=alert.kind)
+            text = format_alert_fired(alert, from_micros(value))
+            await self.sender.send(alert.chat_id, text, lane=LANE_HIGH)
+
+    async def run(self, reconnect_delay: float = 1.0) -> None:
+        redis = self.service.redis
+        while True:
+            pubsub = redis.pubsub()
+            try:
+                await pubsub.subscribe(ALERTS_CHANNEL, RATE_UPDATES_CHANNEL)
+                # Changes made while unsubscribed are only in the sorted sets
+                loaded = await self.service.load_index(self.index)
+                metrics.set_gauge("alerts.indexed", loaded)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    channel = message.get("channel")
+                    if channel in (ALERTS_CHANNEL, ALERTS_CHANNEL.encode()):
+                        self._apply_change(message["data"])
+                    else:
+                        await self._on_rate(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # noqa: BLE001 - resubscribe after a pause
+                log.warning("Alert matcher subscription failed", error=str(exc))
+                await asyncio.sleep(reconnect_delay)
+            finally:
+                await pubsub.aclose()  # type: ignore[attr-defined]
+
@@ -0,0 +1 @@
+"""Outbound Telegram message queue."""
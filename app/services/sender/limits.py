@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import time
+from typing import Callable, Dict
+
+
+class TokenBucket:
+    """``rate`` tokens per second, holding at most ``capacity``."""
+
+    def __init__(
+        self, rate: float, capacity: float = 1.0, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    def _refill(self) -> float:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return now
+
+    def delay(self) -> float:
+        """Seconds until a token is available (0 if one is now)."""
+        self._refill()
+        if self._tokens >= 1 or self.rate <= 0:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def take(self) -> None:
+        self._refill()
+        self._tokens -= 1
+
+
+class ChatLimiter:
+    """Per-chat send slots: one message per ``private_interval`` seconds to a
+    user and per ``group_interval`` to a group (negative chat ids).
+
+    ``reserve`` hands out the next free slot and books it, so messages queued
+    for a busy chat keep their order instead of racing for the same slot.
+    """
+
+    def __init__(
+        self,
+        private_interval: float = 1.0,
+        group_interval: float = 3.0,
+        max_chats: int = 10000,
+    ) -> None:
+        self.private_interval = private_interval
+        self.group_interval = group_interval
+        self.max_chats = max_chats
+        self._next: Dict[int, float] = {}
+
+    def interval(self, chat_id: int) -> float:
+        return self.group_interval if chat_id < 0 else self.private_interval
+
+    def reserve(self, chat_id: int, now: float) -> float:
+        at = max(now, self._next.get(chat_id, 0.0))
+        self._next[chat_id] = at + self.interval(chat_id)
+        if len(self._next) > self.max_chats:
+            self._prune(now)
+        return at
+
+    def block(self, chat_id: int, until: float) -> None:
+        """Keep ``chat_id`` quiet until ``until`` (e.g. Telegram's RetryAfter)."""
+        self._next[chat_id] = max(self._next.get(chat_id, 0.0), until)
+
+    def _prune(self, now: float) -> None:
+        # Chats whose slot is already free carry no state worth keeping
+        self._next = {chat_id: at for chat_id, at in self._next.items() if at > now}
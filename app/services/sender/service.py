@@ -0,0 +1,439 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import orjson
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from aiogram.types import LinkPreviewOptions
+from redis.asyncio import Redis
+
+from app.core.config import Settings
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.services.sender.limits import ChatLimiter, TokenBucket
+
+log = get_logger(__name__)
+
+# Lanes in priority order: replies and alerts, regular posts, broadcasts
+LANE_HIGH = "high"
+LANE_NORMAL = "normal"
+LANE_BULK = "bulk"
+LANES = (LANE_HIGH, LANE_NORMAL, LANE_BULK)
+
+# Queue names: one per bot token
+APP_SENDER = "app"
+PRED_SENDER = "pred"
+
+SENDER_PREFIX = "send:"
+DEAD_LETTERS_MAX = 1000
+
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Moves the next message, highest lane first, onto the processing list in one
+# step, so a message is always in a lane or on that list, and records when it
+# was claimed. KEYS: the lanes, the processing list, the claims set
+_POP_SCRIPT = """
+local processing, claims = KEYS[#KEYS - 1], KEYS[#KEYS]
+for i = 1, #KEYS - 2 do
+    local raw = redis.call('lmove', KEYS[i], processing, 'RIGHT', 'LEFT')
+    if raw then
+        redis.call('zadd', claims, ARGV[1], raw)
+        return raw
+    end
+end
+return false
+"""
+
+# Puts the messages on the processing list claimed at or before ARGV[2] back
+# at the head of their lane, oldest first in line; entries missing a claim
+# time are stamped with ARGV[1]. KEYS: the processing list, the claims set,
+# then the lanes, whose names follow in ARGV[4..]; ARGV[3] is the lane for
+# unknown names
+_RECOVER_SCRIPT = """
+local lanes = {}
+for i = 3, #KEYS do
+    lanes[ARGV[i + 1]] = KEYS[i]
+end
+local count = 0
+local items = redis.call('lrange', KEYS[1], 0, -1)
+for _, raw in ipairs(items) do
+    local claimed = redis.call('zscore', KEYS[2], raw)
+    if not claimed then
+        redis.call('zadd', KEYS[2], ARGV[1], raw)
+    elseif tonumber(claimed) <= tonumber(ARGV[2]) then
+        redis.call('lrem', KEYS[1], 1, raw)
+        redis.call('zrem', KEYS[2], raw)
+        redis.call('rpush', lanes[cjson.decode(raw).lane] or lanes[ARGV[3]], raw)
+        count = count + 1
+    end
+end
+return count
+"""
+
+
+@dataclass(frozen=True)
+class OutgoingMessage:
+    """A queued text message.
+
+    ``slot`` is the send time already booked for the chat when the message
+    was deferred by the per-chat limit; ``attempts`` counts failed sends.
+    """
+
+    chat_id: int
+    text: str
+    lane: str = LANE_NORMAL
+    disable_preview: bool = False
+    id: str = ""
+    enqueued_at: float = 0.0
+    slot: float = 0.0
+    attempts: int = 0
+
+    def encode(self) -> bytes:
+        return orjson.dumps(asdict(self))
+
+    @classmethod
+    def decode(cls, raw: Any) -> "OutgoingMessage":
+        return cls(**orjson.loads(raw))
+
+
+class SenderKeys:
+    def __init__(self, name: str) -> None:
+        base = f"{SENDER_PREFIX}{name}"
+        self.lane_prefix = f"{base}:lane:"
+        self.lanes = {lane: f"{self.lane_prefix}{lane}" for lane in LANES}
+        self.delayed = f"{base}:delayed"
+        # Messages the owner has popped and not finished yet, and when each
+        # was popped (epoch milliseconds)
+        self.processing = f"{base}:processing"
+        self.claims = f"{base}:claims"
+        self.dead = f"{base}:dead"
+        self.owner = f"{base}:owner"
+
+    def lane(self, lane: str) -> str:
+        return self.lanes.get(lane, self.lanes[LANE_NORMAL])
+
+
+class Sender:
+    """Enqueues messages for a bot's ``SenderWorker``.
+
+    The queue lives in Redis, so any process (bot replicas, the worker) can
+    send through the bot named ``name`` and nothing queued is lost on restart.
+    """
+
+    def __init__(self, redis: Redis[bytes], name: str) -> None:
+        self.redis = redis
+        self.name = name
+        self.keys = SenderKeys(name)
+
+    def _message(
+        self, chat_id: int, text: str, lane: str, disable_preview: bool
+    ) -> OutgoingMessage:
+        return OutgoingMessage(
+            chat_id=chat_id,
+            text=text,
+            lane=lane if lane in self.keys.lanes else LANE_NORMAL,
+            disable_preview=disable_preview,
+            id=uuid.uuid4().hex,
+            enqueued_at=time.time(),
+        )
+
+    async def send(
+        self, chat_id: int, text: str, lane: str = LANE_NORMAL, disable_preview: bool = False
+    ) -> str:
+        message = self._message(chat_id, text, lane, disable_preview)
+        await self.redis.lpush(self.keys.lane(message.lane), message.encode())
+        metrics.inc("sender.enqueued", bot=self.name, lane=message.lane)
+        return message.id
+
+    async def send_many(
+        self,
+        chat_ids: Iterable[int],
+        text: str,
+        lane: str = LANE_BULK,
+        disable_preview: bool = False,
+        batch: int = 500,
+    ) -> int:
+        """Enqueue the same text for every chat; returns how many were queued."""
+        queued = 0
+        pending: List[OutgoingMessage] = []
+        for chat_id in chat_ids:
+            pending.append(self._message(chat_id, text, lane, disable_preview))
+            if len(pending) >= batch:
+                queued += await self._push(pending)
+                pending = []
+        if pending:
+            queued += await self._push(pending)
+        return queued
+
+    async def _push(self, messages: List[OutgoingMessage]) -> int:
+        key = self.keys.lane(messages[0].lane)
+        await self.redis.lpush(key, *(message.encode() for message in messages))
+        metrics.inc("sender.enqueued", len(messages), bot=self.name, lane=messages[0].lane)
+        return len(messages)
+
+    async def depth(self) -> Dict[str, int]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in self.keys.lanes.values():
+                pipe.llen(key)
+            pipe.zcard(self.keys.delayed)
+            results = await pipe.execute()
+        depth = dict(zip(self.keys.lanes, (int(item) for item in results[:-1]), strict=True))
+        depth["delayed"] = int(results[-1])
+        return depth
+
+
+class SenderWorker:
+    """Drains a bot's queue within Telegram's limits.
+
+    Lanes are popped in priority order, all sends share one ``global_rate``
+    bucket, and each chat gets its own slots (``ChatLimiter``). A message
+    whose chat is busy, or which Telegram answered with ``RetryAfter``, goes
+    to the delayed set with the time it may be sent and rejoins the head of
+    its lane when that comes, so it never holds up other chats. Transient
+    errors are retried with backoff ``max_attempts`` times, then parked in a
+    dead-letter list.
+
+    Only the holder of the owner lease drains the queue, so every replica can
+    run a worker and the limits still hold per bot. Messages a previous owner
+    popped but never finished are requeued once their claim is older than
+    ``owner_ttl_ms``: by then that owner has lost the lease, so a paused one
+    is not racing its successor for the same send.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        redis: Redis[bytes],
+        name: str,
+        global_rate: float = 30.0,
+        private_interval: float = 1.0,
+        group_per_minute: float = 20.0,
+        max_attempts: int = 5,
+        poll_timeout: float = 1.0,
+        owner_ttl_ms: int = 15000,
+    ) -> None:
+        self.bot = bot
+        self.redis = redis
+        self.name = name
+        self.keys = SenderKeys(name)
+        self.max_attempts = max_attempts
+        self.poll_timeout = poll_timeout
+        self.owner_ttl_ms = owner_ttl_ms
+        self._bucket = TokenBucket(global_rate)
+        group_interval = 60.0 / group_per_minute if group_per_minute > 0 else 0.0
+        self._chats = ChatLimiter(private_interval, group_interval)
+        self._token = uuid.uuid4().hex
+        self._owned_until = 0.0
+        self._next_promote = 0.0
+        self._next_report = 0.0
+        self._next_recover = 0.0
+
+    async def _hold_ownership(self) -> bool:
+        """Take or renew the owner lease; False while another process holds it."""
+        now = time.monotonic()
+        if now < self._owned_until:
+            return True
+        if self._owned_until:
+            renewed = await self.redis.eval(  # type: ignore[no-untyped-call]
+                _RENEW_SCRIPT, 1, self.keys.owner, self._token, self.owner_ttl_ms
+            )
+            if renewed:
+                self._owned_until = now + self.owner_ttl_ms / 3000
+                return True
+            log.warning("Sender lost ownership", bot=self.name)
+            self._owned_until = 0.0
+        if not await self.redis.set(self.keys.owner, self._token, nx=True, px=self.owner_ttl_ms):
+            return False
+        self._owned_until = now + self.owner_ttl_ms / 3000
+        self._next_recover = 0.0
+        return True
+
+    async def _recover_processing(self, now: float) -> None:
+        """Requeue what an earlier owner popped but did not finish.
+
+        Runs between sends, so nothing on the list is this worker's own.
+        """
+        now_ms = int(now * 1000)
+        lanes = list(self.keys.lanes.items())
+        recovered = int(
+            await self.redis.eval(  # type: ignore[no-untyped-call]
+                _RECOVER_SCRIPT,
+                2 + len(lanes),
+                self.keys.processing,
+                self.keys.claims,
+                *(key for _, key in lanes),
+                now_ms,
+                now_ms - self.owner_ttl_ms,
+                LANE_NORMAL,
+                *(lane for lane, _ in lanes),
+            )
+        )
+        if recovered:
+            metrics.inc("sender.recovered", recovered, bot=self.name)
+
+    async def _promote_due(self, now: float, limit: int = 100) -> None:
+        due = await self.redis.zrangebyscore(self.keys.delayed, "-inf", now, start=0, num=limit)
+        for raw in due:
+            # ZREM decides who moves it, should two owners ever overlap
+            if await self.redis.zrem(self.keys.delayed, raw):
+                message = OutgoingMessage.decode(raw)
+                await self.redis.rpush(self.keys.lane(message.lane), raw)
+
+    async def _defer(self, message: OutgoingMessage, at: float) -> None:
+        await self.redis.zadd(self.keys.delayed, {message.encode(): at})
+
+    async def _report(self) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in self.keys.lanes.values():
+                pipe.llen(key)
+            pipe.zcard(self.keys.delayed)
+            results = await pipe.execute()
+        for lane, depth in zip(self.keys.lanes, results[:-1], strict=True):
+            metrics.set_gauge("sender.queue_depth", depth, bot=self.name, lane=lane)
+        metrics.set_gauge("sender.queue_depth", results[-1], bot=self.name, lane="delayed")
+
+    async def _pop(self) -> Optional[Tuple[OutgoingMessage, bytes]]:
+        """The next message and its raw form, now on the processing list.
+
+        BLMOVE waits on a single list, so an idle worker blocks on the high
+        lane only: replies and alerts wake it at once, the other lanes are
+        picked up within ``poll_timeout``.
+        """
+        lanes = list(self.keys.lanes.values())
+        raw: Any = await self.redis.eval(  # type: ignore[no-untyped-call]
+            _POP_SCRIPT,
+            len(lanes) + 2,
+            *lanes,
+            self.keys.processing,
+            self.keys.claims,
+            int(time.time() * 1000),
+        )
+        if raw is None:
+            raw = await self.redis.blmove(
+                self.keys.lanes[LANE_HIGH], self.keys.processing, self.poll_timeout, "RIGHT", "LEFT"
+            )
+            if raw is None:
+                return None
+            # Should this not land, recovery stamps the entry when it next runs
+            await self.redis.zadd(self.keys.claims, {raw: int(time.time() * 1000)})
+        return OutgoingMessage.decode(raw), raw
+
+    async def _deliver(self, message: OutgoingMessage) -> None:
+        preview = LinkPreviewOptions(is_disabled=True) if message.disable_preview else None
+        await self.bot.send_message(message.chat_id, message.text, link_preview_options=preview)
+
+    async def _handle(self, message: OutgoingMessage) -> None:
+        now = time.time()
+        if not message.slot or message.slot > now:
+            at = self._chats.reserve(message.chat_id, now)
+            if at > now:
+                metrics.inc("sender.deferred", bot=self.name, reason="chat_limit")
+                await self._defer(replace(message, slot=at), at)
+                return
+        delay = self._bucket.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        self._bucket.take()
+        try:
+            await self._deliver(message)
+        except TelegramRetryAfter as exc:
+            self._chats.block(message.chat_id, time.time() + exc.retry_after)
+            # The retried message takes the first slot after the block
+            at = self._chats.reserve(message.chat_id, now)
+            metrics.inc("sender.retry_after", bot=self.name)
+            await self._defer(replace(message, slot=at), at)
+            return
+        except TelegramForbiddenError:
+            # Blocked by the user or removed from the group: nothing to retry
+            metrics.inc("sender.dropped", bot=self.name, reason="forbidden")
+            return
+        except TelegramBadRequest as exc:
+            metrics.inc("sender.dropped", bot=self.name, reason="bad_request")
+            log.warning("Message rejected", bot=self.name, chat_id=message.chat_id, error=str(exc))
+            return
+        except (TelegramNetworkError, TelegramServerError, TelegramAPIError) as exc:
+            await self._retry(message, str(exc))
+            return
+        metrics.inc("sender.sent", bot=self.name, lane=message.lane)
+        latency = time.time() - message.enqueued_at
+        metrics.observe("sender.latency_sec", latency, bot=self.name, lane=message.lane)
+
+    async def _retry(self, message: OutgoingMessage, error: str) -> None:
+        attempts = message.attempts + 1
+        if attempts >= self.max_attempts:
+            metrics.inc("sender.dropped", bot=self.name, reason="attempts")
+            log.warning(
+                "Message dead-lettered", bot=self.name, chat_id=message.chat_id, error=error
+            )
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.lpush(self.keys.dead, replace(message, attempts=attempts).encode())
+                pipe.ltrim(self.keys.dead, 0, DEAD_LETTERS_MAX - 1)
+                await pipe.execute()
+            return
+        metrics.inc("sender.retried", bot=self.name)
+        at = time.time() + min(2**attempts, 60)
+        await self._defer(replace(message, attempts=attempts, slot=0.0), at)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                if not await self._hold_ownership():
+                    await asyncio.sleep(self.owner_ttl_ms / 3000)
+                    continue
+                now = time.time()
+                if now >= self._next_promote:
+                    await self._promote_due(now)
+                    self._next_promote = now + 0.2
+                if now >= self._next_report:
+                    await self._report()
+                    self._next_report = now + 5.0
+                if now >= self._next_recover:
+                    await self._recover_processing(now)
+                    self._next_recover = now + self.owner_ttl_ms / 3000
+                popped = await self._pop()
+                if popped is None:
+                    continue
+                message, raw = popped
+                try:
+                    await self._handle(message)
+                finally:
+                    async with self.redis.pipeline(transaction=True) as pipe:
+                        pipe.lrem(self.keys.processing, 1, raw)
+                        pipe.zrem(self.keys.claims, raw)
+                        await pipe.execute()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # noqa: BLE001 - keep draining after Redis hiccups
+                log.warning("Sender loop failed", bot=self.name, error=str(exc))
+                await asyncio.sleep(1.0)
+
+
+def build_sender_worker(
+    bot: Bot, redis: Redis[bytes], name: str, settings: Settings
+) -> SenderWorker:
+    return SenderWorker(
+        bot,
+        redis,
+        name,
+        global_rate=float(settings.sender_global_rate or 30.0),
+        private_interval=float(settings.sender_private_interval_sec or 1.0),
+        group_per_minute=float(settings.sender_group_per_minute or 20.0),
+        max_attempts=int(settings.sender_max_attempts or 5),
+    )
@@ -2,9 +2,14 @@
 
 from datetime import datetime, timezone
 from decimal import Decimal
-from typing import NamedTuple, Optional
+from typing import TYPE_CHECKING, List, NamedTuple, Optional
 
-from app.rates.models import RatePayload
+from app.rates.history import Candle
+from app.rates.models import RatePayload, RateSource
+from app.rates.record import VALUE_DIGITS
+
+if TYPE_CHECKING:
+    from app.services.alerts.service import Alert
 
 
 class BidAsk(NamedTuple):
@@ -29,13 +34,13 @@ def _format_currency(value: Decimal) -> str:
     return f"{value:.2f}".replace(".", ",")
 
 
-def _source_name(payload: RatePayload) -> str:
+def _source_name(source: RateSource) -> str:
     mapping = {
         "rapira": "Rapira",
         "bybit": "Bybit",
         "grinex": "Grinex",
     }
-    return mapping.get(payload.source.value, payload.source.value.capitalize())
+    return mapping.get(source.value, source.value.capitalize())
 
 
 def format_rate(payload: RatePayload) -> str:
@@ -46,15 +51,18 @@ def format_rate(payload: RatePayload) -> str:
     sell_value = bid or payload.value
 
     updated_at = payload.updated_at.astimezone().strftime("%Y-%m-%d %H:%M:%S")
-    source = _source_name(payload)
+    source = _source_name(payload.source)
 
-    return (
+    text = (
         f"💱 {source}\n\n"
         "Курс USDT/RUB\n\n"
         f"Купить {_format_currency(buy_value)}\n\n"
         f"Продать {_format_currency(sell_value)}\n\n"
         f"🔄 Обновлено {updated_at}"
     )
+    if payload.stale:
+        text += "\n⚠️ Курс мог устареть, обновляем данные…"
+    return text
 
 
 def format_all_rates(
@@ -97,7 +105,7 @@ def format_all_rates(
         lines.append(f"Купить USDT — {bybit_p2p.ask:.2f}")
         lines.append(f"Продать USDT — {bybit_p2p.bid:.2f}")
     else:
-        lines.append("Данные пока отсутствуют (нужен запрос к P2P API).")
+        lines.append("Данные P2P сейчас недоступны.")
 
     return "\n".join(lines).strip()
 
@@ -115,3 +123,47 @@ def format_mosca_pair(pair: BidAsk) -> str:
         f"Продать USDT — {bid}₽\n\n"
         "Данные получены из ордербука Bybit."
     )
+
+
+def format_history(source: RateSource, label: str, candles: List[Candle]) -> str:
+    """История курса свечами: время, открытие → закрытие, минимум/максимум."""
+    lines = [f"📈 {_source_name(source)} — история USDT/RUB ({label})", ""]
+    if not candles:
+        lines.append("История пока пуста — данные появятся после следующих обновлений.")
+        return "\n".join(lines)
+    for candle in candles:
+        started = datetime.fromtimestamp(candle.start, tz=timezone.utc).astimezone()
+        open_, close, low, high = (
+            _format_currency(candle.price(part)) for part in ("open", "close", "low", "high")
+        )
+        lines.append(f"{started:%d.%m %H:%M}  {open_} → {close}  (мин {low} / макс {high})")
+    return "\n".join(lines)
+
+
+def _alert_price(micros: int) -> str:
+    return _format_currency(Decimal(micros).scaleb(-VALUE_DIGITS))
+
+
+def format_alert(alert: "Alert") -> str:
+    """Одна строка описания алерта: номер, источник и условие."""
+    source = _source_name(RateSource(alert.source))
+    if alert.kind == "move" and alert.reference is not None:
+        condition = f"изменится на {alert.percent}% от {_alert_price(alert.reference)}"
+    elif alert.upper is not None:
+        condition = f"выше {_alert_price(alert.upper)}"
+    else:
+        condition = f"ниже {_alert_price(alert.lower or 0)}"
+    return f"#{alert.id} {source}: USDT/RUB {condition}"
+
+
+def format_alerts(alerts: List["Alert"]) -> str:
+    if not alerts:
+        return "Алертов нет. Добавить: /alert rapira &gt; 95,5 или /alert bybit 2%"
+    lines = ["🔔 Ваши алерты", ""]
+    lines.extend(format_alert(alert) for alert in alerts)
+    lines.extend(["", "Удалить: /unalert номер"])
+    return "\n".join(lines)
+
+
+def format_alert_fired(alert: "Alert", value: Decimal) -> str:
+    return f"🔔 {format_alert(alert)}\n\nСейчас курс {_format_currency(value)}₽"
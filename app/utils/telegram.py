@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Optional
+from typing import Iterable, List, Optional
 
 from aiogram.types import (
     ForceReply,
@@ -12,6 +12,8 @@ from aiogram.types import (
 
 DEFAULT_PREVIEW_URL = "https://kbqvhfqs58zvukxe.public.blob.vercel-storage.com/IMG_20251121_190351_537.jpg"
 _INVISIBLE_CHAR = "\u200b"
+# Telegram rejects longer message texts
+MESSAGE_LIMIT = 4096
 
 ReplyMarkupType = (
     InlineKeyboardMarkup
@@ -74,3 +76,24 @@ async def edit_text_or_caption(
     else:
         await message.edit_text(final_text, reply_markup=reply_markup)
 
+
+def split_lines(lines: Iterable[str], limit: int = MESSAGE_LIMIT) -> List[str]:
+    """Join ``lines`` into as few texts as possible, each at most ``limit`` characters.
+
+    A single line longer than ``limit`` is cut.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for line in lines:
+        line = line[:limit]
+        extra = len(line) + (1 if current else 0)
+        if current and size + extra > limit:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+            extra = len(line)
+        current.append(line)
+        size += extra
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
@@ -0,0 +1,56 @@
+"""Encode/decode cost of one cached rate: pydantic RatePayload vs RateRecord.
+
+Run with ``python -m benchmarks.bench_rate_codec``.
+"""
+from __future__ import annotations
+
+import timeit
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Callable, Dict
+
+import orjson
+
+from app.rates.models import RateMethod, RatePayload, RateSource
+from app.rates.record import RateRecord
+
+NUMBER = 20000
+
+
+def _payload() -> RatePayload:
+    return RatePayload(
+        source=RateSource.BYBIT,
+        method=RateMethod.VWAP,
+        depth=5,
+        value=Decimal("81.234567"),
+        updated_at=datetime.now(timezone.utc),
+        extras={"endpoint": "https://api.bybit.com", "note": "public-no-key"},
+    )
+
+
+def main() -> None:
+    payload = _payload()
+    record = RateRecord.from_payload(payload)
+    payload_raw = orjson.dumps(payload.model_dump(mode="json"))
+    record_raw = record.encode()
+
+    cases: Dict[str, Callable[[], object]] = {
+        "payload encode (model_dump + orjson)": (
+            lambda: orjson.dumps(payload.model_dump(mode="json"))
+        ),
+        "payload decode (orjson + RatePayload(**))": (
+            lambda: RatePayload(**orjson.loads(payload_raw))
+        ),
+        "record encode": record.encode,
+        "record decode": lambda: RateRecord.decode(record_raw),
+        "record decode + to_payload": lambda: RateRecord.decode(record_raw).to_payload(),
+        "L1 hit (cached record -> to_payload)": record.to_payload,
+    }
+    print(f"payload bytes: {len(payload_raw)}, record bytes: {len(record_raw)}")
+    for name, call in cases.items():
+        seconds = min(timeit.repeat(call, number=NUMBER, repeat=5))
+        print(f"{name:45s} {seconds / NUMBER * 1e6:8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
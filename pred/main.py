@@ -2,17 +2,19 @@
 
 import asyncio
 
-import httpx
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.types import BotCommand, BotCommandScopeDefault
 from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.types import BotCommand, BotCommandScopeDefault
 
 from app.core.bot import create_bot, create_dispatcher, setup_dispatcher, shutdown_bot
 from app.core.config import Settings, get_settings
+from app.core.http import HttpClients
 from app.core.logging import setup_logging
 from app.core.redis import close_redis, create_redis
+from app.core.webhook import run_bot
+from app.services.sender.service import PRED_SENDER, Sender, build_sender_worker
 from pred.handlers import register_handlers
 from pred.services.phrases import PhraseService
 
@@ -23,11 +25,13 @@ async def build_dispatcher(settings: Settings) -> Dispatcher:
     dp = create_dispatcher(storage=storage)
     setup_dispatcher(dp)
 
-    http_client = httpx.AsyncClient(timeout=10.0)
+    http_clients = HttpClients(settings)
 
     dp["settings"] = settings
     dp["redis"] = redis
-    dp["http_client"] = http_client
+    dp["sender"] = Sender(redis, PRED_SENDER)
+    dp["http_clients"] = http_clients
+    dp["http_client"] = http_clients.get()
     dp["phrase_service"] = PhraseService()
 
     register_handlers(dp)
@@ -42,18 +46,21 @@ async def run() -> None:
 
 
     dp = await build_dispatcher(settings)
+    sender = build_sender_worker(bot, dp["redis"], PRED_SENDER, settings)
+    sender_task = asyncio.create_task(sender.run())
 
     try:
-        await dp.start_polling(bot)
+        await run_bot(dp, bot, dp["redis"], settings, "pred")
     finally:
+        sender_task.cancel()
         await shutdown(dp, bot)
 
 
 async def shutdown(dp: Dispatcher, bot: Bot) -> None:
-    http_client: httpx.AsyncClient = dp["http_client"]
+    http_clients: HttpClients = dp["http_clients"]
     redis = dp["redis"]
 
-    await http_client.aclose()
+    await http_clients.aclose()
     await dp.storage.close()
     wait_closed = getattr(dp.storage, "wait_closed", None)
     if callable(wait_closed):
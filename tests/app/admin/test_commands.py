@@ -0,0 +1,48 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.filters import CommandObject
+
+from app.admin.commands import METRICS_MAX_MESSAGES, admin_metrics
+from app.core.metrics import metrics
+from app.utils.telegram import MESSAGE_LIMIT
+
+
+@pytest.fixture(autouse=True)
+def _clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def _command(args=None):
+    return CommandObject(prefix="/", command="metrics", args=args)
+
+
+async def test_metrics_filtered_by_prefix():
+    metrics.inc("sender.sent", bot="app")
+    metrics.inc("http.connection.new", pool="rates")
+    metrics.set_gauge("sender.queue_depth", 3, bot="app", lane="high")
+    message = AsyncMock()
+    await admin_metrics(message, _command("sender"))
+    (text,), _ = message.answer.call_args
+    assert "sender.sent{bot=app}: 1" in text
+    assert "sender.queue_depth{bot=app,lane=high}: 3" in text
+    assert "http." not in text
+
+
+async def test_metrics_split_and_capped():
+    for i in range(5000):
+        metrics.inc("composition.recomputed", node=f"node-{i}")
+    message = AsyncMock()
+    await admin_metrics(message, _command())
+    texts = [call.args[0] for call in message.answer.call_args_list]
+    assert len(texts) == METRICS_MAX_MESSAGES + 1
+    assert all(len(text) <= MESSAGE_LIMIT for text in texts)
+    assert "/metrics" in texts[-1]
+
+
+async def test_metrics_empty():
+    message = AsyncMock()
+    await admin_metrics(message, _command("nothing"))
+    message.answer.assert_awaited_once_with("Метрик пока нет.")
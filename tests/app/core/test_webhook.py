@@ -0,0 +1,90 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram import Bot
+from aiohttp.test_utils import TestClient, TestServer
+from fakeredis import FakeAsyncRedis
+
+from app.core.config import Settings
+from app.core.metrics import metrics
+from app.core.webhook import SECRET_HEADER, WebhookHandler, create_webhook_app, webhook_secret
+
+UPDATE = {
+    "update_id": 1001,
+    "message": {
+        "message_id": 5,
+        "date": 1760000000,
+        "chat": {"id": 42, "type": "private"},
+        "text": "/start",
+    },
+}
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+@pytest.fixture
+async def webhook():
+    redis = FakeAsyncRedis()
+    bot = Bot("123456:TEST-token")
+    release = asyncio.Event()
+
+    async def feed_update(*_):
+        await release.wait()
+
+    dp = AsyncMock()
+    dp.feed_update.side_effect = feed_update
+    handler = WebhookHandler(dp, bot, redis, "app", secret="s3cret")
+    client = TestClient(TestServer(create_webhook_app(handler)))
+    await client.start_server()
+    yield client, handler, dp, release
+    await client.close()
+    await bot.session.close()
+    await redis.aclose()
+
+
+def _gauge():
+    return metrics.snapshot()["gauges"].get("webhook.in_flight{bot=app}")
+
+
+def test_handler_refuses_to_run_without_secret():
+    with pytest.raises(ValueError):
+        WebhookHandler(AsyncMock(), AsyncMock(), AsyncMock(), "app", secret="")
+
+
+def test_secret_falls_back_to_one_derived_from_bot_token():
+    bot = Bot("123456:TEST-token")
+    derived = webhook_secret(Settings(WEBHOOK_SECRET=None), bot, "app")
+    assert derived == webhook_secret(Settings(WEBHOOK_SECRET=None), bot, "app")
+    assert derived != webhook_secret(Settings(WEBHOOK_SECRET=None), bot, "pred")
+    assert "123456" not in derived
+    assert webhook_secret(Settings(WEBHOOK_SECRET="given"), bot, "app") == "given"
+
+
+async def test_requests_without_the_secret_are_rejected(webhook):
+    client, _, dp, _ = webhook
+    for headers in ({}, {SECRET_HEADER: "wrong"}):
+        response = await client.post("/webhook/app", json=UPDATE, headers=headers)
+        assert response.status == 401
+    dp.feed_update.assert_not_called()
+
+
+async def test_in_flight_gauge_follows_processing(webhook):
+    client, handler, dp, release = webhook
+    response = await client.post("/webhook/app", json=UPDATE, headers={SECRET_HEADER: "s3cret"})
+    assert response.status == 200
+    assert _gauge() == 1
+
+    # Telegram's retry of the same update is acknowledged, not handled again
+    response = await client.post("/webhook/app", json=UPDATE, headers={SECRET_HEADER: "s3cret"})
+    assert response.status == 200
+    release.set()
+    await handler.drain()
+    await asyncio.sleep(0)
+    assert dp.feed_update.await_count == 1
+    assert _gauge() == 0
@@ -0,0 +1,128 @@
+import asyncio
+import json
+from decimal import Decimal
+from pathlib import Path
+from typing import Any
+
+import httpx
+import pytest
+
+from app.rates.models import RateMethod
+from app.rates.providers.bybit_p2p import SIDE_BUY, SIDE_SELL, BybitP2PBook, P2PAd, side_stats
+
+FIXTURE = Path(__file__).parent.parent / "fixtures" / "bybit_p2p_pages.json"
+RECORDED = json.loads(FIXTURE.read_text())
+
+
+class RecordedP2P:
+    """Serves the recorded ad pages and tracks how many requests overlap."""
+
+    def __init__(self, latency: float = 0.01) -> None:
+        self.latency = latency
+        self.requests: list[dict[str, Any]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request):
+        body = json.loads(request.content)
+        self.requests.append(body)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        return httpx.Response(200, json=RECORDED["pages"][body["side"]][int(body["page"]) - 1])
+
+
+@pytest.fixture
+async def upstream():
+    recorded = RecordedP2P()
+    client = httpx.AsyncClient(transport=httpx.MockTransport(recorded))
+    yield recorded, client
+    await client.aclose()
+
+
+def _book(client, **kwargs):
+    options = {
+        "payments": ["75"],
+        "amount": Decimal("10000"),
+        "page_size": RECORDED["page_size"],
+        "max_pages": 3,
+        "concurrency": 2,
+        "percentile": 30.0,
+    }
+    options.update(kwargs)
+    return BybitP2PBook(client, "http://p2p.test/fiat/otc/item/online", **options)
+
+
+async def test_pages_are_capped_at_max_pages(upstream):
+    recorded, client = upstream
+    snapshot = await _book(client).snapshot()
+
+    # count=18 at 4 per page is 5 pages; only 3 per side are fetched
+    fetched = sorted((body["side"], int(body["page"])) for body in recorded.requests)
+    assert fetched == [(side, page) for side in (SIDE_SELL, SIDE_BUY) for page in (1, 2, 3)]
+    assert snapshot.pages == 6
+    first = recorded.requests[0]
+    assert first["payment"] == ["75"]
+    assert first["amount"] == "10000"
+    assert first["size"] == "4"
+
+
+async def test_fan_out_is_bounded_by_semaphore(upstream):
+    recorded, client = upstream
+    await _book(client, concurrency=2).snapshot()
+    assert len(recorded.requests) == 6
+    assert recorded.max_in_flight == 2
+
+
+async def test_snapshot_filters_ads_and_computes_both_sides(upstream):
+    _, client = upstream
+    snapshot = await _book(client).snapshot()
+
+    buy = snapshot.buy
+    assert buy is not None
+    # Rejected: wrong payment, min above / max below the amount, zero quantity
+    assert buy.ads == 7
+    assert buy.volume == Decimal("2170")
+    assert buy.best == Decimal("96.10")
+    assert buy.percentile == Decimal("96.30")
+    assert buy.median == Decimal("96.400000")
+    assert buy.vwap == Decimal("96.381336")
+    assert buy.trimmed_mean == Decimal("96.385714")
+
+    sell = snapshot.sell
+    assert sell is not None
+    assert sell.ads == 10
+    assert sell.volume == Decimal("2590")
+    assert sell.best == Decimal("96.00")
+    assert sell.percentile == Decimal("94.95")
+    assert sell.median == Decimal("94.825000")
+    assert sell.vwap == Decimal("92.958301")
+    # Ten ads: the 96.00 and 90.00 tails are trimmed
+    assert sell.trimmed_mean == Decimal("94.818750")
+
+    assert snapshot.bid_ask(RateMethod.MEDIAN) == (Decimal("94.825000"), Decimal("96.400000"))
+
+
+async def test_without_filters_every_quoted_ad_counts(upstream):
+    _, client = upstream
+    snapshot = await _book(client, payments=(), amount=None).snapshot()
+    assert snapshot.buy is not None and snapshot.sell is not None
+    # Only the zero-quantity ad is dropped
+    assert snapshot.buy.ads == 11
+    assert snapshot.sell.ads == 12
+
+
+def test_side_stats_ranks_each_side_best_first():
+    one, zero = Decimal("1"), Decimal("0")
+    ads = [P2PAd(Decimal(price), one, zero, zero, frozenset()) for price in "12345"]
+    buy = side_stats(SIDE_BUY, ads, percentile=40.0, trim=Decimal("0.2"))
+    sell = side_stats(SIDE_SELL, ads, percentile=40.0, trim=Decimal("0.2"))
+    assert buy is not None and sell is not None
+    assert (buy.best, buy.percentile) == (Decimal("1"), Decimal("2"))
+    assert (sell.best, sell.percentile) == (Decimal("5"), Decimal("4"))
+    assert buy.median == sell.median == Decimal("3.000000")
+    assert buy.trimmed_mean == sell.trimmed_mean == Decimal("3.000000")
+    assert side_stats(SIDE_BUY, [], percentile=10.0) is None
@@ -0,0 +1,134 @@
+import asyncio
+import json
+from decimal import Decimal
+from pathlib import Path
+from typing import Any
+
+import httpx
+import pytest
+from aiohttp import WSMsgType, web
+from aiohttp.test_utils import TestServer
+
+from app.rates.models import BybitMode, GeoOption, RateMethod, RateQuery, RateSource
+from app.rates.providers.bybit_stream import BookGapError, BybitStreamProvider, LocalOrderBook
+
+FIXTURE = Path(__file__).parent.parent / "fixtures" / "bybit_orderbook_frames.json"
+FRAMES = json.loads(FIXTURE.read_text())
+TOPIC = FRAMES["topic"]
+SNAPSHOT, DELTA, GAP = (frame["data"] for frame in FRAMES["subscriptions"][0][1:])
+RESNAPSHOT, REDELTA, RESTART = (frame["data"] for frame in FRAMES["subscriptions"][1][2:])
+
+
+def _levels(side):
+    return {str(price): str(qty) for price, qty in side.items()}
+
+
+def test_snapshot_then_delta_updates_and_removes_levels():
+    book = LocalOrderBook("USDTRUB")
+    book.apply_snapshot(SNAPSHOT)
+    assert book.update_id == 48211
+    book.apply_delta(DELTA)
+    # 95.12 bid and 95.25 ask came with quantity 0
+    assert _levels(book.bids) == {"95.11": "250", "95.10": "820", "95.05": "3000"}
+    assert _levels(book.asks) == {"95.20": "700", "95.40": "5000"}
+    assert book.view(RateSource.BYBIT).best_bid_ask() == (Decimal("95.11"), Decimal("95.20"))
+
+
+def test_delta_out_of_sequence_is_a_gap():
+    book = LocalOrderBook("USDTRUB")
+    book.apply_snapshot(SNAPSHOT)
+    book.apply_delta(DELTA)
+    with pytest.raises(BookGapError):
+        book.apply_delta(GAP)
+
+
+def test_restart_delta_replaces_book():
+    book = LocalOrderBook("USDTRUB")
+    book.apply_snapshot(RESNAPSHOT)
+    book.apply_delta(RESTART)
+    assert book.update_id == 1
+    assert _levels(book.bids) == {"94.90": "2000", "94.80": "1000"}
+    assert _levels(book.asks) == {"95.30": "1500", "95.35": "900"}
+
+
+class StandInStream:
+    """Bybit public WS stand-in: each subscribe replays the next recorded batch."""
+
+    def __init__(self) -> None:
+        self.ops: list[tuple[str, Any]] = []
+        self.batches_sent = 0
+        self.app = web.Application()
+        self.app.router.add_get("/v5/public/spot", self.handle)
+
+    async def handle(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                continue
+            op = json.loads(message.data)
+            self.ops.append((op["op"], op.get("args")))
+            if op["op"] == "subscribe" and self.batches_sent < len(FRAMES["subscriptions"]):
+                for frame in FRAMES["subscriptions"][self.batches_sent]:
+                    await ws.send_str(json.dumps(frame))
+                self.batches_sent += 1
+        return ws
+
+
+async def _wait_for(condition, timeout=3.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not reached")
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+async def stream():
+    stand_in = StandInStream()
+    server = TestServer(stand_in.app)
+    await server.start_server()
+    client = httpx.AsyncClient()
+    provider = BybitStreamProvider(
+        client,
+        "http://bybit.invalid",
+        ws_endpoint=str(server.make_url("/v5/public/spot")),
+        max_age=5.0,
+        ping_interval=60.0,
+    )
+    task = asyncio.create_task(provider.run())
+    yield stand_in, provider
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await client.aclose()
+    await server.close()
+
+
+async def test_stream_resubscribes_after_gap_and_follows_restart(stream):
+    stand_in, provider = stream
+    await _wait_for(lambda: provider.book.update_id == 1)
+
+    assert stand_in.ops == [
+        ("subscribe", [TOPIC]),
+        ("unsubscribe", [TOPIC]),
+        ("subscribe", [TOPIC]),
+    ]
+    assert _levels(provider.book.bids) == {"94.90": "2000", "94.80": "1000"}
+    assert _levels(provider.book.asks) == {"95.30": "1500", "95.35": "900"}
+
+
+async def test_live_rate_expires_with_replica_age(stream):
+    _, provider = stream
+    await _wait_for(lambda: provider.book.update_id == 1)
+    query = RateQuery(
+        source=RateSource.BYBIT,
+        method=RateMethod.BEST,
+        geo=GeoOption.NONE,
+        mode=BybitMode.ORDERBOOK,
+    )
+    payload = provider.live_rate(query)
+    assert payload is not None
+    assert payload.extras["note"] == "stream"
+
+    provider.book.updated_at -= provider.max_age + 1
+    assert provider.live_rate(query) is None
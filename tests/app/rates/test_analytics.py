@@ -0,0 +1,120 @@
+import random
+from decimal import Decimal
+
+import pytest
+
+from app.rates.analytics import BookAnalytics, BookSide
+from app.rates.models import RateMethod, RateSource
+from app.rates.orderbook import OrderBookSnapshot, compute_mid, compute_vwap
+
+TOLERANCE = Decimal("1e-18")
+
+
+def _random_side(rng, start, step):
+    levels = []
+    price = Decimal(start)
+    for _ in range(rng.randint(1, 60)):
+        price += step * Decimal(rng.randint(1, 25)) / 100
+        qty = Decimal(rng.randint(1, 5_000_000)) / 10**rng.randint(0, 4)
+        levels.append((price, qty))
+    return levels
+
+
+def _books(count=200):
+    rng = random.Random(20240611)
+    for _ in range(count):
+        bids = _random_side(rng, "95.00", Decimal("-1"))
+        asks = _random_side(rng, "95.10", Decimal("1"))
+        yield bids, asks, rng.randint(1, 70)
+
+
+def _ref_median(levels, depth):
+    taken = levels[: max(depth, 1)]
+    total = sum(qty for _, qty in taken)
+    running = Decimal("0")
+    for price, qty in taken:
+        running += qty
+        if 2 * running >= total:
+            return price
+    raise AssertionError("unreachable")
+
+
+def _ref_trimmed_mean(levels, depth, trim):
+    taken = levels[: max(depth, 1)]
+    total = sum(qty for _, qty in taken)
+    lo, hi = total * trim, total - total * trim
+    notional = Decimal("0")
+    start = Decimal("0")
+    for price, qty in taken:
+        end = start + qty
+        overlap = min(end, hi) - max(start, lo)
+        if overlap > 0:
+            notional += price * overlap
+        start = end
+    return notional / (hi - lo)
+
+
+def _close(left, right):
+    return abs(left - right) <= TOLERANCE
+
+
+def test_mid_and_vwap_match_decimal_reference():
+    for bids, asks, depth in _books():
+        book = BookAnalytics.from_levels(bids, asks)
+        assert book is not None
+        assert book.mid() == compute_mid(bids, asks)
+        expected = (compute_vwap(bids, depth) + compute_vwap(asks, depth)) / 2
+        assert _close(book.vwap(depth), expected)
+
+
+def test_median_and_trimmed_mean_match_decimal_reference():
+    for bids, asks, depth in _books():
+        book = BookAnalytics.from_levels(bids, asks)
+        assert book is not None
+        assert book.bids.weighted_median(depth) == _ref_median(bids, depth)
+        assert book.asks.weighted_median(depth) == _ref_median(asks, depth)
+        for trim in (Decimal("0"), Decimal("0.1"), Decimal("0.25")):
+            assert _close(book.bids.trimmed_mean(depth, trim), _ref_trimmed_mean(bids, depth, trim))
+            assert _close(book.asks.trimmed_mean(depth, trim), _ref_trimmed_mean(asks, depth, trim))
+
+
+def test_vwap_curve_matches_vwap_at_every_depth():
+    for bids, asks, _ in _books(50):
+        book = BookAnalytics.from_levels(bids, asks)
+        assert book is not None
+        curve = book.bids.vwap_curve()
+        assert len(curve) == len(bids)
+        for depth, value in enumerate(curve, start=1):
+            assert _close(value, compute_vwap(bids, depth))
+        two_sided = book.vwap_curve()
+        assert len(two_sided) == min(len(bids), len(asks))
+        for depth, value in enumerate(two_sided, start=1):
+            assert _close(value, book.vwap(depth))
+
+
+def test_trim_outside_range_is_rejected():
+    side = BookSide.from_levels([(Decimal("95"), Decimal("1"))])
+    assert side is not None
+    with pytest.raises(ValueError):
+        side.trimmed_mean(1, Decimal("0.5"))
+
+
+@pytest.mark.parametrize(
+    "price",
+    [Decimal("95.123456789"), Decimal(2**63)],
+    ids=["past-eighth-decimal", "past-int64"],
+)
+def test_books_off_the_grid_fall_back_to_decimal(price):
+    bids = [(price, Decimal("2")), (Decimal("94.5"), Decimal("3"))]
+    asks = [(Decimal("95.5"), Decimal("1")), (Decimal("96"), Decimal("4"))]
+    assert BookSide.from_levels(bids) is None
+    assert BookAnalytics.from_levels(bids, asks) is None
+
+    snapshot = OrderBookSnapshot.from_levels(RateSource.BYBIT, "USDTRUB", bids, asks)
+    assert snapshot.analytics is None
+    assert snapshot.price(RateMethod.MID, 2) == compute_mid(bids, asks)
+    expected_vwap = (compute_vwap(bids, 2) + compute_vwap(asks, 2)) / 2
+    assert snapshot.price(RateMethod.VWAP, 2) == expected_vwap
+    for method in (RateMethod.MEDIAN, RateMethod.TRIMMED_MEAN):
+        with pytest.raises(ValueError):
+            snapshot.price(method, 2)
@@ -0,0 +1,42 @@
+import pytest
+from fakeredis import FakeAsyncRedis
+
+from app.rates.breaker import CircuitBreaker, CircuitOpenError, CircuitState
+
+
+async def _fail():
+    raise RuntimeError("upstream down")
+
+
+@pytest.fixture
+async def redis():
+    client = FakeAsyncRedis()
+    yield client
+    await client.aclose()
+
+
+async def test_failures_open_circuit_within_window(redis):
+    breaker = CircuitBreaker(redis, failure_threshold=3, window_sec=30)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await breaker.call("bybit", _fail)
+    assert await breaker.state("bybit") == CircuitState.CLOSED
+    ttl = await redis.pttl("breaker:bybit:failures")
+    assert 0 < ttl <= 30_000
+
+    with pytest.raises(RuntimeError):
+        await breaker.call("bybit", _fail)
+    assert await breaker.state("bybit") == CircuitState.OPEN
+    with pytest.raises(CircuitOpenError):
+        await breaker.call("bybit", _fail)
+
+
+async def test_window_is_not_extended_by_later_failures(redis):
+    breaker = CircuitBreaker(redis, failure_threshold=5, window_sec=30)
+    with pytest.raises(RuntimeError):
+        await breaker.call("bybit", _fail)
+    await redis.pexpire("breaker:bybit:failures", 1000)
+    with pytest.raises(RuntimeError):
+        await breaker.call("bybit", _fail)
+    assert await redis.get("breaker:bybit:failures") == b"2"
+    assert await redis.pttl("breaker:bybit:failures") <= 1000
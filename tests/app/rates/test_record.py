@@ -0,0 +1,26 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from app.rates.models import RateMethod, RatePayload, RateSource
+from app.rates.record import RateRecord
+
+
+def test_payload_extras_are_not_shared_with_the_record():
+    extras = {"fx": {"usd": "92.1"}, "ask": {"levels": [["95.2", "700"]]}}
+    payload = RatePayload(
+        source=RateSource.BYBIT,
+        method=RateMethod.MID,
+        value=Decimal("95.15"),
+        updated_at=datetime.now(timezone.utc),
+        extras=extras,
+    )
+    record = RateRecord.from_payload(payload)
+    extras["fx"]["usd"] = "0"
+
+    served = record.to_payload()
+    served.extras["fx"]["usd"] = "1"
+    served.extras["ask"]["levels"].append(["96", "1"])
+
+    again = record.to_payload()
+    assert again.extras == {"fx": {"usd": "92.1"}, "ask": {"levels": [["95.2", "700"]]}}
+    assert record.extras == again.extras
@@ -0,0 +1,123 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import orjson
+import pytest
+from fakeredis import FakeAsyncRedis
+
+from app.core.config import Settings
+from app.rates.history import series_name
+from app.rates.models import (
+    BybitMode,
+    CachedRate,
+    GeoOption,
+    RateMethod,
+    RatePayload,
+    RateQuery,
+    RateSource,
+)
+from app.rates.service import RATE_UPDATES_CHANNEL, RateService
+
+QUERY = RateQuery(
+    source=RateSource.RAPIRA,
+    method=RateMethod.MID,
+    geo=GeoOption.NONE,
+    mode=BybitMode.ORDERBOOK,
+)
+
+
+class DigestProvider:
+    """Serves ``(value, digest)`` pairs in order, one per fetch."""
+
+    def __init__(self, *documents) -> None:
+        self.documents = list(documents)
+        self.fetches = 0
+
+    async def fetch(self, query):
+        value, digest = self.documents[self.fetches]
+        self.fetches += 1
+        payload = RatePayload(
+            source=query.source,
+            method=query.method,
+            geo=query.geo,
+            mode=query.mode,
+            value=Decimal(value),
+            updated_at=datetime.now(timezone.utc),
+        )
+        return CachedRate(payload=payload, source_digest=digest)
+
+
+@pytest.fixture
+async def redis():
+    client = FakeAsyncRedis()
+    yield client
+    await client.aclose()
+
+
+def _service(redis, provider):
+    return RateService(redis, {RateSource.RAPIRA: provider}, Settings())
+
+
+async def _history(service):
+    points = await service.history.points(series_name(service.cache_key(QUERY)), 0, 2**31)
+    return [point.value for point in points]
+
+
+async def test_unchanged_digest_is_judged_against_the_stored_one(redis):
+    first = _service(redis, DigestProvider(*[("95", "x")] * 3))
+    second = _service(redis, DigestProvider(("96", "y")))
+
+    await first.get_rate(QUERY, force=True)
+    await second.get_rate(QUERY, force=True)
+    # "x" is what this process stored last, but "y" is what Redis holds now
+    assert (await first.get_rate(QUERY, force=True)).value == Decimal("95")
+    assert await _history(first) == [Decimal("95"), Decimal("96"), Decimal("95")]
+
+    await first.get_rate(QUERY, force=True)
+    assert await _history(first) == [Decimal("95"), Decimal("96"), Decimal("95")]
+    assert await redis.get(first._digest_key(first.cache_key(QUERY))) == b"x"
+
+
+async def test_unchanged_write_touches_other_processes_l1(redis):
+    writer = _service(redis, DigestProvider(("95", "x"), ("95", "x")))
+    reader = _service(redis, DigestProvider())
+    key = writer.cache_key(QUERY)
+
+    await writer.get_rate(QUERY, force=True)
+    await reader.get_rate(QUERY)
+    held = reader._l1.get(key)
+    assert held is not None
+
+    pubsub = redis.pubsub()
+    await pubsub.subscribe(RATE_UPDATES_CHANNEL)
+    await pubsub.get_message(timeout=1.0)
+    await writer.get_rate(QUERY, force=True)
+    message = await pubsub.get_message(timeout=1.0)
+    await pubsub.aclose()
+
+    touch = orjson.loads(message["data"])
+    stored = writer._l1.get(key)
+    assert stored is not None
+    assert touch[2] == stored.updated_at_us
+    reader._apply_update(message["data"])
+    touched = reader._l1.get(key)
+    assert touched is not None
+    assert touched.updated_at_us == stored.updated_at_us > held.updated_at_us
+    assert touched.value == Decimal("95")
+
+
+async def test_lease_winner_rechecks_redis_before_fetching(redis):
+    first = _service(redis, DigestProvider(("95", "x")))
+    late = DigestProvider(("96", "y"))
+    second = _service(redis, late)
+    await first.get_rate(QUERY)
+
+    # ``second`` missed before ``first`` stored, then won the (free) lease
+    key = second.cache_key(QUERY)
+    payload = await second._refresh(key, QUERY, late, ttl=30, grace=0, force=False)
+    assert payload.value == Decimal("95")
+    assert late.fetches == 0
+
+    payload = await second._refresh(key, QUERY, late, ttl=30, grace=0, force=True)
+    assert payload.value == Decimal("96")
+    assert late.fetches == 1
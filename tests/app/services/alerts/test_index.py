@@ -0,0 +1,52 @@
+from app.services.alerts.index import ABOVE, BELOW, ThresholdIndex
+
+SERIES = "bybit:mid:none:orderbook:0"
+
+
+def _index(*entries):
+    index = ThresholdIndex()
+    for side, threshold, alert_id in entries:
+        index.add(SERIES, side, threshold, alert_id)
+    return index
+
+
+def test_above_fires_once_value_reaches_threshold():
+    index = _index((ABOVE, 96_000_000, 1), (ABOVE, 97_000_000, 2))
+    assert index.pop_crossed(SERIES, 95_999_999) == []
+    # Equality counts as reaching the threshold
+    assert index.pop_crossed(SERIES, 96_000_000) == [(96_000_000, 1)]
+    assert index.pop_crossed(SERIES, 96_000_000) == []
+    assert len(index) == 1
+
+
+def test_below_fires_once_value_drops_to_threshold():
+    index = _index((BELOW, 90_000_000, 1), (BELOW, 89_000_000, 2))
+    assert index.pop_crossed(SERIES, 90_000_001) == []
+    assert index.pop_crossed(SERIES, 89_000_000) == [(89_000_000, 2), (90_000_000, 1)]
+    assert SERIES not in index
+
+
+def test_move_alert_crosses_on_either_side():
+    index = _index((ABOVE, 102_000_000, 7), (BELOW, 98_000_000, 7))
+    assert index.pop_crossed(SERIES, 100_000_000) == []
+    assert index.pop_crossed(SERIES, 97_500_000) == [(98_000_000, 7)]
+    # The matcher removes the other side when the alert fires
+    assert index.remove(SERIES, ABOVE, 102_000_000, 7)
+    assert len(index) == 0
+
+
+def test_ties_on_threshold_fire_together():
+    index = _index((ABOVE, 96_000_000, 3), (ABOVE, 96_000_000, 1), (ABOVE, 96_000_001, 2))
+    assert index.pop_crossed(SERIES, 96_000_000) == [(96_000_000, 1), (96_000_000, 3)]
+
+
+def test_add_is_idempotent_and_remove_checks_the_entry():
+    index = _index((ABOVE, 96_000_000, 1))
+    index.add(SERIES, ABOVE, 96_000_000, 1)
+    index.load(SERIES, ABOVE, [(95_000_000, 4)])
+    assert len(index) == 2
+    assert not index.remove(SERIES, ABOVE, 96_000_000, 2)
+    assert not index.remove(SERIES, BELOW, 96_000_000, 1)
+    assert index.remove(SERIES, ABOVE, 96_000_000, 1)
+    assert index.pop_crossed(SERIES, 99_000_000) == [(95_000_000, 4)]
+    assert SERIES not in index
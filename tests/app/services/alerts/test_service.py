@@ -0,0 +1,132 @@
+import asyncio
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import AsyncMock
+
+import pytest
+from fakeredis import FakeAsyncRedis
+
+from app.core.config import Settings
+from app.rates.history import series_name
+from app.rates.models import BybitMode, GeoOption, RateMethod, RatePayload, RateQuery, RateSource
+from app.rates.service import RateService
+from app.services.alerts.service import (
+    KIND_ABOVE,
+    KIND_BELOW,
+    AlertLimitError,
+    AlertMatcher,
+    AlertService,
+    to_micros,
+)
+from app.services.sender.service import LANE_HIGH
+
+QUERY = RateQuery(
+    source=RateSource.BYBIT,
+    method=RateMethod.MID,
+    geo=GeoOption.NONE,
+    mode=BybitMode.ORDERBOOK,
+)
+
+
+class LiveProvider:
+    """A stream-fed provider: answers from memory, never fetches."""
+
+    def __init__(self) -> None:
+        self.value = Decimal("95")
+
+    def live_rate(self, query):
+        return RatePayload(
+            source=query.source,
+            method=query.method,
+            geo=query.geo,
+            mode=query.mode,
+            depth=query.depth,
+            value=self.value,
+            updated_at=datetime.now(timezone.utc),
+            extras={"note": "stream"},
+        )
+
+    async def fetch(self, query):
+        raise AssertionError("stream-fed rates are not fetched")
+
+
+@pytest.fixture
+async def redis():
+    client = FakeAsyncRedis()
+    yield client
+    await client.aclose()
+
+
+async def _wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not reached")
+        await asyncio.sleep(0.01)
+
+
+async def test_create_list_limit_and_remove(redis):
+    service = AlertService(redis, max_per_chat=2)
+    first = await service.create(1, "bybit", "s", KIND_ABOVE, upper=to_micros(Decimal("96")))
+    second = await service.create(1, "bybit", "s", KIND_BELOW, lower=to_micros(Decimal("90")))
+    with pytest.raises(AlertLimitError):
+        await service.create(1, "bybit", "s", KIND_ABOVE, upper=to_micros(Decimal("97")))
+    assert [alert.id for alert in await service.list(1)] == [first.id, second.id]
+
+    # Only the owning chat may remove an alert, and only once
+    assert not await service.remove(2, first.id)
+    assert await service.remove(1, first.id)
+    assert not await service.remove(1, first.id)
+    assert [alert.id for alert in await service.list(1)] == [second.id]
+    assert await redis.zcard("alerts:idx:above:s") == 0
+    await service.create(1, "bybit", "s", KIND_ABOVE, upper=to_micros(Decimal("97")))
+
+
+async def test_stream_served_rates_reach_the_matcher(redis):
+    provider = LiveProvider()
+    rates = RateService(redis, {RateSource.BYBIT: provider}, Settings())
+    series = series_name(rates.cache_key(QUERY))
+    alerts = AlertService(redis)
+    alert = await alerts.create(42, "bybit", series, KIND_ABOVE, upper=to_micros(Decimal("96")))
+
+    sender = AsyncMock()
+    matcher = AlertMatcher(alerts, sender)
+    task = asyncio.create_task(matcher.run())
+    try:
+        await _wait_for(lambda: series in matcher.index)
+
+        assert (await rates.get_rate(QUERY)).value == Decimal("95")
+        provider.value = Decimal("96.5")
+        assert (await rates.get_many({"card": QUERY}))["card"].value == Decimal("96.5")
+        await _wait_for(lambda: sender.send.await_count == 1)
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    chat_id, text = sender.send.await_args.args
+    assert chat_id == 42
+    assert "96,50" in text
+    assert sender.send.await_args.kwargs == {"lane": LANE_HIGH}
+    assert await alerts.get_many([alert.id]) == []
+
+    # Both values were stored; an unchanged value adds no history point
+    await rates.get_rate(QUERY)
+    points = await rates.history.points(series, 0, 2**31)
+    assert [point.value for point in points] == [Decimal("95"), Decimal("96.5")]
+    assert await redis.get(rates.cache_key(QUERY)) is not None
+
+
+async def test_concurrent_creates_respect_the_limit(redis):
+    service = AlertService(redis, max_per_chat=3)
+    results = await asyncio.gather(
+        *(
+            service.create(1, "bybit", "s", KIND_BELOW, lower=to_micros(Decimal(90 - n)))
+            for n in range(8)
+        ),
+        return_exceptions=True,
+    )
+    created = [result for result in results if not isinstance(result, BaseException)]
+    assert len(created) == 3
+    assert all(isinstance(result, AlertLimitError) for result in results if result not in created)
+    assert await redis.scard("alerts:chat:1") == 3
+    assert len(await service.list(1)) == 3
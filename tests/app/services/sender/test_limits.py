@@ -0,0 +1,61 @@
+import pytest
+
+from app.services.sender.limits import ChatLimiter, TokenBucket
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_paces_at_rate():
+    clock = Clock()
+    bucket = TokenBucket(rate=4.0, clock=clock)
+    assert bucket.delay() == 0.0
+    bucket.take()
+    assert bucket.delay() == 0.25
+    clock.now += 0.125
+    assert bucket.delay() == 0.125
+    clock.now += 0.125
+    assert bucket.delay() == 0.0
+
+
+def test_token_bucket_burst_is_capped_by_capacity():
+    clock = Clock()
+    bucket = TokenBucket(rate=10.0, capacity=3, clock=clock)
+    clock.now += 60
+    for _ in range(3):
+        assert bucket.delay() == 0.0
+        bucket.take()
+    assert bucket.delay() == pytest.approx(0.1)
+
+
+def test_chat_limiter_books_consecutive_slots():
+    limiter = ChatLimiter(private_interval=1.0, group_interval=3.0)
+    assert [limiter.reserve(7, 10.0) for _ in range(3)] == [10.0, 11.0, 12.0]
+    # Groups (negative ids) get the longer interval; chats do not share slots
+    assert [limiter.reserve(-5, 10.0) for _ in range(2)] == [10.0, 13.0]
+    assert limiter.reserve(8, 10.0) == 10.0
+    # A free slot in the past is not handed out
+    assert limiter.reserve(7, 20.0) == 20.0
+
+
+def test_chat_limiter_block_holds_the_chat():
+    limiter = ChatLimiter(private_interval=1.0)
+    limiter.block(7, 40.0)
+    assert limiter.reserve(7, 10.0) == 40.0
+    # Blocking never moves a booked slot earlier
+    limiter.block(7, 20.0)
+    assert limiter.reserve(7, 10.0) == 41.0
+
+
+def test_chat_limiter_prunes_idle_chats():
+    limiter = ChatLimiter(private_interval=1.0, max_chats=2)
+    limiter.reserve(1, 10.0)
+    limiter.reserve(2, 10.0)
+    limiter.reserve(3, 20.0)
+    assert limiter.reserve(1, 20.0) == 20.0
+    assert len(limiter._next) <= 3
@@ -0,0 +1,140 @@
+import asyncio
+import time
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from fakeredis import FakeAsyncRedis
+
+from app.services.sender.service import (
+    LANE_BULK,
+    LANE_HIGH,
+    LANE_NORMAL,
+    OutgoingMessage,
+    Sender,
+    SenderWorker,
+)
+
+
+class FakeBot:
+    def __init__(self, flood_wait: int = 0) -> None:
+        self.flood_wait = flood_wait
+        self.sent: list[tuple[int, str]] = []
+
+    async def send_message(self, chat_id, text, link_preview_options=None):
+        if self.flood_wait:
+            raise TelegramRetryAfter(
+                method=None, message="Flood control exceeded", retry_after=self.flood_wait
+            )
+        self.sent.append((chat_id, text))
+
+
+@pytest.fixture
+async def redis():
+    client = FakeAsyncRedis()
+    yield client
+    await client.aclose()
+
+
+async def _texts(redis, key):
+    return [OutgoingMessage.decode(raw).text for raw in await redis.lrange(key, 0, -1)]
+
+
+async def test_pop_moves_highest_lane_onto_processing_list(redis):
+    sender = Sender(redis, "app")
+    await sender.send_many([1], "broadcast")
+    await sender.send(2, "alert", lane=LANE_HIGH)
+    worker = SenderWorker(FakeBot(), redis, "app", poll_timeout=0.05)
+
+    message, raw = await worker._pop()
+    assert message.text == "alert"
+    assert await redis.lrange(worker.keys.processing, 0, -1) == [raw]
+    message, _ = await worker._pop()
+    assert message.text == "broadcast"
+    assert await redis.llen(worker.keys.processing) == 2
+    assert await worker._pop() is None
+
+
+async def test_new_owner_requeues_unfinished_messages_in_order(redis):
+    sender = Sender(redis, "app")
+    for text in ("first", "second"):
+        await sender.send(1, text)
+    await sender.send_many([3], "bulk", lane=LANE_BULK)
+    crashed = SenderWorker(FakeBot(), redis, "app", poll_timeout=0.05)
+    assert await crashed._hold_ownership()
+    await crashed._pop()
+    await crashed._pop()
+    # The owner died mid-send: its lease expires, the processing list stays
+    await redis.delete(crashed.keys.owner)
+
+    successor = SenderWorker(FakeBot(), redis, "app", poll_timeout=0.05)
+    assert await successor._hold_ownership()
+    await successor._recover_processing(time.time() + successor.owner_ttl_ms / 1000)
+    assert await redis.llen(successor.keys.processing) == 0
+    assert await redis.zcard(successor.keys.claims) == 0
+    assert [(await successor._pop())[0].text for _ in range(3)] == ["first", "second", "bulk"]
+
+
+async def test_recent_claims_are_left_to_their_owner(redis):
+    sender = Sender(redis, "app")
+    await sender.send(1, "in flight")
+    paused = SenderWorker(FakeBot(), redis, "app", poll_timeout=0.05)
+    _, raw = await paused._pop()
+    # An entry that lost its claim time is stamped, not requeued
+    await redis.lpush(paused.keys.processing, b'{"chat_id": 2, "text": "unclaimed"}')
+
+    successor = SenderWorker(FakeBot(), redis, "app", poll_timeout=0.05)
+    await successor._recover_processing(time.time())
+    assert await redis.llen(successor.keys.processing) == 2
+    assert await redis.zcard(successor.keys.claims) == 2
+    assert await successor._pop() is None
+
+    # The paused owner finishes after all; nothing is left to requeue
+    await redis.lrem(paused.keys.processing, 1, raw)
+    await redis.zrem(paused.keys.claims, raw)
+    await successor._recover_processing(time.time() + successor.owner_ttl_ms / 1000)
+    assert await _texts(redis, successor.keys.lanes[LANE_NORMAL]) == ["unclaimed"]
+
+
+async def test_run_clears_processing_after_delivery(redis):
+    bot = FakeBot()
+    await Sender(redis, "app").send(1, "hi", lane=LANE_HIGH)
+    worker = SenderWorker(bot, redis, "app", poll_timeout=0.05)
+    pop = worker._pop
+
+    async def pop_until_sent():
+        # Stop the loop once the message is out instead of idling on BLMOVE
+        if bot.sent:
+            raise asyncio.CancelledError
+        return await pop()
+
+    worker._pop = pop_until_sent
+    with pytest.raises(asyncio.CancelledError):
+        await worker.run()
+    assert bot.sent == [(1, "hi")]
+    assert await redis.llen(worker.keys.processing) == 0
+
+
+async def test_retry_after_defers_message_and_blocks_chat(redis):
+    sender = Sender(redis, "app")
+    await sender.send(7, "flooded")
+    await sender.send(7, "next")
+    worker = SenderWorker(FakeBot(flood_wait=30), redis, "app", poll_timeout=0.05)
+
+    before = time.time()
+    flooded, _ = await worker._pop()
+    await worker._handle(flooded)
+    (raw, at), = await redis.zrange(worker.keys.delayed, 0, -1, withscores=True)
+    assert OutgoingMessage.decode(raw).text == "flooded"
+    assert before + 30 <= at <= time.time() + 30
+    assert OutgoingMessage.decode(raw).slot == at
+
+    # The chat stays quiet: the next message is booked after the block
+    worker.bot.flood_wait = 0
+    following, _ = await worker._pop()
+    await worker._handle(following)
+    scores = dict(await redis.zrange(worker.keys.delayed, 0, -1, withscores=True))
+    assert len(scores) == 2
+    assert min(scores.values()) == at
+    assert max(scores.values()) >= at + worker._chats.private_interval
+    assert worker.bot.sent == []
+    assert await _texts(redis, worker.keys.lane("normal")) == []
@@ -0,0 +1,17 @@
+from app.utils.telegram import MESSAGE_LIMIT, split_lines
+
+
+def test_split_lines_keeps_short_text_whole():
+    assert split_lines(["a", "b", "c"]) == ["a\nb\nc"]
+
+
+def test_split_lines_respects_limit():
+    lines = [f"metric.{i}: {i}" for i in range(2000)]
+    chunks = split_lines(lines)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= MESSAGE_LIMIT for chunk in chunks)
+    assert "\n".join(chunks).split("\n") == lines
+
+
+def test_split_lines_cuts_overlong_line():
+    assert split_lines(["x" * 10, "y"], limit=4) == ["xxxx", "y"]
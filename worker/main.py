@@ -2,27 +2,47 @@
 
 import asyncio
 
-import httpx
+import asyncpg
 
-from app.core.config import get_settings
-from app.core.logging import setup_logging
+from app.core.config import Settings, get_settings
+from app.core.db import asyncpg_dsn
+from app.core.http import HttpClients
+from app.core.logging import get_logger, setup_logging
+from app.core.metrics import metrics
 from app.core.redis import close_redis, create_redis
-from app.rates.models import RateMethod, RateQuery, RateSource
-from app.rates.providers.bybit import BybitProvider
-from app.rates.providers.grinex import GrinexProvider
-from app.rates.providers.rapira import RapiraProvider
+from app.rates.archive import RateArchive
+from app.rates.dashboard import ViewPublisher, render_views, view_queries
+from app.rates.factory import build_rate_providers, start_rate_streams
 from app.rates.service import RateService
+from app.services.alerts.service import AlertMatcher, AlertService
+from app.services.sender.service import APP_SENDER, Sender
+from worker.tasks.archive import ArchiveIngestor, maintain_archive
+from worker.tasks.history import roll_up_history
+from worker.tasks.refresh import RefreshScheduler
 
+log = get_logger(__name__)
 
-async def warm_rates(rate_service: RateService) -> None:
-    queries = {
-        "bybit": RateQuery(source=RateSource.BYBIT, method=RateMethod.VWAP),
-        "rapira": RateQuery(source=RateSource.RAPIRA, method=RateMethod.MID),
-        "grinex": RateQuery(source=RateSource.GRINEX, method=RateMethod.MID),
-    }
+
+async def publish_views(
+    rate_service: RateService,
+    settings: Settings,
+    publisher: ViewPublisher,
+    interval: float = 5.0,
+) -> None:
+    """Re-render the screens from the cache the scheduler keeps warm."""
+    while True:
+        try:
+            views = await render_views(rate_service, settings)
+            await publisher.publish(views)
+        except Exception as exc:  # noqa: BLE001 - keep the loop alive
+            log.warning("Failed to publish rendered views", error=str(exc))
+        await asyncio.sleep(interval)
+
+
+async def report_metrics(interval: float = 60.0) -> None:
     while True:
-        await rate_service.warm_up(queries)
-        await asyncio.sleep(10)
+        await asyncio.sleep(interval)
+        log.info("Worker metrics", **metrics.snapshot())
 
 
 async def main() -> None:
@@ -30,20 +50,51 @@ async def main() -> None:
     setup_logging()
 
     redis = create_redis(settings.redis_url)
-    http_client = httpx.AsyncClient(timeout=10.0)
+    http_clients = HttpClients(settings)
 
-    providers = {
-        RateSource.BYBIT: BybitProvider(http_client, settings.bybit_endpoint),
-        RateSource.RAPIRA: RapiraProvider(http_client, settings.rapira_endpoint),
-        RateSource.GRINEX: GrinexProvider(http_client, settings.grinex_endpoint),
-    }
+    providers = build_rate_providers(http_clients.rates, settings, redis=redis)
 
     rate_service = RateService(redis=redis, providers=providers, settings=settings)
 
+    publisher = ViewPublisher(redis, ttl=int(settings.rendered_views_ttl_sec or 30))
+    scheduler = RefreshScheduler(rate_service, redis, settings, pinned=view_queries(settings))
+
+    jobs = [
+        scheduler.run(),
+        publish_views(rate_service, settings, publisher),
+        rate_service.listen_updates(),
+        roll_up_history(rate_service.history),
+        report_metrics(),
+    ]
+    db_pool = None
+    if settings.archive_enabled and settings.database_url:
+        dsn = asyncpg_dsn(settings.database_url)
+        db_pool = await asyncpg.create_pool(dsn, min_size=1, max_size=2)
+        archive = RateArchive(db_pool)
+        ingestor = ArchiveIngestor(
+            redis,
+            archive,
+            batch_size=int(settings.archive_batch_size or 500),
+            flush_interval=float(settings.archive_flush_sec or 5.0),
+        )
+        retention_days = int(settings.archive_retention_days or 0)
+        jobs += [ingestor.run(), maintain_archive(archive, retention_days)]
+
+    # Alerts are matched here, next to the refreshes that produce the updates;
+    # the bot processes deliver the notifications
+    alert_service = AlertService(redis, max_per_chat=int(settings.alerts_max_per_chat or 0))
+    jobs.append(AlertMatcher(alert_service, Sender(redis, APP_SENDER)).run())
+
+    streams = start_rate_streams(providers)
+
     try:
-        await warm_rates(rate_service)
+        await asyncio.gather(*jobs)
     finally:
-        await http_client.aclose()
+        for task in streams:
+            task.cancel()
+        if db_pool is not None:
+            await db_pool.close()
+        await http_clients.aclose()
         await close_redis(redis)
 
 
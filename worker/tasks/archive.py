@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from typing import List
+
+import asyncpg
+import orjson
+from redis.asyncio import Redis
+
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.rates.archive import RateArchive
+from app.rates.record import RateRecord
+from app.rates.service import RATE_UPDATES_CHANNEL
+
+log = get_logger(__name__)
+
+
+def _utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+class ArchiveIngestor:
+    """Buffers every rate published on ``RATE_UPDATES_CHANNEL`` and writes
+    them to the archive with one ``COPY`` per batch.
+
+    A batch goes out when ``batch_size`` rates are waiting or every
+    ``flush_interval`` seconds. Failed batches stay buffered (up to
+    ``max_buffer`` rates, oldest dropped first) for the next flush.
+    """
+
+    def __init__(
+        self,
+        redis: Redis[bytes],
+        archive: RateArchive,
+        batch_size: int = 500,
+        flush_interval: float = 5.0,
+        max_buffer: int = 50000,
+        reconnect_delay: float = 1.0,
+    ) -> None:
+        self.redis = redis
+        self.archive = archive
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.reconnect_delay = reconnect_delay
+        self._buffer: List[RateRecord] = []
+        self._full = asyncio.Event()
+
+    async def run(self) -> None:
+        await asyncio.gather(self._listen(), self._flush_loop())
+
+    def add(self, message: bytes) -> None:
+        try:
+            data = orjson.loads(message)
+            if isinstance(data[2], int):
+                # A touch: the stored rate did not change
+                return
+            record = RateRecord.from_wire(data[2])
+        except Exception:  # noqa: BLE001 - legacy or malformed message
+            metrics.inc("rates.archive.skipped")
+            return
+        self._buffer.append(record)
+        if len(self._buffer) >= self.batch_size:
+            self._full.set()
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(RATE_UPDATES_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self.add(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # noqa: BLE001 - resubscribe after a pause
+                log.warning("Archive subscription failed", error=str(exc))
+                await asyncio.sleep(self.reconnect_delay)
+            finally:
+                await pubsub.aclose()  # type: ignore[attr-defined]
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        try:
+            try:
+                await self.archive.copy(batch)
+            except asyncpg.CheckViolationError:
+                # No partition for some rows (e.g. their day was not pre-created)
+                days = {
+                    datetime.fromtimestamp(r.updated_at_us / 1_000_000, tz=timezone.utc).date()
+                    for r in batch
+                }
+                for day in sorted(days):
+                    await self.archive.ensure_partitions(day, days=1)
+                await self.archive.copy(batch)
+        except Exception as exc:  # noqa: BLE001 - keep the batch for the next flush
+            log.warning("Rate archive flush failed", rows=len(batch), error=str(exc))
+            metrics.inc("rates.archive.flush_failed")
+            pending = batch + self._buffer
+            dropped = len(pending) - self.max_buffer
+            self._buffer = pending[-self.max_buffer :]
+            if dropped > 0:
+                metrics.inc("rates.archive.dropped", dropped)
+
+
+async def maintain_archive(
+    archive: RateArchive, retention_days: int, interval: float = 3600.0
+) -> None:
+    """Keep partitions ready a few days ahead and drop those past retention."""
+    while True:
+        try:
+            today = _utc_today()
+            await archive.ensure_partitions(today - timedelta(days=1), days=4)
+            if retention_days > 0:
+                await archive.drop_partitions_before(today - timedelta(days=retention_days))
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:  # noqa: BLE001 - retried on the next run
+            log.warning("Rate archive maintenance failed", error=str(exc))
+        await asyncio.sleep(interval)
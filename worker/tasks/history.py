@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from app.core.logging import get_logger
+from app.rates.history import RateHistory
+
+log = get_logger(__name__)
+
+
+async def roll_up_history(
+    history: RateHistory, interval: float = 15.0, settle: float = 5.0
+) -> None:
+    """Fold new rate points into OHLC candles every ``interval`` seconds.
+
+    Points younger than ``settle`` seconds wait for the next run, so writes
+    from other processes that land slightly out of order are not skipped.
+    """
+    while True:
+        try:
+            until = time.time() - settle
+            for series in await history.series():
+                await history.roll_up(series, until)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:  # noqa: BLE001 - retried on the next run
+            log.warning("History rollup failed", error=str(exc))
+        await asyncio.sleep(interval)
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from redis.asyncio import Redis
+
+from app.core.config import Settings
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.rates.demand import DEMAND_KEY, DEMAND_QUERIES_KEY
+from app.rates.models import RateQuery, RateSource
+from app.rates.service import RateService
+
+log = get_logger(__name__)
+
+
+@dataclass
+class ScheduledKey:
+    query: RateQuery
+    score: float = 0.0
+    next_refresh: float = 0.0
+    pinned: bool = False
+
+
+@dataclass
+class SourceBackoff:
+    failures: int = 0
+    until: float = 0.0
+
+
+class RefreshScheduler:
+    """Demand-driven cache refresher.
+
+    The bot counts requests per cache key (``DemandTracker``); every
+    ``poll_interval`` the scheduler drains those counts into an exponentially
+    decaying popularity score. Each tracked key is refreshed shortly before its
+    TTL runs out (``lead_ratio`` of the TTL, minus up to ``jitter_ratio``
+    random spread), hottest keys first and at most ``max_per_tick`` at a time.
+    Keys whose score decays below ``cold_score`` are dropped and left to
+    expire; ``pinned`` keys (the pre-rendered screens) are always refreshed.
+    A source whose refresh fails is backed off exponentially.
+    """
+
+    def __init__(
+        self,
+        rate_service: RateService,
+        redis: Redis[bytes],
+        settings: Settings,
+        pinned: Optional[Dict[str, RateQuery]] = None,
+        tick_interval: float = 1.0,
+        poll_interval: float = 5.0,
+        backoff_base: float = 5.0,
+        backoff_max: float = 300.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.rate_service = rate_service
+        self.redis = redis
+        self.lead_ratio = float(settings.refresh_lead_ratio or 0.2)
+        self.jitter_ratio = float(settings.refresh_jitter_ratio or 0.0)
+        self.half_life = float(settings.demand_half_life_sec or 300)
+        self.cold_score = float(settings.demand_cold_score or 0.0)
+        self.max_per_tick = int(settings.refresh_max_per_tick or 20)
+        self.tick_interval = tick_interval
+        self.poll_interval = poll_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._clock = clock
+        self._keys: Dict[str, ScheduledKey] = {}
+        self._backoff: Dict[RateSource, SourceBackoff] = {}
+        self._last_poll = 0.0
+        for query in (pinned or {}).values():
+            # Only base rates are stored; geo variants are derived on read
+            query = rate_service.geo.base(query)
+            self._keys[rate_service.cache_key(query)] = ScheduledKey(query=query, pinned=True)
+
+    @property
+    def keys(self) -> Dict[str, ScheduledKey]:
+        return self._keys
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # noqa: BLE001 - keep scheduling
+                log.warning("Refresh scheduler tick failed", error=str(exc))
+            await asyncio.sleep(self.tick_interval)
+
+    async def tick(self) -> None:
+        now = self._clock()
+        if now - self._last_poll >= self.poll_interval:
+            await self.poll_demand(now)
+        due = self._due(now)
+        if due:
+            await self._refresh(due, now)
+
+    async def poll_demand(self, now: float) -> None:
+        """Fold the request counts since the last poll into the popularity scores."""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hgetall(DEMAND_KEY)
+            pipe.delete(DEMAND_KEY)
+            raw_counts, _ = await pipe.execute()
+        counts = {
+            key.decode() if isinstance(key, bytes) else key: int(count)
+            for key, count in raw_counts.items()
+        }
+
+        decay = 0.5 ** ((now - self._last_poll) / self.half_life) if self._last_poll else 1.0
+        self._last_poll = now
+        for entry in self._keys.values():
+            entry.score *= decay
+
+        unknown = [key for key in counts if key not in self._keys]
+        if unknown:
+            queries = await self.redis.hmget(DEMAND_QUERIES_KEY, unknown)
+            for key, raw in zip(unknown, queries, strict=True):
+                if not raw:
+                    continue
+                try:
+                    query = RateQuery.model_validate_json(raw)
+                except ValidationError:
+                    continue
+                # Refresh right away: that also tells us how old the cached value is
+                self._keys[key] = ScheduledKey(query=query, next_refresh=now)
+        for key, count in counts.items():
+            if key in self._keys:
+                self._keys[key].score += count
+
+        cold = [
+            key
+            for key, entry in self._keys.items()
+            if not entry.pinned and entry.score < self.cold_score
+        ]
+        for key in cold:
+            del self._keys[key]
+        if cold:
+            metrics.inc("rates.scheduler.dropped_cold", len(cold))
+        metrics.set_gauge("rates.scheduler.keys", len(self._keys))
+
+    def _due(self, now: float) -> List[Tuple[str, ScheduledKey]]:
+        due = [
+            (key, entry)
+            for key, entry in self._keys.items()
+            if entry.next_refresh <= now and self._backoff_until(entry.query.source) <= now
+        ]
+        # Pinned screens first, then by popularity
+        due.sort(key=lambda item: (not item[1].pinned, -item[1].score))
+        return due[: self.max_per_tick]
+
+    def _backoff_until(self, source: RateSource) -> float:
+        backoff = self._backoff.get(source)
+        return backoff.until if backoff else 0.0
+
+    async def _refresh(self, due: List[Tuple[str, ScheduledKey]], now: float) -> None:
+        results = await self.rate_service.get_many(
+            {key: entry.query for key, entry in due}, refresh_ahead=self.lead_ratio
+        )
+        failed = set()
+        succeeded = set()
+        for key, entry in due:
+            source = entry.query.source
+            payload = results.get(key)
+            if payload is None:
+                failed.add(source)
+                continue
+            succeeded.add(source)
+            updated_at = payload.updated_at.timestamp()
+            metrics.inc(
+                "rates.scheduler.refreshed" if updated_at >= now else "rates.scheduler.reused",
+                source=source.value,
+            )
+            ttl = self.rate_service.ttl_for(source)
+            jitter = random.uniform(0, ttl * self.jitter_ratio)
+            refresh_at = updated_at + ttl * (1 - self.lead_ratio) - jitter
+            entry.next_refresh = max(refresh_at, now + self.tick_interval)
+
+        for source in succeeded - failed:
+            self._backoff.pop(source, None)
+        for source in failed:
+            backoff = self._backoff.setdefault(source, SourceBackoff())
+            backoff.failures += 1
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (backoff.failures - 1))
+            backoff.until = now + random.uniform(delay / 2, delay)
+            metrics.inc("rates.scheduler.backoff", source=source.value)
+            log.warning(
+                "Backing off rate refreshes", source=source.value, failures=backoff.failures
+            )